@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+クライアント検索のベンチマーク
+search_reference.py（performSearch の参照実装）を使い、生成済みの検索インデックスを
+元にした合成インデックス（1k〜100kセクション）でクエリのレイテンシと再現率を計測します。
+インデックス形式を変更する前に、速度と再現率への影響を確認するために使います。
+
+使い方:
+    python bench_search.py                          # 1k / 10k / 100k セクション
+    python bench_search.py --sizes 1000,5000 --json # JSONで出力
+"""
+
+import sys
+import json
+import math
+import time
+import random
+import argparse
+from pathlib import Path
+
+from fuzzy_index import build_fuzzy_index
+from search_reference import load_static_index, perform_search
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+# 1ページあたりのセクション数（合成インデックスのURL単位）
+SECTIONS_PER_PAGE = 12
+
+# 誤字クエリで使う置換文字
+TYPO_CHARS = 'アイウエオカキクケコサシスセソタチツテトナニヌネノヤユヨラリルレロ'
+
+
+def percentile(sorted_values, ratio):
+    """ソート済みリストのパーセンタイル（最近傍法）"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(ratio * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def make_synthetic_index(seed_entries, size, rng):
+    """実際のセクションを組み合わせて指定件数の合成インデックスを作成"""
+    sentences = [s for entry in seed_entries for s in entry['content'].split('。') if s.strip()]
+    entries = []
+    for i in range(size):
+        seed = rng.choice(seed_entries)
+        page_number = i // SECTIONS_PER_PAGE
+        content = '。'.join(rng.sample(sentences, min(4, len(sentences))))[:500]
+        entries.append({
+            'pageTitle': f"{seed['pageTitle']} {page_number}",
+            'sectionTitle': seed['sectionTitle'] if i % SECTIONS_PER_PAGE else f"{seed['pageTitle']} {page_number}",
+            'sectionId': f'section-{i}',
+            'url': f'synthetic_{page_number}.html',
+            'content': content,
+            'category': seed['category'],
+            'keywords': seed.get('keywords', []),
+        })
+    return entries
+
+
+def make_typo(text, rng):
+    """1文字だけ置き換えた誤字クエリを作成"""
+    position = rng.randrange(len(text))
+    replacement = rng.choice([c for c in TYPO_CHARS if c != text[position]])
+    return text[:position] + replacement + text[position + 1:]
+
+
+def make_queries(seed_entries, count, rng):
+    """実運用に近いクエリ集合（キーワード・見出しの一部・誤字・ヒットなし）"""
+    keywords = sorted({k for entry in seed_entries for k in entry.get('keywords', [])})
+    titles = sorted({entry['sectionTitle'] for entry in seed_entries if len(entry['sectionTitle']) >= 6})
+    queries = []
+    for i in range(count):
+        kind = i % 4
+        if kind == 0 and keywords:
+            queries.append({'kind': 'keyword', 'query': rng.choice(keywords)})
+        elif kind == 1 and titles:
+            title = rng.choice(titles)
+            length = rng.randint(2, min(6, len(title)))
+            start = rng.randrange(len(title) - length + 1)
+            queries.append({'kind': 'fragment', 'query': title[start:start + length]})
+        elif kind == 2 and titles:
+            title = rng.choice(titles)
+            fragment = title[:min(len(title), 8)]
+            queries.append({'kind': 'typo', 'query': make_typo(fragment, rng), 'expected': title})
+        else:
+            queries.append({'kind': 'miss', 'query': ''.join(rng.choice(TYPO_CHARS) for _ in range(5))})
+    return queries
+
+
+def run_benchmark(seed_entries, size, queries, rng):
+    """1サイズ分の計測結果を返す"""
+    entries = make_synthetic_index(seed_entries, size, rng)
+
+    started = time.perf_counter()
+    fuzzy_index = build_fuzzy_index(entries)
+    fuzzy_build_ms = (time.perf_counter() - started) * 1000
+
+    latencies = {}
+    hits = {}
+    typo_found = 0
+    typo_total = 0
+    for query in queries:
+        started = time.perf_counter()
+        results = perform_search(entries, query['query'], fuzzy_index)
+        elapsed = (time.perf_counter() - started) * 1000
+        latencies.setdefault(query['kind'], []).append(elapsed)
+        latencies.setdefault('all', []).append(elapsed)
+        hits[query['kind']] = hits.get(query['kind'], 0) + (1 if results else 0)
+
+        if query['kind'] == 'typo':
+            typo_total += 1
+            # 表示される上位10件に意図した見出しが含まれるか
+            if any(r['title'].endswith(query['expected']) for r in results[:10]):
+                typo_found += 1
+
+    report = {
+        'sections': size,
+        'fuzzyIndexBuildMs': round(fuzzy_build_ms, 2),
+        'latencyMs': {},
+        'hitRate': {},
+        'typoRecallAt10': round(typo_found / typo_total, 3) if typo_total else None,
+    }
+    for kind, values in latencies.items():
+        values.sort()
+        report['latencyMs'][kind] = {
+            'p50': round(percentile(values, 0.50), 3),
+            'p95': round(percentile(values, 0.95), 3),
+            'p99': round(percentile(values, 0.99), 3),
+            'max': round(values[-1], 3),
+        }
+        if kind != 'all':
+            report['hitRate'][kind] = round(hits[kind] / len(values), 3)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='クライアント検索のベンチマーク')
+    parser.add_argument('--output-dir', default='../site_output', help='生成済みサイトのフォルダ（元データ）')
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES), help='セクション数（カンマ区切り）')
+    parser.add_argument('--queries', type=int, default=200, help='サイズごとのクエリ数')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', action='store_true', help='結果をJSONで出力')
+    args = parser.parse_args()
+
+    output_dir = Path(args.output_dir)
+    try:
+        seed_entries = load_static_index(output_dir)
+    except (OSError, ValueError) as e:
+        print(f"エラー: 検索インデックスを読み込めません ({e})。先に generate_auto.py を実行してください")
+        sys.exit(1)
+
+    rng = random.Random(args.seed)
+    queries = make_queries(seed_entries, args.queries, rng)
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+
+    reports = [run_benchmark(seed_entries, size, queries, rng) for size in sizes]
+
+    if args.json:
+        print(json.dumps({'queries': len(queries), 'results': reports}, ensure_ascii=False, indent=2))
+        return
+
+    print(f"クエリ数: {len(queries)}（キーワード / 見出しの一部 / 誤字 / ヒットなし）")
+    for report in reports:
+        latency = report['latencyMs']['all']
+        print(f"\n■ {report['sections']:,}セクション")
+        print(f"  レイテンシ(ms): p50={latency['p50']} p95={latency['p95']} "
+              f"p99={latency['p99']} max={latency['max']}")
+        for kind, values in report['latencyMs'].items():
+            if kind != 'all':
+                print(f"    {kind:<8} p50={values['p50']} p95={values['p95']} "
+                      f"ヒット率={report['hitRate'][kind]}")
+        print(f"  誤字クエリの再現率(上位10件): {report['typoRecallAt10']}")
+        print(f"  あいまい検索インデックス構築: {report['fuzzyIndexBuildMs']}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+チャット検索用インデックス（chat-index.json）
+- 生成済みのページHTMLを h2/h3 の見出し境界でチャンクに分割（長いセクションは重なり付きで分割）
+- 各チャンクのTF-IDFベクトルを疎行列（CSR形式）で事前計算
+- ページ単位のチャンクと語の出現回数はコンテンツハッシュでキャッシュし、未変更ページは再分割しない
+- 語の出現回数をページ単位に合算したTF-IDFベクトルから、各ページの関連ページを事前計算（related_pages）
+- flask-api のチャットサービスが起動時に読み込み、メモリ上で検索する
+
+フォーマット:
+    {
+      "format": 2,
+      "version": "<内容のハッシュ>",
+      "tokenizer": {"type": "char-ngram", "n": 2},
+      "pages":  [{"url", "title", "category", "related": [ページ番号, ...（類似度の高い順）]}],
+      "chunks": [{"page": ページ番号, "section", "anchor", "text"}],
+      "vocab":  [語, ...],
+      "idf":    "<float32配列のbase64>",
+      "matrix": {"rows": チャンク数, "cols": 語彙数,
+                 "indptr": "<uint32配列>", "indices": "<uint32配列>", "data": "<float32配列>"}
+    }
+
+配列はすべてリトルエンディアンのbase64で、NumPy があれば frombuffer でそのまま読み込めます。
+ベクトルはL2正規化済みのため、内積がそのままコサイン類似度になります。
+"""
+
+import sys
+import json
+import math
+import base64
+import hashlib
+import unicodedata
+from array import array
+from pathlib import Path
+from bs4 import BeautifulSoup
+from related_pages import merge_counts, build_related_pages
+
+# chat-index.json のフォーマットバージョン
+CHAT_INDEX_FORMAT = 2
+
+# 分割ルールやトークナイザーを変えたらキャッシュを無効にするためのバージョン
+CHUNKER_VERSION = 1
+
+HEADING_TAGS = ['h1', 'h2', 'h3']
+
+# 1チャンクの最大文字数と、分割時に前のチャンクと重ねる文字数
+MAX_CHUNK_CHARS = 800
+CHUNK_OVERLAP_CHARS = 120
+
+NGRAM = 2
+
+
+def normalize(text):
+    """全角半角・大文字小文字の違いを吸収し空白を除去（flask-api と共通の正規化）"""
+    return ''.join(unicodedata.normalize('NFKC', text).lower().split())
+
+
+def tokenize(text, n=NGRAM):
+    """文字n-gramに分割（日本語は分かち書きせず2文字単位で扱う）"""
+    text = normalize(text)
+    if len(text) <= n:
+        return [text] if text else []
+    return [text[i:i + n] for i in range(len(text) - n + 1)]
+
+
+def split_sections(html_content):
+    """HTMLを見出し単位のセクション [(見出し, アンカー, [段落, ...])] に分割"""
+    soup = BeautifulSoup(html_content, 'html.parser')
+    sections = []
+    for heading in soup.find_all(HEADING_TAGS):
+        paragraphs = []
+        for sibling in heading.find_next_siblings():
+            if sibling.name in HEADING_TAGS:
+                break
+            text = sibling.get_text(' ', strip=True)
+            if text:
+                paragraphs.append(text)
+        sections.append((heading.name, heading.get_text().strip(), heading.get('id', ''), paragraphs))
+    return sections
+
+
+def split_long_text(paragraphs, max_chars=MAX_CHUNK_CHARS, overlap=CHUNK_OVERLAP_CHARS):
+    """段落を上限文字数以内のチャンクにまとめる（境界は段落単位、前チャンクの末尾を重ねる）"""
+    chunks = []
+    current = ''
+    for paragraph in paragraphs:
+        # 1段落だけで上限を超える場合は文字数で分割
+        pieces = [paragraph[i:i + max_chars] for i in range(0, len(paragraph), max_chars - overlap)] \
+            if len(paragraph) > max_chars else [paragraph]
+        for piece in pieces:
+            if current and len(current) + 1 + len(piece) > max_chars:
+                chunks.append(current)
+                current = current[-overlap:] + '\n' + piece
+            else:
+                current = current + '\n' + piece if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def chunk_page(page):
+    """ページを h2/h3 境界でチャンクに分割
+
+    h1 はページタイトルなので境界にせず、h1 直後の本文は導入チャンクにします。
+    本文のないセクション（見出しの直後に次の見出しが続く場合）はチャンクにしません。
+    短いセクションは前後のセクションにまとめず、そのまま1チャンクにします。
+    """
+    chunks = []
+    for tag, heading, anchor, paragraphs in split_sections(page['html']):
+        if tag == 'h1':
+            heading = page['title']
+        if not paragraphs:
+            continue
+        for piece in split_long_text(paragraphs):
+            chunks.append({'section': heading, 'anchor': anchor, 'text': piece})
+    return chunks
+
+
+def count_terms(page, chunk):
+    """チャンクの語の出現回数（ページタイトル・見出しも含める）"""
+    counts = {}
+    for term in tokenize(f"{page['title']} {chunk['section']} {chunk['text']}"):
+        counts[term] = counts.get(term, 0) + 1
+    return counts
+
+
+def page_hash(page):
+    """チャンク分割結果に影響する内容のハッシュ"""
+    key = json.dumps([CHUNKER_VERSION, page['title'], page['category'], page['html']],
+                     ensure_ascii=False)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:24]
+
+
+class ChunkCache:
+    """ページ単位のチャンクと語の出現回数をコンテンツハッシュで保存するキャッシュ"""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.hits = 0
+        self.misses = 0
+        self._used = set()
+
+    def get(self, page):
+        """キャッシュがあれば返し、なければ分割して保存"""
+        digest = page_hash(page)
+        self._used.add(digest)
+        path = self.cache_dir / f'{digest}.json' if self.cache_dir else None
+        if path and path.exists():
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    cached = json.load(f)
+                self.hits += 1
+                return cached['chunks'], cached['counts']
+            except (OSError, ValueError, KeyError):
+                pass
+
+        self.misses += 1
+        chunks = chunk_page(page)
+        counts = [count_terms(page, chunk) for chunk in chunks]
+        if path:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({'chunks': chunks, 'counts': counts}, f, ensure_ascii=False, separators=(',', ':'))
+        return chunks, counts
+
+    def prune(self):
+        """今回のビルドで使われなかったキャッシュを削除"""
+        if not self.cache_dir or not self.cache_dir.exists():
+            return
+        for path in self.cache_dir.glob('*.json'):
+            if path.stem not in self._used:
+                path.unlink()
+
+
+def encode_array(typecode, values):
+    """数値配列をリトルエンディアンのbase64文字列に変換"""
+    data = array(typecode, values)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return base64.b64encode(data.tobytes()).decode('ascii')
+
+
+def decode_array(typecode, encoded):
+    """encode_array の逆変換"""
+    data = array(typecode)
+    data.frombytes(base64.b64decode(encoded))
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data
+
+
+def build_tfidf(chunk_counts):
+    """チャンクごとの出現回数からTF-IDFの語彙・IDF・CSR行列を構築"""
+    document_frequency = {}
+    for counts in chunk_counts:
+        for term in counts:
+            document_frequency[term] = document_frequency.get(term, 0) + 1
+
+    vocab = sorted(document_frequency)
+    term_ids = {term: i for i, term in enumerate(vocab)}
+    total = len(chunk_counts)
+    idf = [math.log((1 + total) / (1 + document_frequency[term])) + 1 for term in vocab]
+
+    indptr = [0]
+    indices = []
+    data = []
+    for counts in chunk_counts:
+        row = sorted((term_ids[term], (1 + math.log(count)) * idf[term_ids[term]])
+                     for term, count in counts.items())
+        norm = math.sqrt(sum(weight * weight for _, weight in row)) or 1.0
+        for term_id, weight in row:
+            indices.append(term_id)
+            data.append(weight / norm)
+        indptr.append(len(indices))
+
+    return vocab, idf, {
+        'rows': total,
+        'cols': len(vocab),
+        'indptr': encode_array('I', indptr),
+        'indices': encode_array('I', indices),
+        'data': encode_array('f', data),
+    }
+
+
+def build_chat_index(pages, cache_dir=None):
+    """ページ情報（html を含む）からチャット検索用インデックスを構築"""
+    cache = ChunkCache(cache_dir)
+    index_pages = []
+    chunks = []
+    chunk_counts = []
+    page_counts = []
+    for page_number, page in enumerate(pages):
+        index_pages.append({
+            'url': page['output_name'],
+            'title': page['title'],
+            'category': page['category'],
+        })
+        page_chunks, counts = cache.get(page)
+        for chunk in page_chunks:
+            chunks.append({'page': page_number, **chunk})
+        chunk_counts.extend(counts)
+        page_counts.append(merge_counts(counts))
+    cache.prune()
+
+    related, backend = build_related_pages(page_counts)
+    for index_page, page_related in zip(index_pages, related):
+        index_page['related'] = [page_number for page_number, _ in page_related]
+
+    vocab, idf, matrix = build_tfidf(chunk_counts)
+
+    body = {'pages': index_pages, 'chunks': chunks}
+    digest = hashlib.sha256(
+        json.dumps(body, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    chat_index = {
+        'format': CHAT_INDEX_FORMAT,
+        'version': digest,
+        'tokenizer': {'type': 'char-ngram', 'n': NGRAM},
+        **body,
+        'vocab': vocab,
+        'idf': encode_array('f', idf),
+        'matrix': matrix,
+    }
+    return chat_index, {'hits': cache.hits, 'misses': cache.misses, 'related': backend}
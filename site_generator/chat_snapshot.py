@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+チャット用インデックスのバイナリスナップショット（chat-index.bin）
+chat-index.json と同じ内容を、flask-api が mmap してそのまま使える形式で出力します。
+JSONの解析や行列の転置が不要になるため、サービスの起動（ワーカーの追加やサーバーレスのコールドスタート）が速くなり、
+複数のワーカーが同じファイルを mmap すればOSのページキャッシュを共有できます。
+
+ファイル構成（数値はすべてリトルエンディアン）:
+    ヘッダー（32バイト）: マジック b'HKCHATIX', フォーマット(u32), セクション数(u32), バージョン(16バイトASCII)
+    セクション表: セクションごとに 名前(8バイト), 開始位置(u64), 長さ(u64)
+    セクション本体（8バイト境界に配置）:
+      meta      JSON: {"version", "tokenizer", "pages", "rows", "cols"}
+      vocabofs  u32[語彙数+1]   vocab 内の各語の開始位置
+      vocab     UTF-8           語を辞書順に連結
+      idf       f32[語彙数]
+      tindptr   u32[語彙数+1]   語 t のポスティングは chunkid/weight の tindptr[t]:tindptr[t+1]
+      chunkid   u32[非ゼロ数]   語ごとにチャンク番号順
+      weight    f32[非ゼロ数]   L2正規化済みのTF-IDF重み
+      chunkpg   u32[チャンク数]  チャンクが属するページ番号
+      strofs    u32[チャンク数×3+1]  strings 内の 見出し・アンカー・本文 の開始位置
+      strings   UTF-8
+"""
+
+import os
+import sys
+import json
+import struct
+from array import array
+
+from chat_index import decode_array
+
+SNAPSHOT_MAGIC = b'HKCHATIX'
+SNAPSHOT_FORMAT = 1
+
+HEADER = struct.Struct('<8sII16s')
+SECTION = struct.Struct('<8sQQ')
+ALIGNMENT = 8
+
+
+def little_endian(typecode, values):
+    """数値配列をリトルエンディアンのバイト列に変換"""
+    data = values if isinstance(values, array) else array(typecode, values)
+    if sys.byteorder == 'big':
+        data = array(typecode, data)
+        data.byteswap()
+    return data.tobytes()
+
+
+def pack_strings(strings):
+    """文字列のリストを (開始位置のバイト列, 連結したUTF-8) に変換"""
+    offsets = array('I', [0])
+    blob = bytearray()
+    for text in strings:
+        blob += text.encode('utf-8')
+        offsets.append(len(blob))
+    return little_endian('I', offsets), bytes(blob)
+
+
+def transpose_postings(chat_index):
+    """チャンク×語のCSR行列を 語×チャンク のポスティングに転置"""
+    matrix = chat_index['matrix']
+    rows, cols = matrix['rows'], matrix['cols']
+    indptr = decode_array('I', matrix['indptr'])
+    indices = decode_array('I', matrix['indices'])
+    data = decode_array('f', matrix['data'])
+
+    term_indptr = array('I', bytes(4 * (cols + 1)))
+    for term_id in indices:
+        term_indptr[term_id + 1] += 1
+    for term_id in range(cols):
+        term_indptr[term_id + 1] += term_indptr[term_id]
+    cursor = list(term_indptr[:-1])
+    chunk_ids = array('I', bytes(4 * len(indices)))
+    weights = array('f', bytes(4 * len(indices)))
+    for chunk_id in range(rows):
+        for position in range(indptr[chunk_id], indptr[chunk_id + 1]):
+            term_id = indices[position]
+            chunk_ids[cursor[term_id]] = chunk_id
+            weights[cursor[term_id]] = data[position]
+            cursor[term_id] += 1
+    return term_indptr, chunk_ids, weights
+
+
+def build_chat_snapshot(chat_index):
+    """chat-index.json の内容からスナップショットのバイト列を作成"""
+    matrix = chat_index['matrix']
+    term_indptr, chunk_ids, weights = transpose_postings(chat_index)
+    vocab_offsets, vocab_blob = pack_strings(chat_index['vocab'])
+    string_offsets, string_blob = pack_strings(
+        value for chunk in chat_index['chunks'] for value in (chunk['section'], chunk['anchor'], chunk['text']))
+    meta = {
+        'version': chat_index['version'],
+        'tokenizer': chat_index['tokenizer'],
+        'pages': chat_index['pages'],
+        'rows': matrix['rows'],
+        'cols': matrix['cols'],
+    }
+    sections = [
+        (b'meta', json.dumps(meta, ensure_ascii=False, separators=(',', ':')).encode('utf-8')),
+        (b'vocabofs', vocab_offsets),
+        (b'vocab', vocab_blob),
+        (b'idf', little_endian('f', decode_array('f', chat_index['idf']))),
+        (b'tindptr', little_endian('I', term_indptr)),
+        (b'chunkid', little_endian('I', chunk_ids)),
+        (b'weight', little_endian('f', weights)),
+        (b'chunkpg', little_endian('I', [chunk['page'] for chunk in chat_index['chunks']])),
+        (b'strofs', string_offsets),
+        (b'strings', string_blob),
+    ]
+
+    def align(position):
+        return (position + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+    position = align(HEADER.size + SECTION.size * len(sections))
+    table = []
+    for name, body in sections:
+        table.append(SECTION.pack(name, position, len(body)))
+        position = align(position + len(body))
+
+    out = bytearray(HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, len(sections),
+                                chat_index['version'].encode('ascii')))
+    for entry in table:
+        out += entry
+    for _, body in sections:
+        out += bytes(align(len(out)) - len(out))
+        out += body
+    return bytes(out)
+
+
+def write_chat_snapshot(chat_index, path):
+    """スナップショットを一時ファイル経由で書き出し、バイト数を返す（稼働中のサービスは mmap 中の旧ファイルを使い続ける）"""
+    snapshot = build_chat_snapshot(chat_index)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(snapshot)
+    os.replace(tmp_path, path)
+    return len(snapshot)
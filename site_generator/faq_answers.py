@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+ナレッジベースのよくある質問（knowledge_base.json の questions）の回答をビルド時に確定
+- 関連ページ（related_pages）のうち出力に存在しないものは、回答の内容に近いページで置き換え
+  （knowledge_base.json の intents の関連ページも同じ方法で解決する）
+- 質問文を正規化したキーと回答を意図データ（intents-<version>.json）に含め、
+  ブラウザと flask-api が完全一致・ほぼ一致する質問にLLMを使わずに回答する
+
+ほぼ一致の判定は、正規化した質問文の文字2-gram集合のJaccard係数が FAQ_MATCH_THRESHOLD 以上のとき。
+"""
+
+import json
+import math
+
+from chat_index import normalize, tokenize, decode_array
+
+# 「ほぼ一致」とみなす文字2-gram集合のJaccard係数
+FAQ_MATCH_THRESHOLD = 0.8
+
+# related_pages がない質問に付ける関連ページ数
+DEFAULT_RELATED_PAGES = 3
+
+
+class PageRanker:
+    """チャット用インデックスのTF-IDFベクトルで、テキストに近いページを順位付けする"""
+
+    def __init__(self, chat_index):
+        self.pages = chat_index['pages']
+        self.chunk_pages = [chunk['page'] for chunk in chat_index['chunks']]
+        self.term_ids = {term: i for i, term in enumerate(chat_index['vocab'])}
+        self.idf = decode_array('f', chat_index['idf'])
+        matrix = chat_index['matrix']
+        self.indptr = decode_array('I', matrix['indptr'])
+        self.indices = decode_array('I', matrix['indices'])
+        self.data = decode_array('f', matrix['data'])
+
+    def rank(self, text):
+        """[(スコア, ページ番号)] を類似度の高い順で返す（ページのスコアは最も近いチャンクのスコア）"""
+        counts = {}
+        for term in tokenize(text):
+            term_id = self.term_ids.get(term)
+            if term_id is not None:
+                counts[term_id] = counts.get(term_id, 0) + 1
+        query = {term_id: (1 + math.log(count)) * self.idf[term_id] for term_id, count in counts.items()}
+
+        best = {}
+        for row, page_number in enumerate(self.chunk_pages):
+            score = sum(self.data[k] * query.get(self.indices[k], 0.0)
+                        for k in range(self.indptr[row], self.indptr[row + 1]))
+            if score > best.get(page_number, 0.0):
+                best[page_number] = score
+        return sorted(((score, number) for number, score in best.items()), key=lambda item: (-item[0], item[1]))
+
+
+def resolve_related_pages(names, text, ranker):
+    """関連ページ名を出力済みのページに解決し、(ページ情報のリスト, 解決できなかった名前) を返す
+
+    存在しない名前の分は、text に近いページ（既に含まれるものを除く）で補います。
+    """
+    page_numbers = {page['url']: number for number, page in enumerate(ranker.pages)}
+    chosen = [page_numbers[name] for name in names if name in page_numbers]
+    unresolved = [name for name in names if name not in page_numbers]
+    limit = len(names) or DEFAULT_RELATED_PAGES
+    if len(chosen) < limit:
+        for _, number in ranker.rank(text):
+            if number not in chosen:
+                chosen.append(number)
+            if len(chosen) >= limit:
+                break
+    # pages[].related（関連ページの番号）などは回答に含めない
+    pages = [ranker.pages[number] for number in chosen]
+    return [{'url': page['url'], 'title': page['title'], 'category': page['category']} for page in pages], unresolved
+
+
+def build_faq_answers(knowledge_base_path, chat_index):
+    """knowledge_base.json の質問ごとの回答を作成し、(回答のリスト, 置き換えた関連ページ名) を返す"""
+    try:
+        with open(knowledge_base_path, 'r', encoding='utf-8') as f:
+            data = json.load(f).get('knowledge_base', {})
+    except OSError:
+        return [], []
+
+    ranker = PageRanker(chat_index)
+    faqs = []
+    replaced = []
+    for category in data.get('categories', []):
+        for number, question in enumerate(category.get('questions', [])):
+            # 質問文はAIチャットの案内ページなどにそのまま載っていることがあるため、回答の内容で探す
+            related_pages, unresolved = resolve_related_pages(
+                question.get('related_pages', []), question['answer'], ranker)
+            replaced.extend(unresolved)
+            faqs.append({
+                'id': f"kb:{category['name']}:{number}",
+                'key': normalize(question['question']),
+                'response': question['answer'],
+                'relatedPages': related_pages,
+            })
+    return faqs, replaced
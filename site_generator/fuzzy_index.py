@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+あいまい検索用の文字n-gramインデックス
+- ページタイトル・セクション見出しから文字n-gramの転置インデックスを生成
+- n-gramの重なりで候補を絞り、編集距離で順位付け
+- 「ヒヤリング」→「ヒアリング」のような表記ゆれ・誤字に対応
+
+ブラウザ側（テンプレートの fuzzySearch）も同じ正規化・同じ手順で検索します。
+"""
+
+import unicodedata
+
+# search-fuzzy.json のフォーマットバージョン
+FUZZY_INDEX_VERSION = 1
+
+# 日本語の短い語でも重なりが出るよう2文字単位で分割
+DEFAULT_NGRAM = 2
+
+# 編集距離を計算する候補の最大数
+MAX_CANDIDATES = 50
+
+
+def normalize(text):
+    """全角半角・大文字小文字・ひらがなカタカナの違いを吸収"""
+    text = unicodedata.normalize('NFKC', text).lower()
+    # ひらがなをカタカナに寄せる（ぁ〜ゖ → ァ〜ヶ）
+    return ''.join(chr(ord(c) + 0x60) if 'ぁ' <= c <= 'ゖ' else c for c in text)
+
+
+def ngrams(text, n=DEFAULT_NGRAM):
+    """正規化済みテキストの文字n-gram（重複なし）"""
+    text = ''.join(text.split())
+    if len(text) <= n:
+        return [text] if text else []
+    seen = []
+    for i in range(len(text) - n + 1):
+        gram = text[i:i + n]
+        if gram not in seen:
+            seen.append(gram)
+    return seen
+
+
+def max_distance(query):
+    """クエリ長に応じた許容編集距離"""
+    if len(query) <= 3:
+        return 0
+    if len(query) <= 6:
+        return 1
+    if len(query) <= 10:
+        return 2
+    return 3
+
+
+def substring_distance(query, text):
+    """クエリと text 内の任意の部分文字列との最小編集距離"""
+    # 先頭の空白を無料にした Levenshtein（semi-global alignment）
+    previous = [0] * (len(text) + 1)
+    for i, qc in enumerate(query, 1):
+        current = [i] + [0] * len(text)
+        for j, tc in enumerate(text, 1):
+            cost = 0 if qc == tc else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+        previous = current
+    return min(previous)
+
+
+def build_fuzzy_index(entries, n=DEFAULT_NGRAM):
+    """検索エントリのタイトル・見出しからn-gramインデックスを構築"""
+    terms = []
+    term_ids = {}
+    for entry in entries:
+        for title in (entry['pageTitle'], entry['sectionTitle']):
+            title = title.strip()
+            if title and title not in term_ids:
+                term_ids[title] = len(terms)
+                terms.append(title)
+
+    grams = {}
+    for term_id, term in enumerate(terms):
+        for gram in ngrams(normalize(term), n):
+            grams.setdefault(gram, []).append(term_id)
+
+    return {
+        'version': FUZZY_INDEX_VERSION,
+        'n': n,
+        'terms': terms,
+        'grams': grams,
+    }
+
+
+def fuzzy_search(index, query, limit=10):
+    """表記ゆれを許容してタイトル・見出しを検索（[(term, distance), ...]）"""
+    normalized_query = ''.join(normalize(query).split())
+    query_grams = ngrams(normalized_query, index['n'])
+    if not query_grams:
+        return []
+
+    # n-gramの重なり数で候補を生成（全件走査しない）
+    overlap = {}
+    for gram in query_grams:
+        for term_id in index['grams'].get(gram, ()):
+            overlap[term_id] = overlap.get(term_id, 0) + 1
+
+    candidates = sorted(overlap.items(), key=lambda item: -item[1])[:MAX_CANDIDATES]
+
+    allowed = max_distance(normalized_query)
+    results = []
+    for term_id, shared in candidates:
+        term = index['terms'][term_id]
+        distance = substring_distance(normalized_query, ''.join(normalize(term).split()))
+        if distance <= allowed:
+            results.append((distance, -shared, len(term), term))
+
+    results.sort()
+    return [(term, distance) for distance, _, _, term in results[:limit]]
@@ -7,6 +7,7 @@
 """
 
 import os
+import html
 import shutil
 import markdown
 from pathlib import Path
@@ -15,16 +16,47 @@ import json
 import yaml
 from datetime import datetime
 from bs4 import BeautifulSoup
+from search_db import build_search_db
+from fuzzy_index import build_fuzzy_index
+from search_index_delta import write_incremental_index
+from chat_index import build_chat_index
+from guidelines_data import build_guidelines, write_guidelines
+from intent_matcher import load_knowledge_base_intents, build_intent_matcher
+from faq_answers import build_faq_answers, resolve_related_pages, PageRanker, FAQ_MATCH_THRESHOLD
+from chat_snapshot import write_chat_snapshot
+from synonyms import load_knowledge_base_groups, build_synonym_table, expand_keywords
 
 class ImprovedSiteGenerator:
     def __init__(self, content_dir="../サイトコンテンツ", 
                  output_dir="../site_output",
-                 template_dir="_templates"):
+                 template_dir="_templates",
+                 search_api_url=None,
+                 chat_api_url=None,
+                 knowledge_base_path="../システム関連/99_テスト機能/AI_assistant/knowledge_base/knowledge_base.json",
+                 vercel_api_dir="../システム関連/vercel-api",
+                 cache_dir=".cache"):
         self.content_dir = Path(content_dir)
         self.output_dir = Path(output_dir)
         self.template_dir = Path(template_dir)
+        self.knowledge_base_path = Path(knowledge_base_path)
+        self.vercel_api_dir = Path(vercel_api_dir) if vercel_api_dir else None
+        # ビルド間で再利用するキャッシュ（チャンク分割結果など）
+        self.cache_dir = Path(cache_dir) if cache_dir else None
         self.pages = []
         self.navigation_map = {}  # ナビゲーション用のマップ
+        self.search_entries = []  # 検索インデックスのエントリ
+        self.synonym_table = {}  # 検索用の同義語テーブル
+        self.intent_bundle = None  # AIチャットの意図判定データと回答（パネルを開いたときに読み込む）
+        self.chat_index = None  # チャット用インデックス（よくある質問の関連ページ解決にも使う）
+        self.chat_index_cache_stats = {}
+        # 検索APIのURL（未設定の場合は静的な search-index.json で検索）
+        if search_api_url is None:
+            search_api_url = os.environ.get('SEARCH_API_URL', '')
+        self.search_api_url = search_api_url
+        # チャットAPI（flask-api）のURL（未設定の場合は従来のチャットAPIに問い合わせ）
+        if chat_api_url is None:
+            chat_api_url = os.environ.get('CHAT_API_URL', '')
+        self.chat_api_url = chat_api_url
         
     def extract_frontmatter(self, content):
         """Markdownファイルからフロントマターを抽出"""
@@ -454,6 +486,35 @@ class ImprovedSiteGenerator:
         
         return sidebar_html
     
+    def render_markdown(self, page):
+        """ページのMarkdownをHTMLに変換（1回の生成で変換は1度だけ）"""
+        if 'html' not in page:
+            md = markdown.Markdown(extensions=['extra', 'codehilite', 'toc'])
+            page['html'] = md.convert(page['content'])
+        return page['html']
+    
+    def apply_site_config(self, page_html):
+        """テンプレート内の設定値プレースホルダーを置換（関連ページ欄が未設定のページでは空にする）"""
+        if self.intent_bundle is None:
+            self.build_intent_bundle()
+        return (page_html
+                .replace('{{SEARCH_API_URL}}', self.search_api_url)
+                .replace('{{CHAT_API_URL}}', self.chat_api_url)
+                .replace('{{INTENT_BUNDLE_URL}}', self.intent_bundle_name())
+                .replace('{{RELATED_PAGES}}', ''))
+    
+    def generate_related_pages(self, page_number):
+        """ビルド時に計算した関連ページの欄のHTML（チャット用インデックスの pages[].related）"""
+        pages = self.chat_index['pages']
+        related = pages[page_number].get('related', [])
+        if not related:
+            return ''
+        items = ''.join(
+            f'<li><a href="{pages[number]["url"]}">{html.escape(pages[number]["title"])}</a>'
+            f'<span class="related-category">{html.escape(pages[number]["category"])}</span></li>\n'
+            for number in related)
+        return f'<nav class="related-pages" aria-label="関連ページ">\n<h2>関連ページ</h2>\n<ul>\n{items}</ul>\n</nav>'
+    
     def generate_pages(self):
         """各ページのHTMLを生成"""
         # テンプレートを読み込み
@@ -468,11 +529,14 @@ class ImprovedSiteGenerator:
         # 出力ディレクトリを作成
         self.output_dir.mkdir(parents=True, exist_ok=True)
         
+        # 関連ページはチャット用インデックスと一緒に計算する
+        if self.chat_index is None:
+            self.build_chat_index()
+        
         # 各ページを生成
-        for page in self.pages:
+        for page_number, page in enumerate(self.pages):
             # Markdownをパース
-            md = markdown.Markdown(extensions=['extra', 'codehilite', 'toc'])
-            html_content = md.convert(page['content'])
+            html_content = self.render_markdown(page)
             
             # ナビゲーションボタンのHTML作成（すべてのページに）
             nav_html = ''
@@ -554,6 +618,8 @@ class ImprovedSiteGenerator:
             page_html = page_html.replace('{{TITLE}}', page['title'])
             page_html = page_html.replace('{{CONTENT}}', html_content)
             page_html = page_html.replace('{{SIDEBAR}}', sidebar_html)
+            page_html = page_html.replace('{{RELATED_PAGES}}', self.generate_related_pages(page_number))
+            page_html = self.apply_site_config(page_html)
             
             # ファイルを保存
             output_path = self.output_dir / page['output_name']
@@ -609,6 +675,7 @@ Harukazeの理念、ディレクターの心得、業務プロセスなど、ま
         page_html = page_html.replace('{{TITLE}}', 'Harukazeガイドライン')
         page_html = page_html.replace('{{CONTENT}}', html_content)
         page_html = page_html.replace('{{SIDEBAR}}', sidebar_html)
+        page_html = self.apply_site_config(page_html)
         
         # ファイルを保存
         output_path = self.output_dir / 'index.html'
@@ -617,15 +684,22 @@ Harukazeの理念、ディレクターの心得、業務プロセスなど、ま
         
         print(f"生成: index.html")
     
-    def generate_search_index(self):
-        """検索用のインデックスファイルを生成"""
+    def build_synonym_table(self):
+        """ナレッジベースのカテゴリと意図のキーワードから同義語テーブルを構築"""
+        groups = load_knowledge_base_groups(self.knowledge_base_path)
+        self.synonym_table = build_synonym_table(groups)
+        print(f"同義語テーブルを構築: {len(self.synonym_table)}語 ({len(groups)}グループ)")
+        return self.synonym_table
+    
+    def build_search_entries(self):
+        """検索インデックスのエントリを構築"""
         search_index = []
+        if not self.synonym_table:
+            self.build_synonym_table()
         
         for page in self.pages:
             # HTMLタグを除去してプレーンテキストを取得
-            md = markdown.Markdown(extensions=['extra', 'codehilite', 'toc'])
-            html_content = md.convert(page['content'])
-            soup = BeautifulSoup(html_content, 'html.parser')
+            soup = BeautifulSoup(self.render_markdown(page), 'html.parser')
             
             # 全セクションを取得
             for section in soup.find_all(['h1', 'h2', 'h3']):
@@ -639,7 +713,12 @@ Harukazeの理念、ディレクターの心得、業務プロセスなど、ま
                         break
                     content_parts.append(sibling.get_text())
                 
-                content_text = ' '.join(content_parts)[:500]
+                full_text = ' '.join(content_parts)
+                content_text = full_text[:500]
+                
+                # 同義語をインデックス側で展開（検索時の追加クエリは不要）
+                keywords = expand_keywords(
+                    f"{page['title']} {section_title}", full_text, self.synonym_table)
                 
                 # 検索インデックスエントリを作成
                 entry = {
@@ -648,16 +727,138 @@ Harukazeの理念、ディレクターの心得、業務プロセスなど、ま
                     'sectionId': section_id,
                     'url': page['output_name'],
                     'content': content_text,
-                    'category': page['category']
+                    'category': page['category'],
+                    'keywords': keywords
                 }
                 search_index.append(entry)
         
+        self.search_entries = search_index
+        return search_index
+    
+    def generate_search_index(self):
+        """検索用のインデックスファイルを生成"""
+        search_index = self.build_search_entries()
+        
         # JSONファイルとして保存
         output_path = self.output_dir / 'search-index.json'
         with open(output_path, 'w', encoding='utf-8') as f:
             json.dump(search_index, f, ensure_ascii=False, indent=2)
         
         print(f"検索インデックスを生成: search-index.json")
+        
+        # ブラウザ向けのベース＋差分インデックス（変更ページ分だけ再取得）
+        manifest = write_incremental_index(self.output_dir, search_index)
+        if manifest['status'] == 'unchanged':
+            print(f"差分インデックス: 変更なし (v{manifest['version']})")
+        elif manifest['status'] == 'delta':
+            print(f"差分インデックスを生成: v{manifest['base']['version']} → v{manifest['version']} "
+                  f"({manifest['delta']['pages']}ページ変更)")
+        else:
+            print(f"ベースインデックスを生成: v{manifest['version']}")
+    
+    def generate_search_db(self):
+        """サーバー検索用のSQLite FTS5データベースを生成"""
+        build_search_db(self.search_entries, self.output_dir / 'search.db')
+        
+        print(f"検索データベースを生成: search.db ({len(self.search_entries)}セクション)")
+    
+    def build_chat_index(self):
+        """チャットサービス（flask-api）用の検索インデックスを構築"""
+        chunk_cache_dir = self.cache_dir / 'chat-chunks' if self.cache_dir else None
+        for page in self.pages:
+            self.render_markdown(page)
+        self.chat_index, self.chat_index_cache_stats = build_chat_index(self.pages, chunk_cache_dir)
+        return self.chat_index
+    
+    def generate_chat_index(self):
+        """チャットサービス（flask-api）用の検索インデックスを生成"""
+        if self.chat_index is None:
+            self.build_chat_index()
+        chat_index = self.chat_index
+        cache_stats = self.chat_index_cache_stats
+        
+        # 検索APIと同じく一時ファイル経由で差し替え（稼働中のサービスが再読み込みする）
+        output_path = self.output_dir / 'chat-index.json'
+        tmp_path = output_path.with_name(output_path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(chat_index, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, output_path)
+        
+        # flask-api が mmap して読み込むバイナリ版
+        snapshot_size = write_chat_snapshot(chat_index, self.output_dir / 'chat-index.bin')
+        
+        print(f"チャット用インデックスを生成: chat-index.json / chat-index.bin ({len(chat_index['chunks'])}チャンク, "
+              f"語彙{len(chat_index['vocab'])}, v{chat_index['version']}, {snapshot_size // 1024}KB, "
+              f"キャッシュ {cache_stats['hits']}件再利用/{cache_stats['misses']}件再分割, "
+              f"関連ページ計算 {cache_stats['related']})")
+    
+    def generate_guidelines_data(self):
+        """チャットAPI（vercel-api）用のガイドラインデータを生成"""
+        if not self.vercel_api_dir or not self.vercel_api_dir.exists():
+            print("vercel-api が見つからないためガイドラインデータの生成をスキップ")
+            return
+        
+        guidelines = build_guidelines(self.pages)
+        write_guidelines(guidelines, self.vercel_api_dir)
+        
+        print(f"ガイドラインデータを生成: guidelines.json / guidelines-data.js ({len(guidelines)}件)")
+    
+    def build_intent_bundle(self):
+        """knowledge_base.json からAIチャットの意図判定データと回答をまとめる"""
+        if self.chat_index is None:
+            self.build_chat_index()
+        faqs, replaced = build_faq_answers(self.knowledge_base_path, self.chat_index)
+        
+        # よくある質問の意図にも解決済みの関連ページを付け、それ以外の意図の関連ページ名も同じ方法で解決する
+        related_pages = {faq['id']: faq['relatedPages'] for faq in faqs}
+        ranker = PageRanker(self.chat_index)
+        intents = load_knowledge_base_intents(self.knowledge_base_path)
+        for intent in intents:
+            if intent['id'] in related_pages:
+                intent['relatedPages'] = related_pages[intent['id']]
+            elif intent['relatedPages']:
+                intent['relatedPages'], unresolved = resolve_related_pages(
+                    intent['relatedPages'], intent['response'], ranker)
+                replaced.extend(unresolved)
+        if replaced:
+            print(f"存在しない関連ページを類似ページで補完: {', '.join(sorted(set(replaced)))}")
+        
+        self.intent_bundle = build_intent_matcher(intents, faqs, FAQ_MATCH_THRESHOLD)
+        return self.intent_bundle
+    
+    def intent_bundle_name(self):
+        """ページから参照する意図データのファイル名（内容のハッシュ付きで長期キャッシュ可能）"""
+        return f"intents-{self.intent_bundle['version']}.json"
+    
+    def generate_intent_bundle(self):
+        """AIチャットの意図データを出力（ブラウザ用のハッシュ付きファイルと flask-api 用の固定名ファイル）"""
+        if self.intent_bundle is None:
+            self.build_intent_bundle()
+        bundle = self.intent_bundle
+        bundle_name = self.intent_bundle_name()
+        
+        # 以前のビルドの意図データを削除
+        for stale in self.output_dir.glob('intents-*.json'):
+            if stale.name != bundle_name:
+                stale.unlink()
+        
+        for name in (bundle_name, 'intent-matcher.json'):
+            with open(self.output_dir / name, 'w', encoding='utf-8') as f:
+                json.dump(bundle, f, ensure_ascii=False, separators=(',', ':'))
+        
+        print(f"意図データを生成: {bundle_name} ({len(bundle['intents'])}件, よくある質問{len(bundle['faqs'])}件, "
+              f"{len(bundle['patterns'])}キーワード, {len(bundle['fail'])}状態)")
+    
+    def generate_fuzzy_index(self):
+        """あいまい検索用のn-gramインデックスを生成"""
+        fuzzy_index = build_fuzzy_index(self.search_entries)
+        
+        # ブラウザが取得するファイルなので空白なしで保存
+        output_path = self.output_dir / 'search-fuzzy.json'
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(fuzzy_index, f, ensure_ascii=False, separators=(',', ':'))
+        
+        print(f"あいまい検索インデックスを生成: search-fuzzy.json ({len(fuzzy_index['terms'])}語)")
     
     def run(self):
         """サイト生成の実行"""
@@ -681,6 +882,21 @@ Harukazeの理念、ディレクターの心得、業務プロセスなど、ま
         # 検索インデックスを生成
         self.generate_search_index()
         
+        # 検索データベースを生成
+        self.generate_search_db()
+        
+        # あいまい検索インデックスを生成
+        self.generate_fuzzy_index()
+        
+        # チャット用インデックスを生成
+        self.generate_chat_index()
+        
+        # AIチャットの意図データを生成
+        self.generate_intent_bundle()
+        
+        # チャットAPI用のガイドラインデータを生成
+        self.generate_guidelines_data()
+        
         print("=" * 50)
         print(f"サイト生成完了: {self.output_dir}")
         print("=" * 50)
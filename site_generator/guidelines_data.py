@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+チャットAPI（vercel-api）用のガイドラインデータ
+サイト生成で解析済みのページ情報から guidelines.json / guidelines-data.js を出力します。
+以前の scripts/prepare-data.js と同じ形式ですが、URLは実際の出力ファイル名
+（output_name）を使うため、サイトのリンクと常に一致します。
+"""
+
+import re
+import json
+from pathlib import Path
+
+# 本文に含まれていればキーワードとして登録する重要語
+IMPORTANT_WORDS = [
+    '納期', 'デザイナー', 'クライアント', 'フィードバック',
+    '品質', 'コミュニケーション', 'トラブル', '商談',
+    'ヒアリング', '提案', 'クロージング', '信頼関係',
+]
+
+SUMMARY_LENGTH = 500
+
+
+def summarize(content):
+    """見出しとMarkdown記法を除いた先頭の要約"""
+    summary = re.sub(r'#.*$', '', content, flags=re.MULTILINE)
+    summary = re.sub(r'\n{2,}', ' ', summary)
+    summary = re.sub(r'[*_`]', '', summary)
+    return summary.strip()[:SUMMARY_LENGTH]
+
+
+def extract_keywords(content):
+    """見出しと重要語からキーワードを抽出（重複なし・出現順）"""
+    keywords = []
+    for heading in re.findall(r'^#{1,3}\s+(.+)$', content, flags=re.MULTILINE):
+        keywords.append(heading.strip().lower())
+    keywords.extend(word for word in IMPORTANT_WORDS if word in content)
+    return list(dict.fromkeys(keywords))
+
+
+def build_guidelines(pages):
+    """ページ情報からガイドラインデータを構築"""
+    return [{
+        'title': page['title'],
+        'category': page['category'],
+        'url': page['output_name'],
+        'content': page['content'],
+        'summary': summarize(page['content']),
+        'keywords': extract_keywords(page['content']),
+        'filePath': page['relative_path'],
+    } for page in pages]
+
+
+def write_guidelines(guidelines, api_dir):
+    """vercel-api の data/guidelines.json と api/guidelines-data.js を出力"""
+    api_dir = Path(api_dir)
+    data = json.dumps(guidelines, ensure_ascii=False, indent=2)
+
+    data_path = api_dir / 'data' / 'guidelines.json'
+    data_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(data_path, 'w', encoding='utf-8') as f:
+        f.write(data)
+
+    # Vercel関数から require するためのCommonJS版
+    module_path = api_dir / 'api' / 'guidelines-data.js'
+    module_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(module_path, 'w', encoding='utf-8') as f:
+        f.write('module.exports = \n' + data)
+
+    return data_path, module_path
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+AIチャットの意図判定用 Aho-Corasick オートマトンと回答（intents-<version>.json）
+- knowledge_base.json の intents（キーワードと回答）
+- knowledge_base.json のカテゴリキーワードと質問文
+をビルド時に1つのオートマトンにまとめ、入力を1回走査するだけで全ての意図のスコアを計算できるようにします。
+キーワードが増えても判定時間は入力の長さにしか比例しません。
+回答も同じファイルに含めるため、ページには埋め込まず、AIチャットパネルを開いたときにだけ読み込みます。
+意図の回答の本文にはページへのリンクを書かず、related_pages のページ名をビルド時に出力済みのページに解決して
+relatedPages に含めます（faq_answers.resolve_related_pages、ページ構成が変わってもリンクが古くならない）。
+よくある質問の確定済み回答（faq_answers.py）も含め、完全一致・ほぼ一致する質問はLLMを使わずに回答します。
+
+スコアは従来の findBestResponse と同じで、入力に含まれるキーワード1つにつき5点
+（入力全体がキーワードと一致する場合は10点）で、ブラウザ（findBestResponse）と flask-api（intents.py）が
+このファイルのオートマトンで計算します。
+
+フォーマット（状態遷移はCSR形式の平坦な配列）:
+    {
+      "format": 3,
+      "version": "<内容のハッシュ>",
+      "intents":  [{"id", "response", "relatedPages": [{"url", "title", "category"}]}, ...],
+      "patterns": [[意図番号, 文字数], ...],
+      "edgeOffsets": [状態ごとの遷移の開始位置..., 終端],
+      "edgeChars":   "遷移文字を連結した文字列",
+      "edgeTargets": [遷移先の状態, ...],
+      "fail":        [失敗時の遷移先, ...],
+      "outOffsets":  [状態ごとの出力の開始位置..., 終端],
+      "outPatterns": [一致したパターン番号, ...],  # 失敗遷移先の出力も含めて展開済み
+      "faqs": [{"id", "key": 正規化した質問文, "response", "relatedPages"}, ...],
+      "faqThreshold": ほぼ一致とみなす文字2-gram集合のJaccard係数
+    }
+"""
+
+import json
+import hashlib
+import unicodedata
+from collections import deque
+
+INTENT_MATCHER_FORMAT = 3
+
+
+def normalize(text):
+    """全角半角・大文字小文字の違いを吸収し空白を除去（ブラウザ・flask-api と共通）"""
+    return ''.join(unicodedata.normalize('NFKC', text).lower().split())
+
+
+def load_knowledge_base_intents(knowledge_base_path):
+    """knowledge_base.json の意図（intents の各項目と、カテゴリキーワード + 質問文ごとの意図）"""
+    try:
+        with open(knowledge_base_path, 'r', encoding='utf-8') as f:
+            data = json.load(f).get('knowledge_base', {})
+    except OSError:
+        return []
+    intents = []
+    for intent in data.get('intents', []):
+        intents.append({
+            'id': f"intent:{intent['name']}",
+            'keywords': list(intent.get('keywords', [])),
+            'response': intent['response'],
+            'relatedPages': intent.get('related_pages', []),
+        })
+    for category in data.get('categories', []):
+        for number, question in enumerate(category.get('questions', [])):
+            intents.append({
+                'id': f"kb:{category['name']}:{number}",
+                'keywords': list(category.get('keywords', [])) + [question['question']],
+                'response': question['answer'],
+                'relatedPages': question.get('related_pages', []),
+            })
+    return intents
+
+
+def build_intent_matcher(intents, faqs=(), faq_threshold=1.0):
+    """意図のリスト（とよくある質問の回答）からオートマトンを構築"""
+    # パターンの登録（正規化後に同じ意図で重複するものは1つにまとめる）
+    patterns = []
+    pattern_ids = {}
+    for intent_number, intent in enumerate(intents):
+        for keyword in intent['keywords']:
+            text = normalize(keyword)
+            if text and (intent_number, text) not in pattern_ids:
+                pattern_ids[(intent_number, text)] = len(patterns)
+                patterns.append((intent_number, text))
+
+    # トライ木
+    goto = [{}]
+    outputs = [[]]
+    for pattern_id, (_, text) in enumerate(patterns):
+        state = 0
+        for ch in text:
+            if ch not in goto[state]:
+                goto.append({})
+                outputs.append([])
+                goto[state][ch] = len(goto) - 1
+            state = goto[state][ch]
+        outputs[state].append(pattern_id)
+
+    # 失敗遷移（幅優先で、失敗遷移先の出力を展開しておく）
+    fail = [0] * len(goto)
+    queue = deque(goto[0].values())
+    while queue:
+        state = queue.popleft()
+        for ch, target in goto[state].items():
+            queue.append(target)
+            fallback = fail[state]
+            while fallback and ch not in goto[fallback]:
+                fallback = fail[fallback]
+            fail[target] = goto[fallback].get(ch, 0)
+            outputs[target] = outputs[target] + outputs[fail[target]]
+
+    edge_offsets = [0]
+    edge_chars = []
+    edge_targets = []
+    out_offsets = [0]
+    out_patterns = []
+    for state in range(len(goto)):
+        for ch, target in sorted(goto[state].items()):
+            edge_chars.append(ch)
+            edge_targets.append(target)
+        edge_offsets.append(len(edge_targets))
+        out_patterns.extend(sorted(set(outputs[state])))
+        out_offsets.append(len(out_patterns))
+
+    public_intents = [{k: v for k, v in intent.items() if k != 'keywords'} for intent in intents]
+    body = {
+        'intents': public_intents,
+        'patterns': [[intent_number, len(text)] for intent_number, text in patterns],
+        'edgeOffsets': edge_offsets,
+        'edgeChars': ''.join(edge_chars),
+        'edgeTargets': edge_targets,
+        'fail': fail,
+        'outOffsets': out_offsets,
+        'outPatterns': out_patterns,
+        'faqs': list(faqs),
+        'faqThreshold': faq_threshold,
+    }
+    digest = hashlib.sha256(
+        json.dumps(body, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    return {'format': INTENT_MATCHER_FORMAT, 'version': digest, **body}
+
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+関連ページの事前計算
+ページごとのTF-IDFベクトル（変換後の本文の文字2-gram）のコサイン類似度で、
+各ページに似ているページを上位 top_k 件まで求めます。
+
+- 語の出現回数はチャット用インデックスのチャンク分割結果（キャッシュ済み）をページ単位に合算して使う
+- 1ページにしか出てこない語はどのページ対の類似度にも寄与しないため、
+  正規化した後に行列から除いてから ページ×ページ の類似度行列を計算する
+- NumPy があれば行列積と argpartition でまとめて計算し、なければ純Pythonで同じ計算をする
+
+結果はチャット用インデックスの pages[].related（ページ番号のリスト）と、
+各ページの「関連ページ」欄に出力され、ブラウザやチャットAPIでは計算しません。
+"""
+
+import math
+
+try:
+    import numpy as np
+except ImportError:  # NumPy がない環境では純Pythonで計算
+    np = None
+
+# 1ページあたりの関連ページ数と、関連ページとみなす類似度の下限
+RELATED_TOP_K = 5
+MIN_SIMILARITY = 0.05
+
+
+def merge_counts(counts_list):
+    """チャンクごとの語の出現回数をページ単位に合算"""
+    merged = {}
+    for counts in counts_list:
+        for term, count in counts.items():
+            merged[term] = merged.get(term, 0) + count
+    return merged
+
+
+def page_vectors(page_counts):
+    """ページごとの出現回数から、L2正規化したTF-IDFベクトル [{語: 重み}] を作成
+
+    複数のページに出てくる語だけを残します（正規化は全ての語で行うため、類似度は変わりません）。
+    """
+    document_frequency = {}
+    for counts in page_counts:
+        for term in counts:
+            document_frequency[term] = document_frequency.get(term, 0) + 1
+
+    total = len(page_counts)
+    vectors = []
+    for counts in page_counts:
+        weights = {term: (1 + math.log(count)) * (math.log((1 + total) / (1 + document_frequency[term])) + 1)
+                   for term, count in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+        vectors.append({term: weight / norm for term, weight in weights.items()
+                        if document_frequency[term] > 1})
+    return vectors
+
+
+def _top_related_numpy(vectors, top_k, min_score):
+    terms = sorted({term for vector in vectors for term in vector})
+    term_ids = {term: i for i, term in enumerate(terms)}
+    matrix = np.zeros((len(vectors), len(terms)), dtype=np.float32)
+    for row, vector in enumerate(vectors):
+        for term, weight in vector.items():
+            matrix[row, term_ids[term]] = weight
+
+    similarity = matrix @ matrix.T
+    np.fill_diagonal(similarity, -1.0)
+    k = min(top_k, len(vectors) - 1)
+    candidates = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+    related = []
+    for row, columns in enumerate(candidates):
+        scores = similarity[row, columns]
+        related.append([(int(column), float(score)) for column, score in zip(columns, scores)
+                        if score >= min_score])
+    return related
+
+
+def _top_related_python(vectors, top_k, min_score):
+    # 語→(ページ, 重み) の転置リストで、語を共有するページ対の内積だけを足し合わせる
+    postings = {}
+    for row, vector in enumerate(vectors):
+        for term, weight in vector.items():
+            postings.setdefault(term, []).append((row, weight))
+
+    related = []
+    for row, vector in enumerate(vectors):
+        scores = {}
+        for term, weight in vector.items():
+            for other, other_weight in postings[term]:
+                if other != row:
+                    scores[other] = scores.get(other, 0.0) + weight * other_weight
+        related.append([(other, score) for other, score in scores.items() if score >= min_score])
+    return related
+
+
+def build_related_pages(page_counts, top_k=RELATED_TOP_K, min_score=MIN_SIMILARITY, use_numpy=None):
+    """ページごとの語の出現回数から関連ページ（類似度の高い順のページ番号）を求める
+
+    use_numpy=None なら NumPy の有無で自動選択、False で純Pythonに固定します。
+    戻り値は (ページごとの [(ページ番号, 類似度), ...], 使用した計算方法)。
+    """
+    if len(page_counts) < 2 or top_k <= 0:
+        return [[] for _ in page_counts], 'none'
+    vectors = page_vectors(page_counts)
+    use_numpy = np is not None if use_numpy is None else use_numpy and np is not None
+    if use_numpy:
+        related = _top_related_numpy(vectors, top_k, min_score)
+    else:
+        related = _top_related_python(vectors, top_k, min_score)
+    # 同点はページ番号順にして、計算方法によらず同じ結果にする
+    ranked = [sorted(row, key=lambda item: (-round(item[1], 5), item[0]))[:top_k] for row in related]
+    return ranked, 'numpy' if use_numpy else 'python'
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+SQLite FTS5 検索データベース
+- search-index.json と同じエントリから search.db を生成
+- trigram トークナイザーで日本語の部分一致検索に対応
+- 検索サーバー（search_server.py）から使う検索関数
+"""
+
+import os
+import re
+import html
+import sqlite3
+from pathlib import Path
+
+# search.db のスキーマバージョン（PRAGMA user_version に保存）
+SCHEMA_VERSION = 2
+
+# ハイライト用の一時マーカー（HTMLエスケープ後にspanへ置換する）
+MARK_START = '\ue000'
+MARK_END = '\ue001'
+
+# trigram トークナイザーは3文字未満の語をMATCHできない
+MIN_MATCH_LENGTH = 3
+
+
+def build_search_db(entries, db_path):
+    """検索エントリからFTS5データベースを生成"""
+    db_path = Path(db_path)
+    tmp_path = db_path.with_name(db_path.name + '.tmp')
+    if tmp_path.exists():
+        tmp_path.unlink()
+
+    conn = sqlite3.connect(str(tmp_path))
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE sections USING fts5(
+                page_title,
+                section_title,
+                content,
+                keywords,
+                url UNINDEXED,
+                section_id UNINDEXED,
+                category UNINDEXED,
+                tokenize = 'trigram'
+            )
+        ''')
+        conn.executemany(
+            'INSERT INTO sections(page_title, section_title, content, keywords, url, section_id, category) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(
+                entry['pageTitle'],
+                entry['sectionTitle'],
+                entry['content'],
+                ' '.join(entry.get('keywords', [])),
+                entry['url'],
+                entry['sectionId'],
+                entry['category'],
+            ) for entry in entries]
+        )
+        # セグメントを1つにまとめて検索を高速化
+        conn.execute("INSERT INTO sections(sections) VALUES ('optimize')")
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        conn.commit()
+    finally:
+        conn.close()
+
+    # 稼働中の検索サーバーが書きかけのファイルを読まないよう差し替える
+    os.replace(tmp_path, db_path)
+
+
+def open_search_db(db_path):
+    """検索データベースを読み取り専用で開く"""
+    uri = Path(db_path).resolve().as_uri() + '?mode=ro'
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if version != SCHEMA_VERSION:
+        conn.close()
+        raise ValueError(f'search.db のバージョンが一致しません: {version} (期待値: {SCHEMA_VERSION})')
+    return conn
+
+
+def _render_marked(text):
+    """マーカー付きテキストをHTMLエスケープしてハイライトspanに変換"""
+    text = html.escape(text)
+    text = text.replace(MARK_START, '<span class="search-result-highlight">')
+    return text.replace(MARK_END, '</span>')
+
+
+def _mark_terms(text, terms):
+    """短い検索語（MATCH不可）をマーカーで囲む"""
+    for term in terms:
+        text = re.sub(re.escape(term), lambda m: MARK_START + m.group(0) + MARK_END,
+                      text, flags=re.IGNORECASE)
+    return text
+
+
+def _excerpt_around(text, terms, width=50):
+    """最初に一致した語の前後を抜粋"""
+    lower_text = text.lower()
+    positions = [lower_text.find(term.lower()) for term in terms]
+    positions = [p for p in positions if p >= 0]
+    if not positions:
+        return text[:150] + ('...' if len(text) > 150 else '')
+    index = min(positions)
+    start = max(0, index - width)
+    end = min(len(text), index + width * 2)
+    return ('...' if start > 0 else '') + text[start:end] + ('...' if end < len(text) else '')
+
+
+def _display_title(page_title, section_title):
+    """クライアントと同じ「ページ > セクション」形式のタイトル"""
+    plain_section_title = section_title.replace(MARK_START, '').replace(MARK_END, '')
+    if plain_section_title != page_title:
+        return f'{page_title} > {section_title}'
+    return page_title
+
+
+def _like_pattern(term):
+    """語を部分一致の LIKE パターンに変換（% _ \\ は ESCAPE '\\' でそのままの文字として扱う）"""
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return '%' + escaped + '%'
+
+
+def search(conn, query, limit=20):
+    """検索クエリを実行してランキング済みの結果を返す"""
+    terms = [t for t in query.split() if t]
+    if not terms or len(''.join(terms)) < 2:
+        return []
+
+    long_terms = [t for t in terms if len(t) >= MIN_MATCH_LENGTH]
+    short_terms = [t for t in terms if len(t) < MIN_MATCH_LENGTH]
+
+    where = []
+    params = []
+    if long_terms:
+        # 各語をフレーズとしてAND検索
+        where.append('sections MATCH ?')
+        params.append(' '.join('"' + t.replace('"', '""') + '"' for t in long_terms))
+    for term in short_terms:
+        # 3文字未満はLIKEで絞り込み（trigram索引は使われない）
+        where.append("(page_title || ' ' || section_title || ' ' || content || ' ' || keywords) LIKE ? ESCAPE '\\'")
+        params.append(_like_pattern(term))
+
+    if long_terms:
+        # タイトル一致を本文一致より重く、同義語（keywords）一致は最も軽く評価
+        sql = f'''
+            SELECT page_title,
+                   highlight(sections, 1, ?, ?),
+                   snippet(sections, 2, ?, ?, '...', 32),
+                   url, section_id, category
+            FROM sections
+            WHERE {' AND '.join(where)}
+            ORDER BY bm25(sections, 10.0, 5.0, 1.0, 0.3)
+            LIMIT ?
+        '''
+        params = [MARK_START, MARK_END, MARK_START, MARK_END] + params + [limit]
+    else:
+        sql = f'''
+            SELECT page_title, section_title, content, url, section_id, category
+            FROM sections
+            WHERE {' AND '.join(where)}
+            ORDER BY (section_title LIKE ? ESCAPE '\\') DESC, (page_title LIKE ? ESCAPE '\\') DESC,
+                     (content LIKE ? ESCAPE '\\') DESC, rowid
+            LIMIT ?
+        '''
+        like_first = params[0]
+        params = params + [like_first, like_first, like_first, limit]
+
+    results = []
+    for page_title, section_title, content, url, section_id, category in conn.execute(sql, params):
+        if not long_terms:
+            content = _excerpt_around(content, short_terms)
+        section_title = _mark_terms(section_title, short_terms)
+        content = _mark_terms(content, short_terms)
+        results.append({
+            'title': _render_marked(_display_title(page_title, section_title)),
+            'excerpt': _render_marked(content),
+            'url': url,
+            'sectionId': section_id,
+            'category': category,
+        })
+    return results
+
+
+def search_titles(conn, titles, limit=20):
+    """あいまい検索で見つかったタイトル・見出しに対応するセクションを返す"""
+    results = []
+    for title in titles:
+        rows = conn.execute(
+            'SELECT page_title, section_title, content, url, section_id, category FROM sections '
+            'WHERE section_title = ? OR (page_title = ? AND section_title = page_title) LIMIT ?',
+            (title, title, limit)
+        )
+        for page_title, section_title, content, url, section_id, category in rows:
+            results.append({
+                'title': html.escape(_display_title(page_title, section_title)),
+                'excerpt': html.escape(content[:150] + ('...' if len(content) > 150 else '')),
+                'url': url,
+                'sectionId': section_id,
+                'category': category,
+            })
+            if len(results) >= limit:
+                return results
+    return results
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+検索インデックスの差分更新
+- ページ単位のエントリブロックをコンテンツハッシュで管理
+- バージョン付きのベースインデックスと、ベースからの差分ファイルを出力
+- ブラウザは小さなマニフェストだけを毎回取得し、キャッシュ済みのベースに差分を適用
+
+出力構成（output_dir 配下）:
+    search-index-manifest.json          現在のバージョンと参照ファイル（毎回更新）
+    search-index/base-<ver>-<hash>.json ベース（内容が変わらない限り不変）
+    search-index/delta-<base>-<ver>-<hash>.json ベースからの累積差分（不変）
+
+ベース・差分のファイル名には内容のハッシュが含まれるため、長期キャッシュしても
+古い内容が返ることはありません。CDNでパージが必要なのはマニフェストだけです。
+"""
+
+import os
+import json
+import hashlib
+from pathlib import Path
+
+# マニフェストのフォーマットバージョン
+MANIFEST_FORMAT = 1
+
+MANIFEST_NAME = 'search-index-manifest.json'
+INDEX_DIR_NAME = 'search-index'
+
+# 変更されたエントリがこの割合を超えたら差分ではなく新しいベースを出力
+MAX_DELTA_RATIO = 0.3
+
+
+def _dumps(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+
+
+def _content_hash(data):
+    return hashlib.sha256(_dumps(data).encode('utf-8')).hexdigest()[:12]
+
+
+def build_blocks(entries):
+    """検索エントリをページ(URL)ごとのブロックにまとめる"""
+    order = []
+    blocks = {}
+    for entry in entries:
+        url = entry['url']
+        if url not in blocks:
+            order.append(url)
+            blocks[url] = {'entries': []}
+        blocks[url]['entries'].append(entry)
+    for block in blocks.values():
+        block['hash'] = _content_hash(block['entries'])
+    return order, blocks
+
+
+def _write_json(path, data):
+    """一時ファイル経由で書き込み（配信中に中途半端な内容を見せない）"""
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(_dumps(data))
+    os.replace(tmp_path, path)
+
+
+def _load_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_base(index_dir, version, order, blocks):
+    base = {'version': version, 'order': order, 'blocks': blocks}
+    name = f'base-{version}-{_content_hash(base)}.json'
+    _write_json(index_dir / name, base)
+    return f'{INDEX_DIR_NAME}/{name}'
+
+
+def _prune(index_dir, keep):
+    """現在と直前のマニフェストから参照されないファイルを削除"""
+    for path in index_dir.glob('*.json'):
+        if f'{INDEX_DIR_NAME}/{path.name}' not in keep:
+            path.unlink()
+
+
+def _referenced_files(manifest):
+    if not manifest:
+        return set()
+    files = {manifest['base']['file']}
+    if manifest.get('delta'):
+        files.add(manifest['delta']['file'])
+    return files
+
+
+def write_incremental_index(output_dir, entries, max_delta_ratio=MAX_DELTA_RATIO):
+    """ベース＋差分形式の検索インデックスを出力し、マニフェストを返す"""
+    output_dir = Path(output_dir)
+    index_dir = output_dir / INDEX_DIR_NAME
+    index_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_dir / MANIFEST_NAME
+
+    order, blocks = build_blocks(entries)
+    pages = {url: blocks[url]['hash'] for url in order}
+
+    previous = _load_json(manifest_path)
+    if previous and previous.get('format') != MANIFEST_FORMAT:
+        previous = None
+    base = _load_json(output_dir / previous['base']['file']) if previous else None
+
+    # 前回から変更がなければ何も書き換えない
+    if previous and base and previous.get('pages') == pages and previous.get('order') == order:
+        previous['status'] = 'unchanged'
+        return previous
+
+    version = previous['version'] + 1 if previous and base else 1
+
+    manifest = {
+        'format': MANIFEST_FORMAT,
+        'version': version,
+        'order': order,
+        'pages': pages,
+        'delta': None,
+    }
+
+    if base:
+        # ベースからの累積差分（クライアントはベース＋差分1つで最新になる）
+        base_blocks = base['blocks']
+        upsert = {url: blocks[url] for url in order
+                  if url not in base_blocks or base_blocks[url]['hash'] != blocks[url]['hash']}
+        remove = [url for url in base['order'] if url not in blocks]
+        changed_entries = sum(len(block['entries']) for block in upsert.values())
+
+        if changed_entries <= len(entries) * max_delta_ratio:
+            delta = {
+                'base': base['version'],
+                'version': version,
+                'order': order,
+                'upsert': upsert,
+                'remove': remove,
+            }
+            name = f"delta-{base['version']}-{version}-{_content_hash(delta)}.json"
+            _write_json(index_dir / name, delta)
+            manifest['base'] = previous['base']
+            manifest['delta'] = {'file': f'{INDEX_DIR_NAME}/{name}', 'pages': len(upsert) + len(remove)}
+
+    if 'base' not in manifest:
+        manifest['base'] = {'version': version, 'file': _write_base(index_dir, version, order, blocks)}
+
+    _write_json(manifest_path, manifest)
+    _prune(index_dir, _referenced_files(manifest) | _referenced_files(previous))
+
+    manifest['status'] = 'delta' if manifest['delta'] else 'base'
+    return manifest
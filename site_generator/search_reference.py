@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+クライアント検索のPython参照実装
+テンプレート（page_light_with_ai.html）の performSearch と同じ手順で
+静的インデックスを検索します。ブラウザを使わずに一致判定・順位付けの
+確認やベンチマーク（bench_search.py）ができます。
+
+JavaScript版との違い:
+- ハイライト用の正規表現はクエリをエスケープして作成（JS版は特殊文字でエラーになる）
+- 抜粋の位置は文字単位（JS版はUTF-16単位のため絵文字を含むと数文字ずれることがある）
+"""
+
+import re
+import json
+from pathlib import Path
+
+from fuzzy_index import fuzzy_search
+from search_index_delta import MANIFEST_NAME
+
+HIGHLIGHT = '<span class="search-result-highlight">{}</span>'
+
+# クライアントは2文字未満のクエリでは検索しない
+MIN_QUERY_LENGTH = 2
+
+
+def load_static_index(output_dir):
+    """ブラウザと同じ手順で検索インデックスを読み込む（ベース＋差分 → 全件JSON）"""
+    output_dir = Path(output_dir)
+    manifest_path = output_dir / MANIFEST_NAME
+    if manifest_path.exists():
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        with open(output_dir / manifest['base']['file'], 'r', encoding='utf-8') as f:
+            base = json.load(f)
+        blocks = dict(base['blocks'])
+        order = base['order']
+        if manifest.get('delta'):
+            with open(output_dir / manifest['delta']['file'], 'r', encoding='utf-8') as f:
+                delta = json.load(f)
+            for url in delta['remove']:
+                blocks.pop(url, None)
+            blocks.update(delta['upsert'])
+            order = delta['order']
+        return [entry for url in order if url in blocks for entry in blocks[url]['entries']]
+
+    with open(output_dir / 'search-index.json', 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_fuzzy_index(output_dir):
+    """あいまい検索インデックスを読み込む（なければNone）"""
+    path = Path(output_dir) / 'search-fuzzy.json'
+    if not path.exists():
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _display_title(item):
+    if item['sectionTitle'] != item['pageTitle']:
+        return f"{item['pageTitle']} > {item['sectionTitle']}"
+    return item['pageTitle']
+
+
+def _result(item, excerpt):
+    return {
+        'title': _display_title(item),
+        'excerpt': excerpt,
+        'url': item['url'],
+        'sectionId': item['sectionId'],
+        'category': item['category'],
+    }
+
+
+def perform_search(search_index, query, fuzzy_index=None):
+    """performSearch と同じ一致判定・順位付けで検索結果を返す"""
+    if not query or len(query) < MIN_QUERY_LENGTH or not search_index:
+        return []
+
+    lower_query = query.lower()
+    highlight = re.compile(re.escape(query), re.IGNORECASE)
+    results = []
+    keyword_results = []
+
+    for item in search_index:
+        page_title_match = lower_query in item['pageTitle'].lower()
+        section_title_match = lower_query in item['sectionTitle'].lower()
+        content = item['content']
+        content_match = lower_query in content.lower()
+        keyword_match = any(lower_query in keyword.lower() for keyword in item.get('keywords', []))
+
+        if not (page_title_match or section_title_match or content_match or keyword_match):
+            continue
+
+        if content_match:
+            index = content.lower().find(lower_query)
+            start = max(0, index - 50)
+            end = min(len(content), index + len(query) + 50)
+            excerpt = '...' + content[start:end] + '...'
+        else:
+            excerpt = content[:150] + '...'
+        excerpt = highlight.sub(lambda m: HIGHLIGHT.format(m.group(0)), excerpt)
+
+        if page_title_match or section_title_match or content_match:
+            results.append(_result(item, excerpt))
+        else:
+            keyword_results.append(_result(item, excerpt))
+
+    results.extend(keyword_results)
+
+    # 完全一致がなければ表記ゆれを許容して見出しを検索
+    if not results and fuzzy_index:
+        for term, _ in fuzzy_search(fuzzy_index, query):
+            for item in search_index:
+                section_title = item['sectionTitle'].strip()
+                page_title = item['pageTitle'].strip()
+                if section_title == term or (page_title == term and section_title == page_title):
+                    results.append(_result(item, item['content'][:150] + '...'))
+
+    # 重複を除去（同じURLとセクションIDの組み合わせ）
+    seen = set()
+    unique_results = []
+    for result in results:
+        key = (result['url'], result['sectionId'])
+        if key not in seen:
+            seen.add(key)
+            unique_results.append(result)
+    return unique_results
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) < 2:
+        print('使い方: python search_reference.py 検索語 [出力フォルダ]')
+        sys.exit(1)
+
+    output_dir = sys.argv[2] if len(sys.argv) > 2 else '../site_output'
+    index = load_static_index(output_dir)
+    for result in perform_search(index, sys.argv[1], load_fuzzy_index(output_dir))[:20]:
+        print(f"{result['url']}#{result['sectionId']}  {result['title']}")
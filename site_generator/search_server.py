@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+検索APIサーバー
+- 生成済みの search.db を使って /search?q= に応答
+- ランキング済み・ハイライト済みの結果をJSONで返す
+- 一致がない場合は search-fuzzy.json で表記ゆれを許容して再検索
+
+使い方:
+    python search_server.py --db ../site_output/search.db --port 8001
+
+テンプレート側は SEARCH_API_URL=http://localhost:8001 を設定して生成すると
+このサーバーを使い、未設定の場合は静的な search-index.json を使います。
+"""
+
+import os
+import json
+import argparse
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from search_db import open_search_db, search, search_titles
+from fuzzy_index import fuzzy_search
+
+# 1リクエストで返す最大件数
+MAX_LIMIT = 50
+
+
+class SearchRequestHandler(BaseHTTPRequestHandler):
+    """/search エンドポイントのハンドラー"""
+
+    server_version = 'HarukazeSearch/1.0'
+
+    def _connection(self):
+        """スレッドごとのSQLite接続を取得（search.db が再生成されたら開き直す）"""
+        local = self.server.local
+        mtime = os.stat(self.server.db_path).st_mtime_ns
+        if getattr(local, 'mtime', None) != mtime:
+            if getattr(local, 'conn', None) is not None:
+                local.conn.close()
+            local.conn = open_search_db(self.server.db_path)
+            local.mtime = mtime
+        return local.conn
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Cache-Control', 'public, max-age=60')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
+        self.end_headers()
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if parsed.path != '/search':
+            self._send_json(404, {'error': 'Not found'})
+            return
+
+        params = parse_qs(parsed.query)
+        query = params.get('q', [''])[0].strip()
+        try:
+            limit = max(1, min(int(params.get('limit', ['20'])[0]), MAX_LIMIT))
+        except ValueError:
+            limit = 20
+
+        conn = self._connection()
+        results = search(conn, query, limit=limit) if query else []
+        fuzzy = False
+        if query and not results and self.server.fuzzy_index:
+            # 完全一致がなければ表記ゆれ候補の見出しで再検索
+            terms = [term for term, _ in fuzzy_search(self.server.fuzzy_index, query, limit=limit)]
+            results = search_titles(conn, terms, limit=limit)
+            fuzzy = bool(results)
+        self._send_json(200, {'query': query, 'results': results, 'fuzzy': fuzzy})
+
+    def log_message(self, format, *args):
+        # アクセスログは標準エラーではなく標準出力へ
+        print(f"{self.address_string()} - {format % args}")
+
+
+def load_fuzzy_index(path):
+    """あいまい検索インデックスを読み込む（なければNone）"""
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def create_server(db_path, host='127.0.0.1', port=8001, fuzzy_path=None):
+    """検索サーバーを作成"""
+    # 起動時にDBを検証しておく
+    open_search_db(db_path).close()
+    if fuzzy_path is None:
+        fuzzy_path = Path(db_path).with_name('search-fuzzy.json')
+    server = ThreadingHTTPServer((host, port), SearchRequestHandler)
+    server.db_path = db_path
+    server.local = threading.local()
+    server.fuzzy_index = load_fuzzy_index(fuzzy_path)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='search.db を使う検索APIサーバー')
+    parser.add_argument('--db', default='../site_output/search.db', help='search.db のパス')
+    parser.add_argument('--fuzzy', default=None, help='search-fuzzy.json のパス（省略時は search.db と同じフォルダ）')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    args = parser.parse_args()
+
+    server = create_server(args.db, args.host, args.port, fuzzy_path=args.fuzzy)
+    print(f"検索サーバーを起動: http://{args.host}:{args.port}/search?q=")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+検索用の同義語テーブル
+- knowledge_base.json のカテゴリ別キーワード
+- knowledge_base.json の intents（AIチャットの意図）に定義されたキーワード
+をビルド時に同義語グループとしてまとめ、検索インデックスの各エントリに
+関連キーワードとして埋め込みます（「締切」で「納期」のセクションもヒット）。
+
+展開はインデックス側で行うため、検索時に複数クエリを投げる必要はありません。
+"""
+
+import json
+from pathlib import Path
+
+# 本文だけに現れる語は、この回数以上出てくる場合のみ「その話題のセクション」とみなす
+MIN_BODY_OCCURRENCES = 2
+
+
+def load_knowledge_base_groups(knowledge_base_path):
+    """knowledge_base.json のカテゴリと意図のキーワードを同義語グループとして読み込む"""
+    path = Path(knowledge_base_path)
+    if not path.exists():
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f).get('knowledge_base', {})
+    return [list(entry.get('keywords', []))
+            for entry in data.get('categories', []) + data.get('intents', [])]
+
+
+def build_synonym_table(groups):
+    """同義語グループから「語 → 同義語リスト」のテーブルを構築"""
+    table = {}
+    for group in groups:
+        terms = [term.strip() for term in group if term.strip()]
+        for term in terms:
+            synonyms = table.setdefault(term, set())
+            synonyms.update(t for t in terms if t != term)
+    return {term: sorted(synonyms) for term, synonyms in sorted(table.items())}
+
+
+def expand_keywords(title, body, table):
+    """セクションの話題となっている語の同義語のうち、テキストに現れないものを返す
+
+    「時間」「理由」のような一般的な語が本文に一度出ただけで展開すると
+    ほぼ全セクションがヒットするため、見出しに含まれるか本文に繰り返し
+    出てくる語だけを展開元にします。
+    """
+    lower_title = title.lower()
+    lower_body = body.lower()
+    expanded = set()
+    for term, synonyms in table.items():
+        lower_term = term.lower()
+        if lower_term in lower_title or lower_body.count(lower_term) >= MIN_BODY_OCCURRENCES:
+            expanded.update(synonyms)
+    return sorted(s for s in expanded
+                  if s.lower() not in lower_title and s.lower() not in lower_body)
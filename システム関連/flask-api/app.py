@@ -0,0 +1,146 @@
+"""
+Harukazeガイドライン チャットAPI（Flask版）
+vercel-api の /api/chat と同じ契約（message → response, relatedPages）で応答します。
+検索は site_generator が同じビルドで出力する chat-index.json を使い、
+インデックスはメモリに常駐させてリクエストごとの読み込みを避けます。
+
+起動:
+    python app.py                       # 開発用
+    gunicorn -w 2 -k gthread --threads 8 -b 0.0.0.0:5000 app:app  # ストリーミングのためスレッドワーカー
+"""
+
+import atexit
+import logging
+
+from flask import Flask, Response, jsonify, request, stream_with_context
+from flask_cors import CORS
+
+from config import Config
+from index_store import IndexStore
+from llm import create_llm_client
+from chat_service import ChatService, format_sse
+from metrics import CONTENT_TYPE, collect_service
+from feedback_store import (FeedbackStore, QueueFull, parse_submission, category_of, report_query,
+                            entries_query, authorized)
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+
+def create_app(config=Config, llm_client=None):
+    """Flaskアプリを作成"""
+    app = Flask(__name__)
+    CORS(app, origins=config.CORS_ORIGINS)
+
+    index_store = IndexStore(config.CHAT_INDEX_PATH, config.INDEX_RELOAD_INTERVAL)
+    service = ChatService(index_store, llm_client or create_llm_client(config), config)
+    app.extensions['chat_service'] = service
+    feedback = FeedbackStore(config.FEEDBACK_DB_PATH, config.FEEDBACK_BATCH_SIZE,
+                             config.FEEDBACK_FLUSH_INTERVAL, config.FEEDBACK_MAX_QUEUE)
+    app.extensions['feedback_store'] = feedback
+    # 終了時に書き込み待ちの投稿を保存する
+    atexit.register(feedback.close)
+    service.metrics.registry.add_collector(
+        lambda: collect_service(service, service.single_flight, service.llm_client, feedback_store=feedback,
+                                stream_flight=service.stream_flight))
+
+    @app.route('/api/chat', methods=['POST'])
+    def chat():
+        data = request.get_json(silent=True) or {}
+        message = (data.get('message') or '').strip()
+        if not message:
+            return jsonify({'error': 'Message is required'}), 400
+        return jsonify(service.answer(message))
+
+    @app.route('/api/chat/retrieval', methods=['POST'])
+    def chat_retrieval():
+        """LLMを使わず、検索結果のセクションの抜粋とリンクだけで回答（縮退モード）"""
+        data = request.get_json(silent=True) or {}
+        message = (data.get('message') or '').strip()
+        if not message:
+            return jsonify({'error': 'Message is required'}), 400
+        return jsonify(service.retrieval_answer(message))
+
+    @app.route('/api/chat/stream', methods=['POST'])
+    def chat_stream():
+        """回答をSSEで届いた順に返す（meta → token … → done）"""
+        data = request.get_json(silent=True) or {}
+        message = (data.get('message') or '').strip()
+        if not message:
+            return jsonify({'error': 'Message is required'}), 400
+
+        def events():
+            for event, payload in service.answer_stream(message):
+                yield format_sse(event, payload)
+
+        return Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            # nginx などのリバースプロキシでバッファリングさせない
+            'X-Accel-Buffering': 'no',
+        })
+
+    @app.route('/api/health', methods=['GET'])
+    def health():
+        index = index_store.current()
+        return jsonify({
+            'status': 'ok',
+            'indexVersion': index.version,
+            'chunks': len(index.chunks),
+            'retrieval': index.backend,
+            'intentMatcher': service.intent_store.current().version if service.intent_store else None,
+            'llm': service.llm_client.name,
+            'upstream': service.llm_client.stats(),
+            'responseCache': service.response_cache.stats(),
+            'semanticCache': service.semantic_cache.stats(),
+            'contextPacker': service.context_packer.stats(),
+            'singleFlight': service.single_flight.stats(),
+            'streamFlight': service.stream_flight.stats(),
+            'feedback': feedback.stats(),
+        })
+
+    @app.route('/api/feedback', methods=['POST'])
+    def submit_feedback():
+        """フィードバックを受け付ける（保存は後でまとめて行うため 202 を返す）"""
+        try:
+            entry = parse_submission(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if not entry['category'] and entry['page']:
+            entry['category'] = category_of(index_store.current().pages, entry['page'])
+        try:
+            feedback.submit(entry)
+        except QueueFull as e:
+            return jsonify({'error': str(e), 'retryAfter': e.retry_after}), 503, {'Retry-After': str(e.retry_after)}
+        return jsonify({'success': True}), 202
+
+    @app.route('/api/feedback/report', methods=['GET'])
+    def feedback_report():
+        """ページ別・カテゴリ別の件数と平均評価（?by=page|category&since=&until=）"""
+        if not authorized(config.FEEDBACK_REPORT_TOKEN, request.headers.get('Authorization'), request.remote_addr):
+            return jsonify({'error': 'Forbidden'}), 403
+        try:
+            return jsonify({'report': feedback.report(**report_query(request.args))})
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+    @app.route('/api/feedback/entries', methods=['GET'])
+    def feedback_entries():
+        """投稿の一覧（?page=&category=&since=&until=&untilId=&limit=、新しい順）"""
+        if not authorized(config.FEEDBACK_REPORT_TOKEN, request.headers.get('Authorization'), request.remote_addr):
+            return jsonify({'error': 'Forbidden'}), 403
+        try:
+            return jsonify({'entries': feedback.entries(**entries_query(request.args))})
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """Prometheus のテキスト形式のメトリクス"""
+        return Response(service.metrics.render(), content_type=CONTENT_TYPE)
+
+    return app
+
+
+app = create_app()
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=5000, debug=Config.DEBUG)
@@ -0,0 +1,240 @@
+"""
+Harukazeガイドライン チャットAPI（非同期サーバー版）
+app.py（Flask）と同じAPIを aiohttp で提供します。LLMの応答待ちでワーカーを占有しないため、
+質問が集中してもヘルスチェックやキャッシュ済みの回答はすぐに返ります。
+
+- LLM呼び出しは同時 CHAT_MAX_CONCURRENCY 件まで、空き待ちは CHAT_MAX_QUEUE 件まで
+- 待ち行列が一杯、または CHAT_QUEUE_TIMEOUT 秒待っても空かない場合は 429（Retry-After 付き）
+- LLMの回答が CHAT_DEGRADE_AFTER 秒以内に届かない場合は、検索結果のセクションだけで回答
+- インデックスの更新はバックグラウンドのタスクがスレッドプールで確認・読み込みし、
+  リクエストは差し替え済みのインデックスを参照するだけ（読み込み中も配信中のストリームを止めない）
+
+起動:
+    python async_app.py --port 5000
+"""
+
+import json
+import asyncio
+import logging
+import argparse
+
+from aiohttp import web
+
+from config import Config
+from index_store import IndexStore
+from llm import create_async_llm_client
+from chat_service import ChatService, format_sse
+from async_chat_service import AsyncChatService
+from concurrency import ConcurrencyLimiter, Saturated
+from metrics import CONTENT_TYPE, collect_service
+from feedback_store import (FeedbackStore, QueueFull, parse_submission, category_of, report_query,
+                            entries_query, authorized)
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+
+def json_response(data, status=200, headers=None):
+    return web.json_response(data, status=status, headers=headers,
+                             dumps=lambda value: json.dumps(value, ensure_ascii=False))
+
+
+def too_busy(error):
+    """混雑時の 429 レスポンス"""
+    return json_response({'error': 'Too many requests', 'retryAfter': error.retry_after},
+                         status=429, headers={'Retry-After': str(error.retry_after)})
+
+
+async def read_message(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = {}
+    return ((data or {}).get('message') or '').strip() if isinstance(data, dict) else ''
+
+
+def create_async_app(config=Config, llm_client=None):
+    """aiohttp アプリを作成"""
+    index_store = IndexStore(config.CHAT_INDEX_PATH, config.INDEX_RELOAD_INTERVAL, auto_reload=False)
+    chat_service = ChatService(index_store, None, config)
+    limiter = ConcurrencyLimiter(config.CHAT_MAX_CONCURRENCY, config.CHAT_MAX_QUEUE, config.CHAT_QUEUE_TIMEOUT)
+    service = AsyncChatService(chat_service, llm_client or create_async_llm_client(config), limiter)
+    feedback = FeedbackStore(config.FEEDBACK_DB_PATH, config.FEEDBACK_BATCH_SIZE,
+                             config.FEEDBACK_FLUSH_INTERVAL, config.FEEDBACK_MAX_QUEUE)
+    service.metrics.registry.add_collector(
+        lambda: collect_service(chat_service, service.single_flight, service.llm_client, limiter, feedback,
+                                service.stream_flight))
+
+    allowed_origins = [origin.strip() for origin in config.CORS_ORIGINS.split(',') if origin.strip()]
+
+    async def add_cors_headers(request, response):
+        # ストリーミングのレスポンスにも付けるため、ヘッダー送信直前に追加
+        origin = request.headers.get('Origin')
+        if '*' in allowed_origins:
+            response.headers['Access-Control-Allow-Origin'] = '*'
+        elif origin in allowed_origins:
+            response.headers['Access-Control-Allow-Origin'] = origin
+            response.headers['Vary'] = 'Origin'
+        response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
+        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
+
+    async def preflight(request):
+        return web.Response()
+
+    async def chat(request):
+        message = await read_message(request)
+        if not message:
+            return json_response({'error': 'Message is required'}, status=400)
+        try:
+            return json_response(await service.answer(message))
+        except Saturated as e:
+            return too_busy(e)
+
+    async def chat_retrieval(request):
+        """LLMを使わず、検索結果のセクションの抜粋とリンクだけで回答（数ミリ秒のため枠を使わない）"""
+        message = await read_message(request)
+        if not message:
+            return json_response({'error': 'Message is required'}, status=400)
+        return json_response(chat_service.retrieval_answer(message))
+
+    async def chat_stream(request):
+        """回答をSSEで届いた順に返す（meta → token … → done）"""
+        message = await read_message(request)
+        if not message:
+            return json_response({'error': 'Message is required'}, status=400)
+
+        events = service.answer_stream(message)
+        try:
+            # 混雑時はレスポンス開始前に 429 を返す
+            first = await events.__anext__()
+        except Saturated as e:
+            return too_busy(e)
+
+        response = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            # nginx などのリバースプロキシでバッファリングさせない
+            'X-Accel-Buffering': 'no',
+        })
+        await response.prepare(request)
+        try:
+            await response.write(format_sse(*first).encode('utf-8'))
+            async for event, payload in events:
+                await response.write(format_sse(event, payload).encode('utf-8'))
+        finally:
+            # 切断時もLLM呼び出しの枠を確実に返却する
+            await events.aclose()
+        await response.write_eof()
+        return response
+
+    async def health(request):
+        index = index_store.current()
+        return json_response({
+            'status': 'ok',
+            'indexVersion': index.version,
+            'chunks': len(index.chunks),
+            'retrieval': index.backend,
+            'intentMatcher': chat_service.intent_store.current().version if chat_service.intent_store else None,
+            'llm': service.llm_client.name,
+            'upstream': service.llm_client.stats(),
+            'responseCache': chat_service.response_cache.stats(),
+            'semanticCache': chat_service.semantic_cache.stats(),
+            'contextPacker': chat_service.context_packer.stats(),
+            'singleFlight': service.single_flight.stats(),
+            'streamFlight': service.stream_flight.stats(),
+            'concurrency': limiter.stats(),
+            'feedback': feedback.stats(),
+        })
+
+    async def submit_feedback(request):
+        """フィードバックを受け付ける（待ち行列に入れるだけなのでイベントループを止めない）"""
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+        try:
+            entry = parse_submission(data)
+        except ValueError as e:
+            return json_response({'error': str(e)}, status=400)
+        if not entry['category'] and entry['page']:
+            entry['category'] = category_of(index_store.current().pages, entry['page'])
+        try:
+            feedback.submit(entry)
+        except QueueFull as e:
+            return json_response({'error': str(e), 'retryAfter': e.retry_after}, status=503,
+                                 headers={'Retry-After': str(e.retry_after)})
+        return json_response({'success': True}, status=202)
+
+    async def feedback_query(request, key, method, parse):
+        if not authorized(config.FEEDBACK_REPORT_TOKEN, request.headers.get('Authorization'), request.remote):
+            return json_response({'error': 'Forbidden'}, status=403)
+        try:
+            kwargs = parse(request.query)
+            # SQLite の読み込みはスレッドプールで実行
+            rows = await asyncio.get_running_loop().run_in_executor(None, lambda: method(**kwargs))
+        except ValueError as e:
+            return json_response({'error': str(e)}, status=400)
+        return json_response({key: rows})
+
+    async def feedback_report(request):
+        """ページ別・カテゴリ別の件数と平均評価（?by=page|category&since=&until=）"""
+        return await feedback_query(request, 'report', feedback.report, report_query)
+
+    async def feedback_entries(request):
+        """投稿の一覧（?page=&category=&since=&until=&untilId=&limit=、新しい順）"""
+        return await feedback_query(request, 'entries', feedback.entries, entries_query)
+
+    async def watch_indexes(app):
+        """INDEX_RELOAD_INTERVAL 秒ごとにインデックスの更新を確認（読み込みはスレッドプールで行う）"""
+        stores = [store for store in (index_store, chat_service.intent_store) if store is not None]
+
+        async def watch():
+            loop = asyncio.get_running_loop()
+            while True:
+                await asyncio.sleep(config.INDEX_RELOAD_INTERVAL)
+                for store in stores:
+                    await loop.run_in_executor(None, store.check)
+
+        task = asyncio.ensure_future(watch())
+        yield
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def close_resources(app):
+        # LLMクライアントの接続プールを閉じ、書き込み待ちのフィードバックを保存する
+        await service.llm_client.close()
+        feedback.close()
+
+    async def metrics(request):
+        """Prometheus のテキスト形式のメトリクス"""
+        return web.Response(body=service.metrics.render().encode('utf-8'), headers={'Content-Type': CONTENT_TYPE})
+
+    app = web.Application()
+    app['chat_service'] = service
+    app.on_response_prepare.append(add_cors_headers)
+    app.cleanup_ctx.append(watch_indexes)
+    app.on_cleanup.append(close_resources)
+    app.router.add_post('/api/chat', chat)
+    app.router.add_post('/api/chat/stream', chat_stream)
+    app.router.add_post('/api/chat/retrieval', chat_retrieval)
+    app.router.add_get('/api/health', health)
+    app.router.add_get('/metrics', metrics)
+    app.router.add_post('/api/feedback', submit_feedback)
+    app.router.add_get('/api/feedback/report', feedback_report)
+    app.router.add_get('/api/feedback/entries', feedback_entries)
+    app.router.add_route('OPTIONS', '/api/{tail:.*}', preflight)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='チャットAPI（非同期サーバー）')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    args = parser.parse_args()
+    web.run_app(create_async_app(), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+"""
+非同期サーバー（async_app）用のチャット応答
+検索・プロンプト構築・キャッシュは ChatService と共通で、LLM呼び出しだけを非同期で行います。
+LLM呼び出しは ConcurrencyLimiter の枠内で実行し、キャッシュヒットや同じ質問の待機は枠を使いません。
+メトリクスは ChatService の ChatMetrics に記録します。
+
+LLMの回答（ストリーミングは最初の断片）が CHAT_DEGRADE_AFTER 秒以内に届かない場合は、
+呼び出しを取り消して検索結果のセクションだけで回答します（LLMに障害がある場合と同じ縮退モード）。
+"""
+
+import time
+import asyncio
+import logging
+
+from chat_service import UPSTREAM_ERROR_NOTE
+from llm import LLMError
+from response_cache import make_key
+from single_flight import AsyncSingleFlight, AsyncStreamFlight, CoalescedTimeout, CoalescedAborted
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamTimeout(LLMError):
+    """LLMの応答が CHAT_DEGRADE_AFTER 秒以内に届かなかった"""
+
+    def __init__(self, seconds):
+        super().__init__(f'LLMの応答が{seconds}秒以内に届きませんでした')
+
+
+class AsyncChatService:
+    """/api/chat の応答を非同期に生成するサービス"""
+
+    def __init__(self, chat_service, llm_client, limiter):
+        self.chat_service = chat_service
+        self.llm_client = llm_client
+        self.limiter = limiter
+        self.single_flight = AsyncSingleFlight()
+        self.stream_flight = AsyncStreamFlight()
+        self.metrics = chat_service.metrics
+        self.degrade_after = chat_service.config.CHAT_DEGRADE_AFTER or None
+
+    async def _within_deadline(self, call):
+        """LLMの回答を degrade_after 秒まで待つ（過ぎたら取り消して UpstreamTimeout）"""
+        try:
+            return await asyncio.wait_for(call, self.degrade_after)
+        except asyncio.TimeoutError:
+            raise UpstreamTimeout(self.degrade_after) from None
+
+    async def _stream_within_deadline(self, stream):
+        """最初の断片を degrade_after 秒まで待ち、以降は届いた順に返す"""
+        try:
+            try:
+                first = await self._within_deadline(stream.__anext__())
+            except StopAsyncIteration:
+                return
+            yield first
+            async for piece in stream:
+                yield piece
+        finally:
+            await stream.aclose()
+
+    async def answer(self, message):
+        """質問に回答（混雑時は Saturated を送出）"""
+        started = time.perf_counter()
+        self.metrics.in_flight.inc()
+        try:
+            return await self._answer(message)
+        finally:
+            self.metrics.in_flight.dec()
+            self.metrics.total.observe(time.perf_counter() - started)
+
+    async def _answer(self, message):
+        service = self.chat_service
+        faq = service.faq_result(message)
+        if faq is not None:
+            self.metrics.faq_answers.inc()
+            return faq
+
+        version = service.index_store.current().version
+        key = make_key(message, version)
+        cached = service.cached_answer(message, key, version)
+        if cached is not None:
+            self.metrics.cached_answers.inc()
+            return dict(cached)
+
+        try:
+            result = await self.single_flight.do(
+                key, lambda: self._generate(message, key, version), timeout=service.config.COALESCE_TIMEOUT)
+        except CoalescedTimeout as e:
+            logger.warning('%s: %s', e, message)
+            result = service.fallback_result(message)
+            self.metrics.fallback_answers.inc()
+        return dict(result)
+
+    async def answer_stream(self, message):
+        """質問への回答を (イベント名, データ) で順に返す非同期ジェネレーター
+
+        ChatService.answer_stream と同じイベントを返します。混雑時は最初のイベントの前に Saturated を送出するため、
+        呼び出し側は最初のイベントを受け取ってからレスポンスを開始してください。
+        """
+        started = time.perf_counter()
+        self.metrics.in_flight.inc()
+        events = self._answer_stream(message)
+        try:
+            async for event in events:
+                yield event
+        finally:
+            # 切断時は内側のジェネレーターも閉じる（同じ質問を待つリクエストがいなければLLM呼び出しの枠を返却する）
+            await events.aclose()
+            self.metrics.in_flight.dec()
+            self.metrics.total.observe(time.perf_counter() - started)
+
+    async def _answer_stream(self, message):
+        service = self.chat_service
+        faq = service.faq_result(message)
+        if faq is not None:
+            self.metrics.faq_answers.inc()
+            yield 'meta', {'relatedPages': faq['relatedPages']}
+            yield 'token', {'text': faq['response']}
+            yield 'done', {'cached': True, 'faq': True}
+            return
+
+        version = service.index_store.current().version
+        key = make_key(message, version)
+        cached = service.cached_answer(message, key, version)
+        if cached is None and self.single_flight.in_flight(key):
+            try:
+                cached = await self.single_flight.do(
+                    key, lambda: self._generate(message, key, version), timeout=service.config.COALESCE_TIMEOUT)
+            except CoalescedTimeout as e:
+                logger.warning('%s: %s', e, message)
+        if cached is not None:
+            self.metrics.cached_answers.inc()
+            yield 'meta', {'relatedPages': cached['relatedPages']}
+            yield 'token', {'text': cached['response']}
+            yield 'done', {'cached': True}
+            return
+
+        # 同じ質問のストリーミングが実行中なら、そのイベントを先頭から再生して問い合わせを1回にまとめる
+        # （混雑時の Saturated は最初のイベントの前に送出される）
+        sent = set()
+        events = self.stream_flight.stream(key, lambda: self._stream_events(message, key, version),
+                                           timeout=service.config.COALESCE_TIMEOUT)
+        try:
+            async for event in events:
+                sent.add(event[0])
+                yield event
+        except (CoalescedTimeout, CoalescedAborted) as e:
+            logger.warning('%s: %s', e, message)
+            for event in service.stream_fallback(message, sent):
+                yield event
+        finally:
+            await events.aclose()
+
+    async def _stream_events(self, message, key, version):
+        """検索とLLMのストリーミングで meta → token … → done のイベントを作り、回答をキャッシュに登録"""
+        service = self.chat_service
+        chunks = service.retrieve(message)
+        prompt = service.build_prompt(message, chunks)
+        related_pages = service.related_pages(chunks)
+
+        async with self.limiter.slot():
+            yield 'meta', {'relatedPages': related_pages}
+            pieces = []
+            upstream_started = time.perf_counter()
+            try:
+                async for piece in self._stream_within_deadline(self.llm_client.stream(prompt, chunks)):
+                    if not pieces:
+                        self.metrics.first_token.observe(time.perf_counter() - upstream_started)
+                    pieces.append(piece)
+                    yield 'token', {'text': piece}
+            except LLMError as e:
+                logger.error('LLM呼び出しに失敗: %s', e)
+                self.metrics.upstream.observe(time.perf_counter() - upstream_started)
+                self.metrics.upstream_error(e)
+                self.metrics.fallback_answers.inc()
+                text = UPSTREAM_ERROR_NOTE if pieces else service.fallback_result(message)['response']
+                yield 'token', {'text': text}
+                yield 'done', {'cached': False, 'degraded': True}
+                return
+            self.metrics.upstream.observe(time.perf_counter() - upstream_started)
+            self.metrics.llm_answers.inc()
+
+        service.remember(message, key, version,
+                         {'response': ''.join(pieces), 'relatedPages': related_pages, 'success': True})
+        yield 'done', {'cached': False}
+
+    async def _generate(self, message, key, version):
+        """検索とLLM呼び出しで回答を作成し、キャッシュに登録"""
+        service = self.chat_service
+        chunks = service.retrieve(message)
+        prompt = service.build_prompt(message, chunks)
+
+        async with self.limiter.slot():
+            started = time.perf_counter()
+            try:
+                response = await self._within_deadline(self.llm_client.generate(prompt, chunks))
+            except LLMError as e:
+                logger.error('LLM呼び出しに失敗: %s', e)
+                self.metrics.upstream.observe(time.perf_counter() - started)
+                self.metrics.upstream_error(e)
+                self.metrics.fallback_answers.inc()
+                return service.fallback_result(message)
+            self.metrics.upstream.observe(time.perf_counter() - started)
+            self.metrics.llm_answers.inc()
+
+        result = {
+            'response': response,
+            'relatedPages': service.related_pages(chunks),
+            'success': True,
+        }
+        service.remember(message, key, version, result)
+        return result
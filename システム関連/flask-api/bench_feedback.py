@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+フィードバック保存のベンチマーク
+一時ディレクトリの SQLite に合成した投稿を書き込み、
+1件ずつコミットする場合と FeedbackStore のまとめ書きの書き込み速度、
+数万件を保存した状態での集計・一覧の応答時間と実行計画（索引を使っているか）を計測します。
+
+使い方:
+    python bench_feedback.py                        # 5万件
+    python bench_feedback.py --rows 200000 --json
+"""
+
+import json
+import math
+import time
+import random
+import argparse
+import tempfile
+from pathlib import Path
+
+from feedback_store import FeedbackStore, INSERT, SCHEMA, KINDS, connect
+
+CATEGORIES = ['基本ガイドライン', 'コミュニケーション', '納期管理', 'トラブルシューティング', 'ツール']
+
+
+def percentile(sorted_values, ratio):
+    """ソート済みリストのパーセンタイル（最近傍法）"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(ratio * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def make_entries(count, rng):
+    pages = [f'page_{i:02d}_{j}.html' for i in range(1, 21) for j in range(1, 5)]
+    for _ in range(count):
+        page = rng.choice(pages)
+        yield {
+            'page': page,
+            'category': CATEGORIES[pages.index(page) % len(CATEGORIES)],
+            'kind': rng.choice(KINDS),
+            'rating': rng.choice([None, 1, 2, 3, 4, 5]),
+            'message': 'このページの手順が分かりにくいので、具体例を追加してほしいです。' * rng.randint(1, 4),
+            'contact': '',
+        }
+
+
+def bench_single_commits(path, entries):
+    """1件ごとにトランザクションをコミットする場合"""
+    connection = connect(path)
+    connection.executescript(SCHEMA)
+    started = time.perf_counter()
+    for entry in entries:
+        connection.execute('BEGIN IMMEDIATE')
+        connection.execute(INSERT, (time.time(), entry['page'], entry['category'], entry['kind'],
+                                    entry['rating'], entry['message'], entry['contact']))
+        connection.execute('COMMIT')
+    elapsed = time.perf_counter() - started
+    connection.close()
+    return len(entries) / elapsed
+
+
+def bench_batched(path, entries, batch_size):
+    """FeedbackStore の待ち行列とまとめ書き（受付の速さと、保存完了までの速さ）"""
+    store = FeedbackStore(path, batch_size=batch_size, flush_interval=0.05, max_queue=len(entries) + 1)
+    started = time.perf_counter()
+    submit_latencies = []
+    for entry in entries:
+        t = time.perf_counter()
+        store.submit(entry)
+        submit_latencies.append(time.perf_counter() - t)
+    accepted = time.perf_counter() - started
+    store.close()
+    stored = time.perf_counter() - started
+    submit_latencies.sort()
+    return {
+        'acceptPerSec': round(len(entries) / accepted),
+        'storePerSec': round(len(entries) / stored),
+        'submitP99Us': round(percentile(submit_latencies, 0.99) * 1e6, 1),
+        'batches': store.batches,
+    }
+
+
+def bench_queries(path, rounds):
+    """集計・一覧の応答時間（ms）と実行計画"""
+    store = FeedbackStore(path)
+    reader = store._reader()
+    now = time.time()
+    queries = {
+        'reportByPage': lambda: store.report('page'),
+        'reportByCategory': lambda: store.report('category'),
+        'reportLast24h': lambda: store.report('page', since=now - 86400),
+        'entriesByPage': lambda: store.entries(page='page_03_2.html', limit=50),
+        'entriesByCategoryRange': lambda: store.entries(category='納期管理', since=now - 86400, limit=50),
+        'entriesLatest': lambda: store.entries(limit=50),
+    }
+    plans = {
+        'reportByPage': 'SELECT page, COUNT(*), AVG(rating), MAX(created_at) FROM feedback GROUP BY page',
+        'entriesByPage': "SELECT * FROM feedback WHERE page = 'x' ORDER BY created_at DESC LIMIT 50",
+        'entriesByCategoryRange': ("SELECT * FROM feedback WHERE category = 'x' AND created_at >= 0 "
+                                   'ORDER BY created_at DESC LIMIT 50'),
+    }
+    results = {}
+    for name, query in queries.items():
+        query()
+        timings = []
+        for _ in range(rounds):
+            t = time.perf_counter()
+            query()
+            timings.append(time.perf_counter() - t)
+        timings.sort()
+        results[name] = {'p50Ms': round(percentile(timings, 0.5) * 1000, 3),
+                         'p99Ms': round(percentile(timings, 0.99) * 1000, 3)}
+        if name in plans:
+            plan = reader.execute('EXPLAIN QUERY PLAN ' + plans[name]).fetchall()
+            results[name]['plan'] = '; '.join(row[-1] for row in plan)
+    store.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='フィードバック保存のベンチマーク')
+    parser.add_argument('--rows', type=int, default=50000, help='保存する投稿数')
+    parser.add_argument('--single-rows', type=int, default=2000, help='1件ずつコミットする場合の投稿数')
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=50, help='集計・一覧を繰り返す回数')
+    parser.add_argument('--json', action='store_true', help='結果をJSONで出力')
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as directory:
+        single = bench_single_commits(Path(directory) / 'single.db', list(make_entries(args.single_rows, rng)))
+        path = Path(directory) / 'feedback.db'
+        batched = bench_batched(path, list(make_entries(args.rows, rng)), args.batch_size)
+        queries = bench_queries(path, args.rounds)
+
+    result = {'rows': args.rows, 'singleCommitPerSec': round(single), 'batched': batched, 'queries': queries}
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    print(f'📊 書き込み: 1件ずつコミット {result["singleCommitPerSec"]:,}件/秒 → '
+          f'まとめ書き {batched["storePerSec"]:,}件/秒（受付 {batched["acceptPerSec"]:,}件/秒、'
+          f'p99 {batched["submitP99Us"]}µs、{batched["batches"]}回）')
+    print(f'📊 {args.rows:,}件を保存した状態の集計・一覧')
+    for name, timing in queries.items():
+        plan = f'  [{timing["plan"]}]' if 'plan' in timing else ''
+        print(f'  {name:<24} p50 {timing["p50Ms"]:>8.3f}ms  p99 {timing["p99Ms"]:>8.3f}ms{plan}')
+
+
+if __name__ == '__main__':
+    main()
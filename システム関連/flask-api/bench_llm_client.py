@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+LLMクライアントのベンチマーク
+fake_llm_server.py を同じプロセスで起動し、接続プールあり・なし（毎回新しい接続）の
+PooledHTTPLLMClient で同じ数の呼び出しを並列に行って、レイテンシ（p50/p95/p99）と
+サーバー側で観測したTCP接続数を比較します。APIキーやネットワークは不要です。
+
+使い方:
+    python bench_llm_client.py                                  # 200回 × 並列8
+    python bench_llm_client.py --calls 1000 --latency 0.05 --json
+    python bench_llm_client.py --error-rate 0.1                 # 障害注入時の再試行を確認
+"""
+
+import json
+import math
+import time
+import socket
+import asyncio
+import argparse
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+from fake_llm_server import create_fake_app, FaultProfile
+from llm import LLMError
+from llm_http import PooledHTTPLLMClient, OpenAICompatibleProvider, RetryPolicy, CircuitBreaker
+
+PROMPT = 'ユーザーの質問: 納期が遅れそうなときはどうすればいいですか'
+
+
+def percentile(sorted_values, ratio):
+    """ソート済みリストのパーセンタイル（最近傍法）"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(ratio * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_fake_server(profile):
+    """代役サーバーを別スレッドのイベントループで起動し、ベースURLを返す"""
+    port = free_port()
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(create_fake_app(profile))
+    loop.run_until_complete(runner.setup())
+    loop.run_until_complete(web.TCPSite(runner, '127.0.0.1', port).start())
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return f'http://127.0.0.1:{port}'
+
+
+def server_stats(base_url, reset=False):
+    if reset:
+        urllib.request.urlopen(urllib.request.Request(f'{base_url}/stats/reset', method='POST')).read()
+        return None
+    with urllib.request.urlopen(f'{base_url}/stats') as response:
+        return json.loads(response.read())
+
+
+def run(base_url, pool_size, calls, concurrency, max_retries):
+    """指定のプール設定で calls 回呼び出し、レイテンシと接続数を集計"""
+    server_stats(base_url, reset=True)
+    client = PooledHTTPLLMClient(
+        OpenAICompatibleProvider(f'{base_url}/v1', model='fake'), timeout=10, pool_size=pool_size,
+        retry_policy=RetryPolicy(max_retries, 0.01, 0.1), breaker=CircuitBreaker(calls + 1, 1))
+
+    def call(_):
+        start = time.perf_counter()
+        try:
+            client.generate(PROMPT, [])
+            ok = True
+        except LLMError:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(call, range(calls)))
+    elapsed = time.perf_counter() - started
+    client.close()
+
+    latencies = sorted(latency for latency, _ in results)
+    stats = client.stats()
+    return {
+        'poolSize': pool_size,
+        'calls': calls,
+        'failures': sum(1 for _, ok in results if not ok),
+        'retries': stats['retries'],
+        'throughput': round(calls / elapsed, 1),
+        'p50Ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95Ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99Ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'connectionsCreated': stats['connections']['created'],
+        'serverConnections': server_stats(base_url)['connections'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='LLMクライアントの接続プールあり・なしの比較')
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--pool-size', type=int, default=8, help='プールありの場合に保持する接続数')
+    parser.add_argument('--latency', type=float, default=0.01, help='代役サーバーの応答待ち時間（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='代役サーバーが 500 を返す割合')
+    parser.add_argument('--max-retries', type=int, default=2)
+    parser.add_argument('--json', action='store_true', help='結果をJSONで出力')
+    args = parser.parse_args()
+
+    base_url = start_fake_server(FaultProfile(latency=args.latency, error_rate=args.error_rate, seed=1))
+    results = [
+        run(base_url, 0, args.calls, args.concurrency, args.max_retries),
+        run(base_url, args.pool_size, args.calls, args.concurrency, args.max_retries),
+    ]
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+
+    print(f'📊 {args.calls}回 × 並列{args.concurrency}（代役サーバーの待ち時間 {args.latency * 1000:.0f}ms）')
+    print(f"{'プール':>8} {'p50(ms)':>9} {'p95(ms)':>9} {'p99(ms)':>9} {'件/秒':>8} {'接続数':>7} {'再試行':>6} {'失敗':>5}")
+    for result in results:
+        label = 'なし' if result['poolSize'] == 0 else str(result['poolSize'])
+        print(f"{label:>8} {result['p50Ms']:>9.2f} {result['p95Ms']:>9.2f} {result['p99Ms']:>9.2f} "
+              f"{result['throughput']:>8.1f} {result['serverConnections']:>7} {result['retries']:>6} "
+              f"{result['failures']:>5}")
+
+
+if __name__ == '__main__':
+    main()
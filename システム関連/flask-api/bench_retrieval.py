@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+チャンク検索のマイクロベンチマーク
+生成済みの chat-index.json を元に1k〜50kチャンクの合成インデックスを作り、
+NumPy版と純Python版の検索レイテンシ（p50/p95/p99）とインデックス読み込み時間を計測します。
+
+使い方:
+    python bench_retrieval.py                              # 1k / 10k / 50k チャンク
+    python bench_retrieval.py --sizes 1000,20000 --json    # JSONで出力
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import base64
+import random
+import argparse
+from array import array
+
+from config import Config
+from retrieval import ChatIndex, decode_array, np
+
+DEFAULT_SIZES = [1000, 10000, 50000]
+
+
+def percentile(sorted_values, ratio):
+    """ソート済みリストのパーセンタイル（最近傍法）"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(ratio * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def json_index_path(path):
+    """元データの chat-index.json のパス
+
+    スナップショット（.bin）には行単位の行列が含まれないため、合成インデックスの元には
+    site_generator が同じディレクトリに出力する chat-index.json を使います。
+    """
+    if str(path).endswith('.bin'):
+        return os.path.join(os.path.dirname(path), 'chat-index.json')
+    return path
+
+
+def encode_array(typecode, values):
+    data = array(typecode, values)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return base64.b64encode(data.tobytes()).decode('ascii')
+
+
+def make_synthetic_index(seed, size, rng):
+    """実際のチャンクの行を重みを揺らしながら複製し、指定件数の合成インデックスを作成"""
+    matrix = seed['matrix']
+    indptr = decode_array('I', matrix['indptr'])
+    indices = decode_array('I', matrix['indices'])
+    data = decode_array('f', matrix['data'])
+
+    new_indptr = [0]
+    new_indices = array('I')
+    new_data = array('f')
+    chunks = []
+    for _ in range(size):
+        row = rng.randrange(matrix['rows'])
+        start, end = indptr[row], indptr[row + 1]
+        new_indices.extend(indices[start:end])
+        new_data.extend(w * rng.uniform(0.8, 1.2) for w in data[start:end])
+        new_indptr.append(len(new_indices))
+        chunks.append(seed['chunks'][row])
+
+    return {
+        **seed,
+        'chunks': chunks,
+        'matrix': {
+            'rows': size,
+            'cols': matrix['cols'],
+            'indptr': encode_array('I', new_indptr),
+            'indices': encode_array('I', new_indices),
+            'data': encode_array('f', new_data),
+        },
+    }
+
+
+def make_queries(seed, count, rng):
+    """見出し・本文の一部・質問文を混ぜたクエリ"""
+    questions = ['納期が遅れそうなときはどうすればいい？', 'クライアントへの提案の進め方',
+                 'フィードバックの伝え方を教えて', 'ヒアリングで確認すべきこと']
+    queries = []
+    for i in range(count):
+        chunk = rng.choice(seed['chunks'])
+        if i % 3 == 0:
+            queries.append(chunk['section'])
+        elif i % 3 == 1:
+            start = rng.randrange(max(1, len(chunk['text']) - 20))
+            queries.append(chunk['text'][start:start + 20])
+        else:
+            queries.append(rng.choice(questions))
+    return queries
+
+
+def measure(index, queries, top_k):
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        index.search(query, top_k)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return {
+        'p50': round(percentile(latencies, 0.50), 3),
+        'p95': round(percentile(latencies, 0.95), 3),
+        'p99': round(percentile(latencies, 0.99), 3),
+        'max': round(latencies[-1], 3),
+    }
+
+
+def run_benchmark(seed, size, queries, top_k, backends, rng):
+    """1サイズ分の計測結果を返す"""
+    data = make_synthetic_index(seed, size, rng)
+    report = {'chunks': size, 'nonzeros': len(decode_array('I', data['matrix']['indices'])), 'backends': {}}
+    for backend in backends:
+        started = time.perf_counter()
+        index = ChatIndex(data, use_numpy=backend == 'numpy')
+        load_ms = (time.perf_counter() - started) * 1000
+        result = {'loadMs': round(load_ms, 2), 'latencyMs': measure(index, queries, top_k)}
+        if backend == 'numpy':
+            started = time.perf_counter()
+            index.search_many(queries, top_k)
+            result['batchPerQueryMs'] = round((time.perf_counter() - started) * 1000 / len(queries), 3)
+        report['backends'][backend] = result
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='チャンク検索のマイクロベンチマーク')
+    parser.add_argument('--index', default=json_index_path(Config.CHAT_INDEX_PATH), help='元データの chat-index.json')
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES), help='チャンク数（カンマ区切り）')
+    parser.add_argument('--queries', type=int, default=200, help='サイズごとのクエリ数')
+    parser.add_argument('--top-k', type=int, default=Config.RETRIEVAL_TOP_K)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', action='store_true', help='結果をJSONで出力')
+    args = parser.parse_args()
+
+    try:
+        with open(json_index_path(args.index), 'r', encoding='utf-8') as f:
+            seed = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"エラー: chat-index.json を読み込めません ({e})。先に generate_auto.py を実行してください")
+        sys.exit(1)
+
+    rng = random.Random(args.seed)
+    queries = make_queries(seed, args.queries, rng)
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    backends = ['numpy', 'python'] if np is not None else ['python']
+
+    reports = [run_benchmark(seed, size, queries, args.top_k, backends, rng) for size in sizes]
+
+    if args.json:
+        print(json.dumps({'queries': len(queries), 'topK': args.top_k, 'results': reports},
+                         ensure_ascii=False, indent=2))
+        return
+
+    print(f"クエリ数: {len(queries)} / top_k={args.top_k}")
+    for report in reports:
+        print(f"\n■ {report['chunks']:,}チャンク（非ゼロ要素 {report['nonzeros']:,}）")
+        for backend, result in report['backends'].items():
+            latency = result['latencyMs']
+            print(f"  {backend:<6} p50={latency['p50']}ms p95={latency['p95']}ms "
+                  f"p99={latency['p99']}ms max={latency['max']}ms 読み込み={result['loadMs']}ms")
+            if 'batchPerQueryMs' in result:
+                print(f"         まとめて検索: {result['batchPerQueryMs']}ms/クエリ")
+
+
+if __name__ == '__main__':
+    main()
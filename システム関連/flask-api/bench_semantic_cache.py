@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+類似質問キャッシュのしきい値の確認
+言い換えた質問の組（同じ回答を返してよい）と、同じ話題の別の質問の組（返してはいけない）について、
+1つ目の質問を登録した SemanticCache に2つ目の質問で問い合わせ、しきい値ごとのヒット数と誤ヒット数を出力します。
+
+設定中のしきい値（SEMANTIC_CACHE_THRESHOLD）で言い換えが1組もヒットしない場合は終了コード1で終わります。
+
+使い方:
+    python bench_semantic_cache.py                           # 0.3〜0.7 と設定中のしきい値
+    python bench_semantic_cache.py --thresholds 0.4,0.5 --json
+"""
+
+import sys
+import json
+import argparse
+
+from config import Config
+from semantic_cache import SemanticCache, shingles, minhash, estimate_similarity
+
+# 同じ回答を返してよい言い換え
+PARAPHRASES = [
+    ('納期遅れの対処', '納期が遅れそうなとき'),
+    ('納期が遅れそうな時はどうすればいい？', '納期に遅れそうな場合の対処法は？'),
+    ('デザイナーへのフィードバックの方法', 'デザイナーにフィードバックするコツは？'),
+    ('品質チェックで見るべきポイントは？', '品質チェックのポイントを教えて'),
+    ('ヒアリングのコツ', 'ヒアリングをうまく行うコツは？'),
+    ('提案書の書き方', '提案書はどう書けばいい？'),
+    ('クロージングのコツ', 'クロージングを成功させるには'),
+    ('見積もりの出し方', '見積もりはどうやって出す？'),
+    ('契約を成立させる方法', '契約成立のためにすること'),
+    ('失注につながるコミュニケーション', '失注の原因になるコミュニケーション'),
+    ('全部やり直しと言われたら', 'やり直しを求められたときの対応'),
+    ('ディレクターの役割とは', 'ディレクターの役割を教えて'),
+]
+
+# 同じ話題でも別の回答が必要な質問
+DIFFERENT = [
+    ('納期遅れの対処', '納期の決め方'),
+    ('納期が遅れそうな時はどうすればいい？', '納期を短縮する方法は？'),
+    ('デザイナーへのフィードバックの方法', 'デザイナーのアサイン方法'),
+    ('品質チェックで見るべきポイントは？', '品質不足の原因は？'),
+    ('ヒアリングのコツ', 'クロージングのコツ'),
+    ('提案書の書き方', '議事録の書き方'),
+    ('見積もりの出し方', '請求書の出し方'),
+    ('契約を成立させる方法', '契約を解除する方法'),
+    ('ディレクターの役割とは', 'デザイナーの役割とは'),
+    ('クロージングのコツ', 'クロージングで失敗する原因'),
+    ('失注につながるコミュニケーション', '受注につながるコミュニケーション'),
+]
+
+DEFAULT_THRESHOLDS = [0.3, 0.4, 0.5, 0.6, 0.7]
+
+
+def similarity(first, second):
+    """2つの質問の推定類似度"""
+    return estimate_similarity(minhash(shingles(first)), minhash(shingles(second)))
+
+
+def cache_hits(pairs, threshold):
+    """1つ目の質問だけを登録したキャッシュに、2つ目の質問で問い合わせてヒットした組"""
+    hits = []
+    for first, second in pairs:
+        cache = SemanticCache(threshold=threshold, ttl=0)
+        cache.put(first, 'bench', {'response': first})
+        if cache.get(second, 'bench') is not None:
+            hits.append((first, second))
+    return hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description='類似質問キャッシュのしきい値の確認')
+    parser.add_argument('--thresholds', default=','.join(str(t) for t in DEFAULT_THRESHOLDS),
+                        help='確認するしきい値（カンマ区切り、設定中のしきい値は常に含める）')
+    parser.add_argument('--json', action='store_true', help='結果をJSONで出力')
+    args = parser.parse_args()
+
+    configured = Config.SEMANTIC_CACHE_THRESHOLD
+    thresholds = sorted({float(t) for t in args.thresholds.split(',') if t} | {configured})
+    results = []
+    for threshold in thresholds:
+        results.append({
+            'threshold': threshold,
+            'paraphraseHits': len(cache_hits(PARAPHRASES, threshold)),
+            'falseHits': [list(pair) for pair in cache_hits(DIFFERENT, threshold)],
+        })
+    pairs = {
+        'paraphrases': [[first, second, similarity(first, second)] for first, second in PARAPHRASES],
+        'different': [[first, second, similarity(first, second)] for first, second in DIFFERENT],
+    }
+    configured_hits = next(r['paraphraseHits'] for r in results if r['threshold'] == configured)
+
+    if args.json:
+        print(json.dumps({'configured': configured, 'results': results, 'pairs': pairs},
+                         ensure_ascii=False, indent=2))
+    else:
+        print(f'📊 言い換え {len(PARAPHRASES)}組 / 別の質問 {len(DIFFERENT)}組（推定類似度）')
+        for label, rows in (('言い換え', pairs['paraphrases']), ('別の質問', pairs['different'])):
+            for first, second, score in rows:
+                print(f'  {label} {score:.2f}  {first} / {second}')
+        print('📊 しきい値ごとのヒット')
+        for r in results:
+            mark = '  ← 設定中' if r['threshold'] == configured else ''
+            print(f"  {r['threshold']:.2f}  言い換え {r['paraphraseHits']:>2}/{len(PARAPHRASES)}  "
+                  f"誤ヒット {len(r['falseHits']):>2}/{len(DIFFERENT)}{mark}")
+
+    if configured_hits == 0:
+        print(f'エラー: しきい値 {configured} では言い換えが1組もヒットしません', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,368 @@
+"""
+チャット応答の組み立て
+検索 → プロンプト構築 → LLM呼び出し → 関連ページ付与 の流れをまとめます。
+LLMに障害がある場合は、検索結果のセクションの抜粋とリンクだけで回答します（section_answer）。
+各段階の処理時間と回答の出どころは ChatMetrics に記録します（/metrics で出力）。
+"""
+
+import json
+import time
+import logging
+
+from llm import LLMError
+from metrics import ChatMetrics
+from intents import IntentMatcher
+from index_store import IndexStore
+from context_packer import ContextPacker, format_block
+from section_answer import SectionAnswerer, format_sections
+from response_cache import ResponseCache, make_key
+from semantic_cache import SemanticCache
+from single_flight import SingleFlight, StreamFlight, CoalescedTimeout, CoalescedAborted
+
+logger = logging.getLogger(__name__)
+
+PROMPT_TEMPLATE = '''あなたはHarukazeガイドラインのAIアシスタントです。HarukazeはtoB事業としてデザイン制作を行っているクリエイティブチームです。
+
+以下のガイドライン情報を参考に、ユーザーの質問に答えてください：
+{context}
+
+ユーザーの質問: {message}
+
+回答方法：
+1. ガイドラインに記載されている具体的な対処法や推奨事項を3-5項目で箇条書きにしてください
+2. 実践的で具体的なアドバイスを心がけてください
+3. 最後に「詳しくは『〇〇』ページをご覧ください」と関連ページへ案内してください
+4. ガイドラインに明確な記載がない場合は、一般的な知識で補完してください'''
+
+NO_CONTEXT = 'ガイドラインに関連する情報が見つかりませんでした。'
+
+UPSTREAM_ERROR_NOTE = '\n\n（注: AIによる詳細な回答機能に一時的な問題が発生しています）'
+
+
+def format_sse(event, data):
+    """Server-Sent Events の1イベント分の文字列"""
+    return f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+class ChatService:
+    """/api/chat の応答を生成するサービス
+
+    非同期サーバー（async_app）からは検索・キャッシュだけを使うため、llm_client は None でも構いません。
+    """
+
+    def __init__(self, index_store, llm_client, config):
+        self.index_store = index_store
+        self.llm_client = llm_client
+        self.config = config
+        self.response_cache = ResponseCache(
+            config.RESPONSE_CACHE_MAX_ENTRIES, config.RESPONSE_CACHE_MAX_BYTES, config.RESPONSE_CACHE_TTL)
+        self.single_flight = SingleFlight()
+        self.stream_flight = StreamFlight()
+        self.context_packer = ContextPacker(
+            config.CONTEXT_TOKEN_BUDGET, config.RETRIEVAL_TOP_K, config.CONTEXT_CHARS_PER_CHUNK,
+            config.CONTEXT_DUPLICATE_THRESHOLD, config.CONTEXT_CACHE_SIZE)
+        self.semantic_cache = SemanticCache(
+            config.SEMANTIC_CACHE_THRESHOLD, config.SEMANTIC_CACHE_MAX_ENTRIES, config.SEMANTIC_CACHE_MAX_BYTES,
+            config.RESPONSE_CACHE_TTL)
+        self.section_answerer = SectionAnswerer(
+            config.DEGRADED_SECTIONS, config.RETRIEVAL_CANDIDATES, config.DEGRADED_SNIPPET_CHARS)
+        self.metrics = ChatMetrics()
+        # 新しいインデックスが公開されたら古い回答は使わない
+        index_store.add_listener(lambda index: self.response_cache.clear())
+        index_store.add_listener(lambda index: self.semantic_cache.clear())
+        index_store.add_listener(lambda index: self.context_packer.clear())
+        self.intent_store = self._open_intent_store(config, index_store.auto_reload)
+
+    @staticmethod
+    def _open_intent_store(config, auto_reload=True):
+        """意図判定データ（再読み込みの方法はチャット用インデックスに合わせる）"""
+        try:
+            return IndexStore(config.INTENT_MATCHER_PATH, config.INDEX_RELOAD_INTERVAL, loader=IntentMatcher.load,
+                              auto_reload=auto_reload)
+        except (OSError, ValueError) as e:
+            logger.warning('意図判定データを読み込めないため使用しません: %s', e)
+            return None
+
+    def retrieve(self, message):
+        """質問に関連するチャンクをページ情報付きで取得
+
+        RETRIEVAL_CANDIDATES 件の候補から、トークン予算内に収まるチャンクを選んで返します。
+        """
+        index = self.index_store.current()
+        started = time.perf_counter()
+        candidates = []
+        for score, chunk_id in index.search(message, top_k=self.config.RETRIEVAL_CANDIDATES):
+            chunk = index.chunks[chunk_id]
+            page = index.page_of(chunk_id)
+            candidates.append({
+                'chunk_id': chunk_id,
+                'score': score,
+                'page': chunk['page'],
+                'page_title': page['title'],
+                'url': page['url'],
+                'category': page['category'],
+                'section': chunk['section'],
+                'anchor': chunk['anchor'],
+                'text': chunk['text'],
+            })
+        searched = time.perf_counter()
+        packed = self.context_packer.pack(candidates, index.version)
+        self.metrics.retrieval.observe(searched - started)
+        self.metrics.packing.observe(time.perf_counter() - searched)
+        return packed
+
+    def build_prompt(self, message, chunks):
+        """検索結果からプロンプトを構築"""
+        if not chunks:
+            context = NO_CONTEXT
+        else:
+            limit = self.config.CONTEXT_CHARS_PER_CHUNK
+            context = '\n\n---\n\n'.join(format_block(c, limit) for c in chunks)
+        return PROMPT_TEMPLATE.format(context=context, message=message)
+
+    def related_pages(self, chunks):
+        """最も関連するページと、ビルド時に計算済みのその関連ページ（pages[].related）
+
+        関連ページの情報がないインデックスや件数が足りない場合は、検索結果の他のページで補います。
+        """
+        return self._related_pages(self.index_store.current(), [chunk['page'] for chunk in chunks])
+
+    def _related_pages(self, index, page_numbers):
+        """スコア順のページ番号から関連ページの一覧を作る"""
+        if not page_numbers:
+            return []
+        pages = index.pages
+        top = page_numbers[0]
+        numbers = [top, *pages[top].get('related', ()), *page_numbers]
+        related = []
+        seen = set()
+        for number in numbers:
+            # 再読み込み直後に古いインデックスの検索結果が渡された場合は範囲外の番号を飛ばす
+            if number in seen or number >= len(pages):
+                continue
+            seen.add(number)
+            page = pages[number]
+            related.append({'title': page['title'], 'url': page['url'], 'category': page['category']})
+            if len(related) >= self.config.RELATED_PAGES:
+                break
+        return related
+
+    def answer(self, message):
+        """質問に回答（レスポンスJSONの辞書を返す）"""
+        started = time.perf_counter()
+        self.metrics.in_flight.inc()
+        try:
+            return self._answer(message)
+        finally:
+            self.metrics.in_flight.dec()
+            self.metrics.total.observe(time.perf_counter() - started)
+
+    def _answer(self, message):
+        faq = self.faq_result(message)
+        if faq is not None:
+            self.metrics.faq_answers.inc()
+            return faq
+
+        version = self.index_store.current().version
+        key = make_key(message, version)
+        cached = self.cached_answer(message, key, version)
+        if cached is not None:
+            self.metrics.cached_answers.inc()
+            return dict(cached)
+
+        # 同じ質問が同時に届いた場合はLLMへの問い合わせを1回にまとめる
+        try:
+            result = self.single_flight.do(
+                key, lambda: self._generate(message, key, version), timeout=self.config.COALESCE_TIMEOUT)
+        except CoalescedTimeout as e:
+            logger.warning('%s: %s', e, message)
+            result = self.fallback_result(message)
+            self.metrics.fallback_answers.inc()
+        return dict(result)
+
+    def answer_stream(self, message):
+        """質問への回答を (イベント名, データ) で順に返すジェネレーター（SSE用）
+
+        meta（関連ページ）→ token（回答の断片）… → done の順に返します。
+        よくある質問・キャッシュ済みの回答や、同じ質問の問い合わせが実行中の場合は完成した回答を1つの token で返します。
+        """
+        started = time.perf_counter()
+        self.metrics.in_flight.inc()
+        try:
+            yield from self._answer_stream(message)
+        finally:
+            # クライアントが途中で切断した場合（ジェネレーターが閉じられた場合）もここを通る
+            self.metrics.in_flight.dec()
+            self.metrics.total.observe(time.perf_counter() - started)
+
+    def _answer_stream(self, message):
+        faq = self.faq_result(message)
+        if faq is not None:
+            self.metrics.faq_answers.inc()
+            yield 'meta', {'relatedPages': faq['relatedPages']}
+            yield 'token', {'text': faq['response']}
+            yield 'done', {'cached': True, 'faq': True}
+            return
+
+        version = self.index_store.current().version
+        key = make_key(message, version)
+        cached = self.cached_answer(message, key, version)
+        if cached is None and self.single_flight.in_flight(key):
+            try:
+                cached = self.single_flight.do(
+                    key, lambda: self._generate(message, key, version), timeout=self.config.COALESCE_TIMEOUT)
+            except CoalescedTimeout as e:
+                logger.warning('%s: %s', e, message)
+        if cached is not None:
+            self.metrics.cached_answers.inc()
+            yield 'meta', {'relatedPages': cached['relatedPages']}
+            yield 'token', {'text': cached['response']}
+            yield 'done', {'cached': True}
+            return
+
+        # 同じ質問のストリーミングが実行中なら、そのイベントを先頭から再生して問い合わせを1回にまとめる
+        sent = set()
+        try:
+            for event in self.stream_flight.stream(key, lambda: self._stream_events(message, key, version),
+                                                   timeout=self.config.COALESCE_TIMEOUT):
+                sent.add(event[0])
+                yield event
+        except (CoalescedTimeout, CoalescedAborted) as e:
+            logger.warning('%s: %s', e, message)
+            yield from self.stream_fallback(message, sent)
+
+    def stream_fallback(self, message, sent):
+        """同じ質問のストリーミングを待てなかった場合の残りのイベント（検索結果だけの回答）
+
+        sent は送信済みのイベント名の集合です。
+        """
+        self.metrics.fallback_answers.inc()
+        result = self.fallback_result(message)
+        events = [] if 'meta' in sent else [('meta', {'relatedPages': result['relatedPages']})]
+        events.append(('token', {'text': UPSTREAM_ERROR_NOTE if 'token' in sent else result['response']}))
+        events.append(('done', {'cached': False, 'degraded': True}))
+        return events
+
+    def _stream_events(self, message, key, version):
+        """検索とLLMのストリーミングで meta → token … → done のイベントを作り、回答をキャッシュに登録"""
+        chunks = self.retrieve(message)
+        prompt = self.build_prompt(message, chunks)
+        related_pages = self.related_pages(chunks)
+        yield 'meta', {'relatedPages': related_pages}
+
+        pieces = []
+        upstream_started = time.perf_counter()
+        try:
+            for piece in self.llm_client.stream(prompt, chunks):
+                if not pieces:
+                    self.metrics.first_token.observe(time.perf_counter() - upstream_started)
+                pieces.append(piece)
+                yield 'token', {'text': piece}
+        except LLMError as e:
+            logger.error('LLM呼び出しに失敗: %s', e)
+            self.metrics.upstream.observe(time.perf_counter() - upstream_started)
+            self.metrics.upstream_error(e)
+            self.metrics.fallback_answers.inc()
+            # まだ何も返していなければ検索結果だけの回答、途中まで返していれば注記だけを追加
+            text = UPSTREAM_ERROR_NOTE if pieces else self.fallback_result(message)['response']
+            yield 'token', {'text': text}
+            yield 'done', {'cached': False, 'degraded': True}
+            return
+
+        self.metrics.upstream.observe(time.perf_counter() - upstream_started)
+        self.metrics.llm_answers.inc()
+        # 最後まで受け取った回答だけをキャッシュ（途中で切断された場合はここに来ない）
+        self.remember(message, key, version,
+                      {'response': ''.join(pieces), 'relatedPages': related_pages, 'success': True})
+        yield 'done', {'cached': False}
+
+    def faq_result(self, message):
+        """よくある質問と完全一致・ほぼ一致すれば、ビルド時に確定した回答を返す（LLMは使わない）"""
+        if self.intent_store is None:
+            return None
+        faq = self.intent_store.current().faq_answer(message)
+        if faq is None:
+            return None
+        return {'response': faq['response'], 'relatedPages': faq['relatedPages'], 'success': True}
+
+    def cached_answer(self, message, key, version):
+        """応答キャッシュ → 類似質問キャッシュの順に探す"""
+        cached = self.response_cache.get(key)
+        if cached is not None:
+            return cached
+        # 言い換えた質問なら類似質問の回答を使い、次回からは完全一致で返す
+        cached = self.semantic_cache.get(message, version)
+        if cached is not None:
+            self.response_cache.put(key, cached)
+        return cached
+
+    def remember(self, message, key, version, result):
+        """LLMの回答を応答キャッシュと類似質問キャッシュに登録"""
+        self.response_cache.put(key, result)
+        self.semantic_cache.put(message, version, result)
+
+    def retrieval_answer(self, message):
+        """LLMを使わず、検索結果のセクションの抜粋とリンクだけで回答（/api/chat/retrieval）"""
+        started = time.perf_counter()
+        result = self.section_result(message)
+        self.metrics.retrieval_answers.inc()
+        self.metrics.total.observe(time.perf_counter() - started)
+        return result
+
+    def section_result(self, message, note=''):
+        """検索結果のセクションだけで作る回答（縮退モード）
+
+        該当するセクションがない場合は、キーワードのスコアが最も高いナレッジベースの意図の回答を返します。
+        """
+        index = self.index_store.current()
+        started = time.perf_counter()
+        found = self.section_answerer.search(index, message)
+        self.metrics.retrieval.observe(time.perf_counter() - started)
+        if not found and self.intent_store is not None:
+            intent = self.intent_store.current().best_intent(message)
+            if intent is not None:
+                return {
+                    'response': intent['response'] + note,
+                    'relatedPages': intent['relatedPages'],
+                    'sections': [],
+                    'success': True,
+                    'degraded': True,
+                }
+        sections = [section for _, section in found]
+        return {
+            'response': format_sections(sections) + note,
+            'relatedPages': self._related_pages(index, [page_number for page_number, _ in found]),
+            'sections': sections,
+            'success': True,
+            'degraded': True,
+        }
+
+    def fallback_result(self, message):
+        """LLMに障害がある場合の回答（検索結果のセクションだけで作り、キャッシュしない）"""
+        return self.section_result(message, UPSTREAM_ERROR_NOTE)
+
+    def _generate(self, message, key, version):
+        """検索とLLM呼び出しで回答を作成し、キャッシュに登録"""
+        chunks = self.retrieve(message)
+        prompt = self.build_prompt(message, chunks)
+
+        started = time.perf_counter()
+        try:
+            response = self.llm_client.generate(prompt, chunks)
+        except LLMError as e:
+            logger.error('LLM呼び出しに失敗: %s', e)
+            self.metrics.upstream.observe(time.perf_counter() - started)
+            self.metrics.upstream_error(e)
+            self.metrics.fallback_answers.inc()
+            # 検索結果だけで回答を返す（一時的な障害なのでキャッシュしない）
+            return self.fallback_result(message)
+        self.metrics.upstream.observe(time.perf_counter() - started)
+        self.metrics.llm_answers.inc()
+
+        result = {
+            'response': response,
+            'relatedPages': self.related_pages(chunks),
+            'success': True,
+        }
+        self.remember(message, key, version, result)
+        return result
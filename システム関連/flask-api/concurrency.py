@@ -0,0 +1,120 @@
+"""
+LLM呼び出しの同時実行数の制限（非同期サーバー用）
+同時に実行するLLM呼び出しを max_concurrent 件に制限し、空きを待つリクエストは max_queue 件まで保持します。
+待ち行列が一杯のとき、または queue_timeout 秒待っても空かないときは Saturated を送出し、
+サーバーはすぐに 429（Retry-After 付き）を返します。
+
+イベントループの1スレッドからだけ使う前提のため、ロックは使いません。
+"""
+
+import math
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+
+# Retry-After の下限・上限（秒）
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 60
+
+# 処理時間の移動平均の重み
+SERVICE_TIME_SMOOTHING = 0.2
+
+
+class Saturated(Exception):
+    """同時実行数と待ち行列が一杯"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'混雑しています（{retry_after}秒後に再試行してください）')
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """上限付き待ち行列を持つセマフォ
+
+    枠が空いたときは待ち行列の先頭に直接引き渡すため、後から来たリクエストが割り込むことはありません。
+    """
+
+    def __init__(self, max_concurrent=8, max_queue=32, queue_timeout=10.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters = deque()
+        self._service_time = 1.0  # 1件あたりの処理時間の推定（秒）
+        self.admitted = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        """枠を確保して処理を実行（async with limiter.slot(): ...）"""
+        await self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._update_service_time(time.monotonic() - started)
+            self.release()
+
+    async def acquire(self):
+        if self.in_flight < self.max_concurrent and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise Saturated(self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # タイムアウトと同時に枠が引き渡された
+                return
+            self._discard(waiter)
+            self.rejected += 1
+            raise Saturated(self.retry_after()) from None
+        except asyncio.CancelledError:
+            # クライアントが切断した。引き渡し済みの枠は次の待機者へ回す
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._discard(waiter)
+            raise
+
+    def release(self):
+        """枠を返却（待機者がいれば枠をそのまま引き渡す）"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self.admitted += 1
+                return
+        self.in_flight -= 1
+
+    def _discard(self, waiter):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def _update_service_time(self, elapsed):
+        self._service_time += SERVICE_TIME_SMOOTHING * (elapsed - self._service_time)
+
+    def retry_after(self):
+        """待ち行列が捌けるまでの推定秒数"""
+        estimate = self._service_time * (len(self._waiters) + 1) / self.max_concurrent
+        return max(MIN_RETRY_AFTER, min(MAX_RETRY_AFTER, math.ceil(estimate)))
+
+    def stats(self):
+        return {
+            'inFlight': self.in_flight,
+            'queued': len(self._waiters),
+            'maxConcurrent': self.max_concurrent,
+            'maxQueue': self.max_queue,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'serviceTimeMs': round(self._service_time * 1000, 1),
+        }
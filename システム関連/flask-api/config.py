@@ -0,0 +1,104 @@
+"""
+チャットサービスの設定
+環境変数（.env）から読み込みます。
+"""
+
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BASE_DIR = Path(__file__).resolve().parent
+
+
+class Config:
+    """環境変数から読み込む設定値"""
+
+    # site_generator が出力するチャット用インデックス（.bin は mmap で読み込むスナップショット、.json も指定可）
+    CHAT_INDEX_PATH = os.environ.get(
+        'CHAT_INDEX_PATH', str(BASE_DIR.parent.parent / 'site_output' / 'chat-index.bin'))
+
+    # site_generator が出力する意図判定データ（ファイルがなければ使わない）
+    INTENT_MATCHER_PATH = os.environ.get(
+        'INTENT_MATCHER_PATH', str(BASE_DIR.parent.parent / 'site_output' / 'intent-matcher.json'))
+
+    # インデックス更新の確認間隔（秒）
+    INDEX_RELOAD_INTERVAL = float(os.environ.get('INDEX_RELOAD_INTERVAL', '5'))
+
+    # LLMプロバイダー
+    #   stub: ローカルの決定的な応答 / gemini: Google Gemini（SDK）
+    #   openai: OpenAI互換API / gemini-rest: Gemini REST API / fake: fake_llm_server.py（いずれもHTTPクライアント）
+    LLM_PROVIDER = os.environ.get('LLM_PROVIDER', 'stub')
+    GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY', '')
+    GEMINI_MODEL = os.environ.get('GEMINI_MODEL', 'gemini-pro')
+    OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY', '')
+    OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL', 'https://api.openai.com/v1')
+    OPENAI_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-4o-mini')
+    FAKE_LLM_URL = os.environ.get('FAKE_LLM_URL', 'http://127.0.0.1:8089/v1')
+
+    # HTTPクライアント: 呼び出しごとのタイムアウトと接続のタイムアウト（秒）、保持する接続数
+    LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT', '30'))
+    LLM_CONNECT_TIMEOUT = float(os.environ.get('LLM_CONNECT_TIMEOUT', '5'))
+    LLM_POOL_SIZE = int(os.environ.get('LLM_POOL_SIZE', '10'))
+    # 再試行の回数と待ち時間（ジッター付き指数バックオフの初期値・上限、秒）
+    LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', '2'))
+    LLM_RETRY_BASE_DELAY = float(os.environ.get('LLM_RETRY_BASE_DELAY', '0.2'))
+    LLM_RETRY_MAX_DELAY = float(os.environ.get('LLM_RETRY_MAX_DELAY', '2'))
+    # サーキットブレーカー: 連続失敗回数のしきい値と、呼び出しを止める秒数
+    LLM_BREAKER_THRESHOLD = int(os.environ.get('LLM_BREAKER_THRESHOLD', '5'))
+    LLM_BREAKER_RESET = float(os.environ.get('LLM_BREAKER_RESET', '30'))
+    # stub のストリーミングで断片ごとに待つ秒数
+    STUB_STREAM_DELAY = float(os.environ.get('STUB_STREAM_DELAY', '0'))
+
+    # プロンプトに含める最大チャンク数と、回答に添える関連ページ数
+    RETRIEVAL_TOP_K = int(os.environ.get('RETRIEVAL_TOP_K', '5'))
+    RELATED_PAGES = int(os.environ.get('RELATED_PAGES', '3'))
+
+    # 検索で取得する候補数（この中からトークン予算内に収まるチャンクを選ぶ）
+    RETRIEVAL_CANDIDATES = int(os.environ.get('RETRIEVAL_CANDIDATES', '12'))
+
+    # LLMを使わない回答（縮退モード・/api/chat/retrieval）のセクション数と、抜粋の最大文字数
+    DEGRADED_SECTIONS = int(os.environ.get('DEGRADED_SECTIONS', '3'))
+    DEGRADED_SNIPPET_CHARS = int(os.environ.get('DEGRADED_SNIPPET_CHARS', '120'))
+
+    # プロンプトに含める検索結果のトークン予算と、1チャンクあたりの最大文字数
+    CONTEXT_TOKEN_BUDGET = int(os.environ.get('CONTEXT_TOKEN_BUDGET', '1500'))
+    CONTEXT_CHARS_PER_CHUNK = int(os.environ.get('CONTEXT_CHARS_PER_CHUNK', '600'))
+
+    # 同じページのチャンクを重複とみなす内容の重なり（2-gramの包含率）と、選択結果のキャッシュ件数
+    CONTEXT_DUPLICATE_THRESHOLD = float(os.environ.get('CONTEXT_DUPLICATE_THRESHOLD', '0.5'))
+    CONTEXT_CACHE_SIZE = int(os.environ.get('CONTEXT_CACHE_SIZE', '512'))
+
+    # 応答キャッシュ（件数0で無効、TTLは秒）
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '1000'))
+    RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))
+    RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', '3600'))
+
+    # 類似質問キャッシュ（推定Jaccard類似度のしきい値、件数0で無効、TTLは応答キャッシュと共通）
+    SEMANTIC_CACHE_THRESHOLD = float(os.environ.get('SEMANTIC_CACHE_THRESHOLD', '0.5'))
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get('SEMANTIC_CACHE_MAX_ENTRIES', '1000'))
+    SEMANTIC_CACHE_MAX_BYTES = int(os.environ.get('SEMANTIC_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))
+
+    # 同じ質問の同時リクエストが先行する問い合わせの完了を待つ上限（秒）
+    COALESCE_TIMEOUT = float(os.environ.get('COALESCE_TIMEOUT', '30'))
+
+    # 非同期サーバー（async_app）: LLM呼び出しの同時実行数、空き待ちの上限件数と待ち時間（秒）
+    CHAT_MAX_CONCURRENCY = int(os.environ.get('CHAT_MAX_CONCURRENCY', '8'))
+    CHAT_MAX_QUEUE = int(os.environ.get('CHAT_MAX_QUEUE', '32'))
+    CHAT_QUEUE_TIMEOUT = float(os.environ.get('CHAT_QUEUE_TIMEOUT', '10'))
+    # LLMの回答（ストリーミングは最初の断片）をこの秒数待っても届かなければ検索結果だけで回答（0で無効）
+    CHAT_DEGRADE_AFTER = float(os.environ.get('CHAT_DEGRADE_AFTER', '10'))
+
+    # フィードバックの保存先（SQLite、WAL モード）と、まとめ書きの件数・間隔（秒）、書き込み待ちの上限件数
+    FEEDBACK_DB_PATH = os.environ.get('FEEDBACK_DB_PATH', str(BASE_DIR / 'data' / 'feedback.db'))
+    FEEDBACK_BATCH_SIZE = int(os.environ.get('FEEDBACK_BATCH_SIZE', '200'))
+    FEEDBACK_FLUSH_INTERVAL = float(os.environ.get('FEEDBACK_FLUSH_INTERVAL', '1'))
+    FEEDBACK_MAX_QUEUE = int(os.environ.get('FEEDBACK_MAX_QUEUE', '10000'))
+    # 集計APIのトークン（未設定ならローカルからのアクセスのみ許可）
+    FEEDBACK_REPORT_TOKEN = os.environ.get('FEEDBACK_REPORT_TOKEN', '')
+
+    CORS_ORIGINS = os.environ.get('CORS_ORIGINS', '*')
+
+    DEBUG = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
@@ -0,0 +1,122 @@
+"""
+プロンプトに含める検索結果の選択（トークン予算内での詰め込み）
+検索結果の候補から、スコア÷トークン数の大きい順に予算内に収まるチャンクを選びます。
+同じページで内容が重なるチャンク（分割時の重なりや同じ説明の繰り返し）は1つだけ残します。
+選択結果は、インデックスのバージョンと候補（チャンク番号とスコア）の組をキーにキャッシュします。
+
+トークン数は日本語が1文字1トークン前後になることから、非ASCII文字は1文字1トークン、
+ASCII文字は4文字1トークンとして見積もります（多めに見積もる側に倒しています）。
+"""
+
+import math
+import threading
+from collections import OrderedDict
+
+from retrieval import normalize, ngrams
+
+
+def estimate_tokens(text):
+    """テキストのおおよそのトークン数"""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (len(text) - ascii_chars) + math.ceil(ascii_chars / 4)
+
+
+def format_block(chunk, max_chars):
+    """プロンプトに含める1チャンク分の文字列"""
+    return (f"【{chunk['page_title']} > {chunk['section']}】（{chunk['category'] or '未分類'}）\n"
+            f"URL: {chunk['url']}#{chunk['anchor']}\n\n{chunk['text'][:max_chars]}")
+
+
+def containment(grams_a, grams_b):
+    """小さい方の2-gram集合のうち、もう一方にも含まれる割合"""
+    smaller = min(len(grams_a), len(grams_b))
+    if not smaller:
+        return 0.0
+    return len(grams_a & grams_b) / smaller
+
+
+class ContextPacker:
+    """トークン予算内で検索結果を選択するパッカー（スレッドセーフ）"""
+
+    def __init__(self, token_budget=1500, max_chunks=5, max_chars_per_chunk=600,
+                 duplicate_threshold=0.5, cache_size=512):
+        self.token_budget = token_budget
+        self.max_chunks = max_chunks
+        self.max_chars_per_chunk = max_chars_per_chunk
+        self.duplicate_threshold = duplicate_threshold
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.packed_tokens = 0
+        self.packed_count = 0
+
+    def pack(self, candidates, version):
+        """候補（スコア順のチャンク辞書）から予算内のチャンクを選び、スコア順で返す"""
+        signature = (version, tuple((c['chunk_id'], round(c['score'], 4)) for c in candidates))
+        with self._lock:
+            packed = self._cache.get(signature)
+            if packed is not None:
+                self._cache.move_to_end(signature)
+                self.hits += 1
+                return packed
+            self.misses += 1
+
+        packed = self._select(candidates)
+
+        with self._lock:
+            self._cache[signature] = packed
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            self.packed_tokens += sum(c['tokens'] for c in packed)
+            self.packed_count += 1
+        return packed
+
+    def _select(self, candidates):
+        blocks = []
+        for chunk in candidates:
+            block = format_block(chunk, self.max_chars_per_chunk)
+            blocks.append((chunk, estimate_tokens(block)))
+
+        # スコア÷トークン数の大きい順に、予算と重複を確認しながら選ぶ
+        order = sorted(blocks, key=lambda item: -item[0]['score'] / max(1, item[1]))
+        selected = []
+        remaining = self.token_budget
+        for chunk, tokens in order:
+            if len(selected) >= self.max_chunks:
+                break
+            if tokens > remaining:
+                continue
+            grams = set(ngrams(normalize(chunk['text'])))
+            if any(other['url'] == chunk['url'] and containment(grams, other_grams) >= self.duplicate_threshold
+                   for other, other_grams in selected):
+                continue
+            selected.append(({**chunk, 'tokens': tokens}, grams))
+            remaining -= tokens
+
+        # 1件も収まらない場合は最上位のチャンクを予算に合わせて切り詰める
+        if not selected and candidates:
+            best = candidates[0]
+            header_tokens = estimate_tokens(format_block({**best, 'text': ''}, 0))
+            text = best['text'][:max(0, self.token_budget - header_tokens)]
+            selected.append(({**best, 'text': text, 'tokens': header_tokens + estimate_tokens(text)}, set()))
+
+        return sorted((chunk for chunk, _ in selected), key=lambda c: -c['score'])
+
+    def clear(self):
+        """キャッシュを全件破棄（インデックス更新時）"""
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'tokenBudget': self.token_budget,
+                'entries': len(self._cache),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRatio': round(self.hits / lookups, 3) if lookups else 0.0,
+                'avgPackedTokens': round(self.packed_tokens / self.packed_count, 1) if self.packed_count else 0.0,
+            }
@@ -0,0 +1,165 @@
+"""
+ローカルで動くLLMプロバイダーの代役（OpenAI互換の /v1/chat/completions）
+APIキーやネットワークなしで、LLMクライアントの接続プール・タイムアウト・再試行・サーキットブレーカーを
+試験・計測するためのサーバーです。応答までの待ち時間とエラーの発生率を指定できます。
+
+- 応答本文はプロンプト中の「ユーザーの質問」を引用した決定的なテキスト
+- stream=true なら SSE（data: {...} / data: [DONE]）で断片ごとに返す
+- GET /stats でリクエスト数・ステータス別件数・TCP接続数、POST /stats/reset で集計をリセット
+
+起動:
+    python fake_llm_server.py --port 8089 --latency 0.3 --error-rate 0.1
+    LLM_PROVIDER=fake FAKE_LLM_URL=http://127.0.0.1:8089/v1 python app.py
+"""
+
+import re
+import json
+import random
+import asyncio
+import argparse
+
+from aiohttp import web
+
+QUESTION = re.compile(r'ユーザーの質問:\s*(.+)')
+
+# stream=true のときの断片（句読点・改行ごと）
+STREAM_PIECE = re.compile(r'[^、。\n]*[、。\n]?')
+
+
+def answer_text(prompt):
+    """プロンプトから決定的な回答テキストを作成"""
+    match = QUESTION.search(prompt)
+    question = match.group(1).strip() if match else prompt.strip()[:40]
+    return (f'「{question}」についてお答えします。\n'
+            '1. ガイドラインの該当ページで手順を確認してください。\n'
+            '2. 不明点は早めにチームへ共有しましょう。\n'
+            '3. 対応後は結果を振り返り、次回に活かしてください。\n'
+            '詳しくは関連ページをご覧ください。')
+
+
+class FaultProfile:
+    """待ち時間とエラーの注入設定"""
+
+    def __init__(self, latency=0.0, jitter=0.0, token_delay=0.0, error_rate=0.0,
+                 rate_limit_rate=0.0, hang_rate=0.0, drop_rate=0.0, hang_seconds=60.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.hang_rate = hang_rate
+        self.drop_rate = drop_rate
+        self.hang_seconds = hang_seconds
+        self.rng = random.Random(seed)
+
+    def delay(self):
+        return max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+
+    def fault(self):
+        """今回のリクエストで注入する障害（なければ None）"""
+        roll = self.rng.random()
+        for name, rate in (('error', self.error_rate), ('rate_limit', self.rate_limit_rate),
+                           ('hang', self.hang_rate), ('drop', self.drop_rate)):
+            if roll < rate:
+                return name
+            roll -= rate
+        return None
+
+
+def create_fake_app(profile=None):
+    """代役サーバーの aiohttp アプリを作成"""
+    profile = profile or FaultProfile()
+    stats = {'requests': 0, 'status': {}, 'faults': {}, 'peers': set()}
+
+    def count(status):
+        stats['status'][str(status)] = stats['status'].get(str(status), 0) + 1
+
+    async def chat_completions(request):
+        stats['requests'] += 1
+        # 送信元ポートの数 = クライアントが張ったTCP接続の数
+        stats['peers'].add(request.transport.get_extra_info('peername'))
+        body = await request.json()
+        prompt = body['messages'][-1]['content']
+
+        fault = profile.fault()
+        if fault:
+            stats['faults'][fault] = stats['faults'].get(fault, 0) + 1
+        if fault == 'hang':
+            await asyncio.sleep(profile.hang_seconds)
+        await asyncio.sleep(profile.delay())
+        if fault == 'drop':
+            # 応答を返さずに接続を切る
+            request.transport.close()
+            count('drop')
+            return web.Response(status=500)
+        if fault == 'error':
+            count(500)
+            return web.json_response({'error': {'message': 'injected server error'}}, status=500)
+        if fault == 'rate_limit':
+            count(429)
+            return web.json_response({'error': {'message': 'injected rate limit'}}, status=429,
+                                     headers={'Retry-After': '1'})
+
+        text = answer_text(prompt)
+        count(200)
+        if not body.get('stream'):
+            return web.json_response({
+                'id': 'fake', 'object': 'chat.completion', 'model': body.get('model', 'fake'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text},
+                             'finish_reason': 'stop'}],
+            })
+
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        for piece in STREAM_PIECE.findall(text):
+            if not piece:
+                continue
+            if profile.token_delay:
+                await asyncio.sleep(profile.token_delay)
+            event = {'object': 'chat.completion.chunk', 'choices': [{'index': 0, 'delta': {'content': piece}}]}
+            await response.write(f'data: {json.dumps(event, ensure_ascii=False)}\n\n'.encode('utf-8'))
+        await response.write(b'data: [DONE]\n\n')
+        await response.write_eof()
+        return response
+
+    async def get_stats(request):
+        return web.json_response({
+            'requests': stats['requests'],
+            'status': stats['status'],
+            'faults': stats['faults'],
+            'connections': len(stats['peers']),
+        })
+
+    async def reset_stats(request):
+        stats.update({'requests': 0, 'status': {}, 'faults': {}, 'peers': set()})
+        return web.json_response({'ok': True})
+
+    app = web.Application()
+    app['profile'] = profile
+    app.router.add_post('/v1/chat/completions', chat_completions)
+    app.router.add_get('/stats', get_stats)
+    app.router.add_post('/stats/reset', reset_stats)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='LLMプロバイダーの代役サーバー（OpenAI互換）')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.0, help='応答までの待ち時間（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='待ち時間の揺らぎ（±秒）')
+    parser.add_argument('--token-delay', type=float, default=0.0, help='ストリーミングの断片ごとの待ち時間（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='500 を返す割合')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='429 を返す割合')
+    parser.add_argument('--hang-rate', type=float, default=0.0, help='応答せずに待たせる割合')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='応答せずに接続を切る割合')
+    parser.add_argument('--hang-seconds', type=float, default=60.0)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    profile = FaultProfile(args.latency, args.jitter, args.token_delay, args.error_rate,
+                           args.rate_limit_rate, args.hang_rate, args.drop_rate, args.hang_seconds, args.seed)
+    web.run_app(create_fake_app(profile), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
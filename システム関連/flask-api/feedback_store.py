@@ -0,0 +1,321 @@
+"""
+ガイドラインへのフィードバックの保存と集計
+投稿はメモリ上の待ち行列に入れてすぐに返し、書き込み用のスレッドが一定件数・一定間隔ごとに
+1つのトランザクションでまとめて SQLite に書き込みます（投稿ごとの fsync を避けるため）。
+
+- データベースは WAL モード（書き込み中も集計の読み込みを止めない、複数ワーカーからの書き込みも可）
+- ページ別・カテゴリ別の集計と一覧は (page, created_at, id) / (category, created_at, id) の索引で絞り込む
+  （数万件の投稿があっても対象の範囲だけを読み、一覧の (created_at, id) 順もそのまま索引から得る。
+  rating も索引に含めるため、集計は表を読まない）
+- 待ち行列が一杯の場合は QueueFull を送出し、サーバーは 503 を返す
+"""
+
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS feedback (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    page TEXT NOT NULL DEFAULT '',
+    category TEXT NOT NULL DEFAULT '',
+    kind TEXT NOT NULL DEFAULT 'suggestion',
+    rating INTEGER,
+    message TEXT NOT NULL,
+    contact TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_feedback_page ON feedback (page, created_at, id, rating);
+CREATE INDEX IF NOT EXISTS idx_feedback_category ON feedback (category, created_at, id, rating);
+CREATE INDEX IF NOT EXISTS idx_feedback_created ON feedback (created_at);
+'''
+
+INSERT = ('INSERT INTO feedback (created_at, page, category, kind, rating, message, contact) '
+          'VALUES (?, ?, ?, ?, ?, ?, ?)')
+
+# 集計の単位（列名）
+GROUP_COLUMNS = {'page': 'page', 'category': 'category'}
+
+KINDS = ('suggestion', 'bug', 'question', 'praise')
+
+MAX_MESSAGE_LENGTH = 4000
+MAX_FIELD_LENGTH = 200
+
+
+class QueueFull(Exception):
+    """書き込み待ちの投稿が上限に達した"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'フィードバックの受付が混み合っています（{retry_after}秒後に再試行してください）')
+        self.retry_after = retry_after
+
+
+def _text(data, name, limit=MAX_FIELD_LENGTH):
+    value = data.get(name) or ''
+    if not isinstance(value, str):
+        raise ValueError(f'{name} は文字列で指定してください')
+    value = value.strip()
+    if len(value) > limit:
+        raise ValueError(f'{name} は{limit}文字以内で指定してください')
+    return value
+
+
+def page_name(page):
+    """URL・パスからページのファイル名だけを取り出す（アンカーやクエリ文字列は集計の単位に含めない）"""
+    return page.split('#', 1)[0].split('?', 1)[0].rsplit('/', 1)[-1]
+
+
+def parse_submission(data):
+    """投稿のJSONを検証して保存する形に変換（不正な値は ValueError）"""
+    if not isinstance(data, dict):
+        raise ValueError('JSONオブジェクトで送信してください')
+    message = _text(data, 'message', MAX_MESSAGE_LENGTH)
+    if not message:
+        raise ValueError('message は必須です')
+    kind = _text(data, 'kind') or 'suggestion'
+    if kind not in KINDS:
+        raise ValueError(f"kind は {' / '.join(KINDS)} のいずれかで指定してください")
+    rating = data.get('rating')
+    if rating is not None and (isinstance(rating, bool) or not isinstance(rating, int) or not 1 <= rating <= 5):
+        raise ValueError('rating は1〜5の整数で指定してください')
+    return {
+        'page': page_name(_text(data, 'page')),
+        'category': _text(data, 'category'),
+        'kind': kind,
+        'rating': rating,
+        'message': message,
+        'contact': _text(data, 'contact'),
+    }
+
+
+def connect(path):
+    """WAL モードの接続（書き込みの競合は busy_timeout まで待つ）"""
+    connection = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+    connection.execute('PRAGMA journal_mode=WAL')
+    # WAL では NORMAL でもコミット済みのデータは壊れない（電源断で直前のコミットが失われることはある）
+    connection.execute('PRAGMA synchronous=NORMAL')
+    return connection
+
+
+class FeedbackStore:
+    """投稿の待ち行列・まとめ書き・集計
+
+    batch_size 件たまるか、最初の投稿から flush_interval 秒経つと書き込みます。
+    """
+
+    def __init__(self, path, batch_size=200, flush_interval=1.0, max_queue=10000, clock=time.time):
+        self.path = str(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._clock = clock
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self.accepted = 0
+        self.rejected = 0
+        self.written = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.last_flush_ms = 0.0
+
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._writer = connect(self.path)
+        self._writer.executescript(SCHEMA)
+        self._local = threading.local()
+        self._thread = threading.Thread(target=self._run, name='feedback-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, entry):
+        """検証済みの投稿を待ち行列に追加（書き込みは後でまとめて行う）"""
+        row = (self._clock(), entry['page'], entry['category'], entry['kind'], entry['rating'],
+               entry['message'], entry['contact'])
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('FeedbackStore は閉じられています')
+            if len(self._queue) >= self.max_queue:
+                self.rejected += 1
+                raise QueueFull(max(1, round(self.flush_interval)))
+            self._queue.append(row)
+            self.accepted += 1
+            # 最初の1件で書き込み用スレッドを起こし、batch_size 件に達したら待たずに書き込ませる
+            if len(self._queue) == 1 or len(self._queue) >= self.batch_size:
+                self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._queue and not self._closed:
+                    self._condition.wait()
+                # 件数が足りなければ flush_interval までは後続の投稿を待つ
+                if len(self._queue) < self.batch_size and not self._closed:
+                    self._condition.wait(self.flush_interval)
+                closed = self._closed
+            if closed:
+                return
+            if not self.flush():
+                # データベースがロックされている場合などは少し待ってから再試行
+                time.sleep(self.flush_interval)
+
+    def flush(self):
+        """待ち行列の投稿を batch_size 件ずつトランザクションで書き込む（失敗したら False）"""
+        with self._flush_lock:
+            while True:
+                with self._condition:
+                    count = min(len(self._queue), self.batch_size)
+                    batch = [self._queue.popleft() for _ in range(count)]
+                if not batch:
+                    return True
+                started = time.perf_counter()
+                try:
+                    self._writer.execute('BEGIN IMMEDIATE')
+                    self._writer.executemany(INSERT, batch)
+                    self._writer.execute('COMMIT')
+                except sqlite3.Error as e:
+                    if self._writer.in_transaction:
+                        self._writer.execute('ROLLBACK')
+                    self.failed_batches += 1
+                    logger.error('フィードバックの書き込みに失敗（%d件は次回に再試行）: %s', len(batch), e)
+                    with self._condition:
+                        self._queue.extendleft(reversed(batch))
+                    return False
+                self.written += len(batch)
+                self.batches += 1
+                self.last_flush_ms = (time.perf_counter() - started) * 1000
+
+    def close(self):
+        """残りの投稿を書き込んでスレッドを止める"""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self.flush()
+        self._writer.close()
+
+    def _reader(self):
+        """集計用の接続（スレッドごと）"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = connect(self.path)
+        return connection
+
+    def report(self, by='page', since=None, until=None, limit=100):
+        """ページ別・カテゴリ別の件数・平均評価・最新の投稿日時（件数の多い順）"""
+        column = GROUP_COLUMNS.get(by)
+        if column is None:
+            raise ValueError(f"by は {' / '.join(GROUP_COLUMNS)} のいずれかで指定してください")
+        where, params = self._time_range(since, until)
+        rows = self._reader().execute(
+            f'SELECT {column}, COUNT(*), AVG(rating), MAX(created_at) FROM feedback {where} '
+            f'GROUP BY {column} ORDER BY COUNT(*) DESC, {column} LIMIT ?', (*params, limit)).fetchall()
+        return [{by: key, 'count': count,
+                 'avgRating': round(average, 2) if average is not None else None, 'latest': latest}
+                for key, count, average, latest in rows]
+
+    def entries(self, page=None, category=None, since=None, until=None, until_id=None, limit=50):
+        """投稿の一覧（新しい順、同じ時刻なら id の大きい順）
+
+        続きは最後の投稿の createdAt と id を until と until_id に指定して取得します
+        （(created_at, id) の索引の範囲を読むだけなので深いページでも速く、同じ時刻の投稿も漏れない）。
+        """
+        if until_id is not None and until is None:
+            raise ValueError('untilId は until と一緒に指定してください')
+        conditions = []
+        params = []
+        if page is not None:
+            conditions.append('page = ?')
+            params.append(page)
+        if category is not None:
+            conditions.append('category = ?')
+            params.append(category)
+        if until_id is not None:
+            conditions.append('(created_at, id) < (?, ?)')
+            params.extend((until, until_id))
+            until = None
+        where, range_params = self._time_range(since, until, conditions)
+        params.extend(range_params)
+        rows = self._reader().execute(
+            'SELECT id, created_at, page, category, kind, rating, message, contact FROM feedback '
+            f'{where} ORDER BY created_at DESC, id DESC LIMIT ?', (*params, limit)).fetchall()
+        keys = ('id', 'createdAt', 'page', 'category', 'kind', 'rating', 'message', 'contact')
+        return [dict(zip(keys, row)) for row in rows]
+
+    @staticmethod
+    def _time_range(since, until, conditions=None):
+        conditions = list(conditions or [])
+        params = []
+        if since is not None:
+            conditions.append('created_at >= ?')
+            params.append(since)
+        if until is not None:
+            conditions.append('created_at < ?')
+            params.append(until)
+        return ('WHERE ' + ' AND '.join(conditions) if conditions else ''), params
+
+    def stats(self):
+        with self._condition:
+            queued = len(self._queue)
+        return {
+            'queued': queued,
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'written': self.written,
+            'batches': self.batches,
+            'failedBatches': self.failed_batches,
+            'lastFlushMs': round(self.last_flush_ms, 2),
+        }
+
+
+def category_of(pages, page):
+    """ページのファイル名からカテゴリを求める（チャット用インデックスのページ一覧を使用）"""
+    for info in pages:
+        if info.get('url') == page:
+            return info.get('category', '')
+    return ''
+
+
+def _number(args, name, cast=float, default=None):
+    value = args.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        raise ValueError(f'{name} は数値で指定してください') from None
+
+
+def report_query(args):
+    """集計APIのクエリ文字列を FeedbackStore.report の引数に変換"""
+    return {
+        'by': args.get('by', 'page'),
+        'since': _number(args, 'since'),
+        'until': _number(args, 'until'),
+        'limit': max(1, min(1000, _number(args, 'limit', int, 100))),
+    }
+
+
+def entries_query(args):
+    """一覧APIのクエリ文字列を FeedbackStore.entries の引数に変換"""
+    return {
+        'page': args.get('page'),
+        'category': args.get('category'),
+        'since': _number(args, 'since'),
+        'until': _number(args, 'until'),
+        'until_id': _number(args, 'untilId', int),
+        'limit': max(1, min(500, _number(args, 'limit', int, 50))),
+    }
+
+
+def authorized(token, authorization, remote_addr):
+    """集計APIを使えるか（トークン未設定ならローカルからのアクセスのみ）"""
+    if token:
+        return authorization == f'Bearer {token}'
+    return remote_addr in ('127.0.0.1', '::1')
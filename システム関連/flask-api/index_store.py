@@ -0,0 +1,71 @@
+"""
+チャット用インデックスの保持と再読み込み
+site_generator がインデックスを再生成したら、次のリクエストで自動的に読み込み直します。
+
+非同期サーバー（async_app.py）では auto_reload=False にして、読み込み（JSONの解析・スナップショットの展開）を
+イベントループで行わないようにし、バックグラウンドのタスクがスレッドプールで check() を呼びます。
+"""
+
+import os
+import time
+import logging
+import threading
+
+from retrieval import ChatIndex
+
+logger = logging.getLogger(__name__)
+
+
+class IndexStore:
+    """現在のインデックスを保持し、ファイル更新を検知して差し替える
+
+    loader にはパスを受け取り version 属性を持つオブジェクトを返す関数を指定します（既定は ChatIndex.load）。
+    auto_reload=False なら current() は差し替え済みのインデックスを返すだけで、更新の確認は check() で行います。
+    """
+
+    def __init__(self, path, reload_interval=5.0, loader=ChatIndex.load, auto_reload=True):
+        self.path = path
+        self.loader = loader
+        self.reload_interval = reload_interval
+        self.auto_reload = auto_reload
+        self._lock = threading.Lock()
+        self._index = None
+        self._mtime = None
+        self._checked_at = 0.0
+        self._listeners = []
+        self.reload()
+
+    def add_listener(self, callback):
+        """インデックス差し替え時に呼ばれる関数を登録（callback(new_index)）"""
+        self._listeners.append(callback)
+
+    def reload(self):
+        """ファイルを読み込んでインデックスを差し替える"""
+        mtime = os.stat(self.path).st_mtime_ns
+        index = self.loader(self.path)
+        with self._lock:
+            previous = self._index
+            self._index = index
+            self._mtime = mtime
+            self._checked_at = time.monotonic()
+        if previous is not None and previous.version != index.version:
+            logger.info('チャット用インデックスを更新: %s -> %s', previous.version, index.version)
+            for callback in self._listeners:
+                callback(index)
+        return index
+
+    def check(self):
+        """ファイルが更新されていれば読み込み直す"""
+        self._checked_at = time.monotonic()
+        try:
+            if os.stat(self.path).st_mtime_ns != self._mtime:
+                self.reload()
+        except (OSError, ValueError) as e:
+            # 再生成中などで読めない場合は今のインデックスを使い続ける
+            logger.warning('インデックスの再読み込みに失敗: %s', e)
+
+    def current(self):
+        """現在のインデックス（auto_reload なら一定間隔でファイル更新を確認）"""
+        if self.auto_reload and time.monotonic() - self._checked_at >= self.reload_interval:
+            self.check()
+        return self._index
@@ -0,0 +1,95 @@
+"""
+ナレッジベースの意図判定（site_generator が出力する intent-matcher.json）
+ビルド時に作成した Aho-Corasick オートマトン（ブラウザの findBestResponse と同じデータ）で、
+入力を1回走査するだけで全ての意図のスコアを計算します。
+よくある質問と完全一致・ほぼ一致する質問には、ビルド時に確定した回答をLLMを使わずに返します。
+
+スコアはブラウザ側の findBestResponse と同じで、入力に含まれるキーワード1つにつき5点
+（入力全体がキーワードと一致する場合は10点）です。
+LLMを使わない回答は検索結果のセクションから作り、該当するセクションがない場合だけ意図の回答を使います。
+"""
+
+import json
+
+from retrieval import normalize, ngrams
+
+SUPPORTED_FORMAT = 3
+
+MATCH_SCORE = 5
+EXACT_SCORE = 10
+
+
+def jaccard(grams_a, grams_b):
+    union = len(grams_a | grams_b)
+    return len(grams_a & grams_b) / union if union else 0.0
+
+
+class IntentMatcher:
+    """intent-matcher.json を読み込んだ意図判定器"""
+
+    def __init__(self, data):
+        if data.get('format') != SUPPORTED_FORMAT:
+            raise ValueError(f"未対応の意図判定データ形式です: {data.get('format')}")
+        self.version = data['version']
+        self.intents = data['intents']
+        self.patterns = data['patterns']
+        self.fail = data['fail']
+        self.out_offsets = data['outOffsets']
+        self.out_patterns = data['outPatterns']
+        self.faqs = data['faqs']
+        self.faq_threshold = data['faqThreshold']
+        self._faq_keys = {faq['key']: faq for faq in self.faqs}
+        self._faq_grams = [set(ngrams(faq['key'])) for faq in self.faqs]
+        # 状態ごとの遷移を辞書に展開
+        offsets = data['edgeOffsets']
+        chars = data['edgeChars']
+        targets = data['edgeTargets']
+        self.edges = [
+            {chars[i]: targets[i] for i in range(offsets[state], offsets[state + 1])}
+            for state in range(len(self.fail))
+        ]
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def score(self, message):
+        """[(スコア, 意図番号)] をスコアの高い順で返す"""
+        text = normalize(message)
+        edges = self.edges
+        fail = self.fail
+        found = set()
+        state = 0
+        for ch in text:
+            while state and ch not in edges[state]:
+                state = fail[state]
+            state = edges[state].get(ch, 0)
+            found.update(self.out_patterns[self.out_offsets[state]:self.out_offsets[state + 1]])
+
+        scores = {}
+        for pattern_id in found:
+            intent_number, length = self.patterns[pattern_id]
+            scores[intent_number] = scores.get(intent_number, 0) + (
+                EXACT_SCORE if length == len(text) else MATCH_SCORE)
+        return sorted(((score, number) for number, score in scores.items()), key=lambda item: (-item[0], item[1]))
+
+    def best_intent(self, message):
+        """最もスコアの高い意図（該当なしは None）"""
+        ranked = self.score(message)
+        return self.intents[ranked[0][1]] if ranked else None
+
+    def faq_answer(self, message):
+        """よくある質問と完全一致・ほぼ一致すればその質問（該当なしは None）"""
+        key = normalize(message)
+        faq = self._faq_keys.get(key)
+        if faq is not None:
+            return faq
+        grams = set(ngrams(key))
+        best = None
+        best_similarity = 0.0
+        for faq, faq_grams in zip(self.faqs, self._faq_grams):
+            similarity = jaccard(grams, faq_grams)
+            if similarity > best_similarity:
+                best, best_similarity = faq, similarity
+        return best if best_similarity >= self.faq_threshold else None
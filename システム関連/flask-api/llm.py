@@ -0,0 +1,198 @@
+"""
+LLMクライアント
+プロバイダーを差し替えられるよう、generate(prompt, context) と stream(prompt, context) だけを持つ
+共通インターフェースにしています。stream は回答テキストを届いた順に断片で返すジェネレーターです。
+- StubLLMClient: APIキー不要の決定的なローカル応答（開発・負荷試験用）
+- GeminiClient: Google Gemini（google-generativeai）
+- PooledHTTPLLMClient: 接続プール・再試行付きでHTTP APIを直接呼び出すクライアント（llm_http.py）
+
+非同期サーバー（async_app）用に、同じメソッドをコルーチン・非同期ジェネレーターで持つ
+AsyncStubLLMClient / AsyncGeminiClient もあります。
+"""
+
+import re
+import time
+import asyncio
+
+
+class LLMError(Exception):
+    """LLM呼び出しの失敗"""
+
+
+class LLMClient:
+    """LLMクライアントの共通インターフェース"""
+
+    name = 'base'
+
+    def generate(self, prompt, context_chunks):
+        """プロンプトから回答テキストを生成"""
+        raise NotImplementedError
+
+    def stream(self, prompt, context_chunks):
+        """回答テキストを断片ごとに返す（既定では generate の結果をまとめて1回で返す）"""
+        yield self.generate(prompt, context_chunks)
+
+    def stats(self):
+        """ヘルスチェック用の集計"""
+        return {}
+
+    def close(self):
+        """保持している接続を閉じる"""
+
+
+class StubLLMClient(LLMClient):
+    """検索結果をそのまま要約して返す決定的なスタブ"""
+
+    name = 'stub'
+
+    # ストリーミング時の断片（句読点・改行ごと）
+    STREAM_PIECE = re.compile(r'[^、。\n]*[、。\n]?')
+
+    def __init__(self, stream_delay=0.0):
+        # 断片ごとの待ち時間（秒）。画面表示の確認や負荷試験で実際のLLMに近づけるため
+        self.stream_delay = stream_delay
+
+    def stream(self, prompt, context_chunks):
+        for piece in self.STREAM_PIECE.findall(self.generate(prompt, context_chunks)):
+            if piece:
+                if self.stream_delay:
+                    time.sleep(self.stream_delay)
+                yield piece
+
+    def generate(self, prompt, context_chunks):
+        if not context_chunks:
+            return 'ガイドラインに関連する情報が見つかりませんでした。より具体的な質問をお聞かせください。'
+
+        lines = ['ガイドラインから関連する内容をご案内します：', '']
+        for chunk in context_chunks[:3]:
+            excerpt = chunk['text'].replace('\n', ' ')[:120]
+            lines.append(f"**{chunk['section']}**（{chunk['page_title']}）")
+            lines.append(f"- {excerpt}...")
+            lines.append('')
+        lines.append(f"詳しくは『{context_chunks[0]['page_title']}』ページをご覧ください。")
+        return '\n'.join(lines)
+
+
+class GeminiClient(LLMClient):
+    """Google Gemini を使うクライアント"""
+
+    name = 'gemini'
+
+    def __init__(self, api_key, model_name='gemini-pro'):
+        if not api_key:
+            raise LLMError('GEMINI_API_KEY が設定されていません')
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        # モデルは起動時に1度だけ作成して使い回す
+        self.model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt, context_chunks):
+        try:
+            return self.model.generate_content(prompt).text
+        except Exception as e:
+            raise LLMError(f'Gemini API呼び出しに失敗: {e}') from e
+
+    def stream(self, prompt, context_chunks):
+        try:
+            for chunk in self.model.generate_content(prompt, stream=True):
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            raise LLMError(f'Gemini API呼び出しに失敗: {e}') from e
+
+
+class AsyncLLMClient:
+    """非同期サーバー用のLLMクライアントの共通インターフェース"""
+
+    name = 'base'
+
+    async def generate(self, prompt, context_chunks):
+        """プロンプトから回答テキストを生成"""
+        raise NotImplementedError
+
+    async def stream(self, prompt, context_chunks):
+        """回答テキストを断片ごとに返す（既定では generate の結果をまとめて1回で返す）"""
+        yield await self.generate(prompt, context_chunks)
+
+    def stats(self):
+        """ヘルスチェック用の集計"""
+        return {}
+
+    async def close(self):
+        """保持している接続を閉じる"""
+
+
+class AsyncStubLLMClient(AsyncLLMClient):
+    """StubLLMClient と同じ回答を返す非同期スタブ（待ち時間はイベントループを止めない）"""
+
+    name = 'stub'
+
+    def __init__(self, stream_delay=0.0):
+        self.stream_delay = stream_delay
+        self._stub = StubLLMClient()
+
+    async def generate(self, prompt, context_chunks):
+        return ''.join([piece async for piece in self.stream(prompt, context_chunks)])
+
+    async def stream(self, prompt, context_chunks):
+        for piece in StubLLMClient.STREAM_PIECE.findall(self._stub.generate(prompt, context_chunks)):
+            if piece:
+                if self.stream_delay:
+                    await asyncio.sleep(self.stream_delay)
+                yield piece
+
+
+class AsyncGeminiClient(AsyncLLMClient):
+    """Google Gemini の非同期APIを使うクライアント"""
+
+    name = 'gemini'
+
+    def __init__(self, api_key, model_name='gemini-pro'):
+        self.model = GeminiClient(api_key, model_name).model
+
+    async def generate(self, prompt, context_chunks):
+        try:
+            response = await self.model.generate_content_async(prompt)
+            return response.text
+        except Exception as e:
+            raise LLMError(f'Gemini API呼び出しに失敗: {e}') from e
+
+    async def stream(self, prompt, context_chunks):
+        try:
+            response = await self.model.generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            raise LLMError(f'Gemini API呼び出しに失敗: {e}') from e
+
+
+def create_llm_client(config):
+    """設定に応じたLLMクライアントを作成"""
+    from llm_http import PooledHTTPLLMClient, create_provider, client_options
+
+    http_provider = create_provider(config)
+    if http_provider is not None:
+        return PooledHTTPLLMClient(http_provider, **client_options(config))
+    provider = config.LLM_PROVIDER
+    if provider == 'stub':
+        return StubLLMClient(config.STUB_STREAM_DELAY)
+    if provider == 'gemini':
+        return GeminiClient(config.GEMINI_API_KEY, config.GEMINI_MODEL)
+    raise ValueError(f'未対応のLLMプロバイダーです: {provider}')
+
+
+def create_async_llm_client(config):
+    """設定に応じた非同期LLMクライアントを作成"""
+    from llm_http import AsyncHTTPLLMClient, create_provider, client_options
+
+    http_provider = create_provider(config)
+    if http_provider is not None:
+        return AsyncHTTPLLMClient(http_provider, **client_options(config))
+    provider = config.LLM_PROVIDER
+    if provider == 'stub':
+        return AsyncStubLLMClient(config.STUB_STREAM_DELAY)
+    if provider == 'gemini':
+        return AsyncGeminiClient(config.GEMINI_API_KEY, config.GEMINI_MODEL)
+    raise ValueError(f'未対応のLLMプロバイダーです: {provider}')
@@ -0,0 +1,648 @@
+"""
+HTTP APIを直接呼び出すLLMクライアント
+- 接続プール: keep-alive の接続を使い回し、リクエストごとにTCP/TLS接続を張り直さない
+- タイムアウト: 1回の呼び出し（試行）ごとに応答完了までの期限を設ける
+- 再試行: 接続エラー・タイムアウト・429・5xx はジッター付きの指数バックオフで再試行
+  （ストリーミングは最初の断片を返す前に失敗した場合のみ）
+- サーキットブレーカー: 連続して失敗したら一定時間は呼び出さずにすぐ LLMError を送出し、
+  チャットサービスの検索結果だけの回答に切り替える
+- プロバイダー: リクエストの組み立てと応答の解析だけを差し替え可能
+  （OpenAI互換API、Gemini REST API。ローカルの fake_llm_server.py はOpenAI互換）
+
+同期版（PooledHTTPLLMClient）は Flask 版、非同期版（AsyncHTTPLLMClient）は aiohttp 版のサーバーで使います。
+"""
+
+import json
+import time
+import random
+import socket
+import asyncio
+import logging
+import threading
+import http.client
+from collections import deque
+from urllib.parse import urlsplit
+
+from llm import LLMClient, AsyncLLMClient, LLMError
+
+logger = logging.getLogger(__name__)
+
+# 再試行する HTTP ステータス
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+# 再試行の待ち時間として従う Retry-After の上限（秒）
+MAX_RETRY_AFTER = 10.0
+
+
+class RetryableError(LLMError):
+    """再試行すれば成功する可能性がある失敗"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpen(LLMError):
+    """サーキットブレーカーが開いているため呼び出さなかった"""
+
+
+class OpenAICompatibleProvider:
+    """OpenAI互換の Chat Completions API（/chat/completions）"""
+
+    name = 'openai'
+
+    def __init__(self, base_url='https://api.openai.com/v1', api_key='', model='gpt-4o-mini'):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.model = model
+
+    def request(self, prompt, stream):
+        """(URL, ヘッダー, 本文) を返す"""
+        headers = {'Content-Type': 'application/json'}
+        if self.api_key:
+            headers['Authorization'] = f'Bearer {self.api_key}'
+        body = {'model': self.model, 'messages': [{'role': 'user', 'content': prompt}], 'stream': stream}
+        return f'{self.base_url}/chat/completions', headers, json.dumps(body, ensure_ascii=False).encode('utf-8')
+
+    def parse(self, data):
+        return data['choices'][0]['message']['content'] or ''
+
+    def parse_event(self, data):
+        return data['choices'][0].get('delta', {}).get('content') or ''
+
+
+class GeminiRestProvider:
+    """Gemini の REST API（generateContent / streamGenerateContent）"""
+
+    name = 'gemini-rest'
+
+    def __init__(self, base_url='https://generativelanguage.googleapis.com/v1beta', api_key='',
+                 model='gemini-pro'):
+        if not api_key:
+            raise LLMError('GEMINI_API_KEY が設定されていません')
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.model = model
+
+    def request(self, prompt, stream):
+        method = 'streamGenerateContent?alt=sse' if stream else 'generateContent'
+        headers = {'Content-Type': 'application/json', 'x-goog-api-key': self.api_key}
+        body = {'contents': [{'role': 'user', 'parts': [{'text': prompt}]}]}
+        return (f'{self.base_url}/models/{self.model}:{method}', headers,
+                json.dumps(body, ensure_ascii=False).encode('utf-8'))
+
+    def parse(self, data):
+        candidates = data.get('candidates') or [{}]
+        return ''.join(part.get('text', '') for part in candidates[0].get('content', {}).get('parts', []))
+
+    def parse_event(self, data):
+        return self.parse(data)
+
+
+class RetryPolicy:
+    """ジッター付き指数バックオフ（full jitter）"""
+
+    def __init__(self, max_retries=2, base_delay=0.2, max_delay=2.0, rng=None):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._rng = rng or random.Random()
+
+    def delay(self, attempt, retry_after=None):
+        """attempt 回目（0始まり）の失敗後に待つ秒数"""
+        delay = self._rng.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, MAX_RETRY_AFTER))
+        return delay
+
+
+# half-open で通した試行の呼び出しに CircuitBreaker.allow() が返す値
+TRIAL = 'trial'
+
+
+class CircuitBreaker:
+    """連続失敗で開き、reset_timeout 秒後に1件だけ試行を通すサーキットブレーカー（スレッドセーフ）"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if self._clock() - self._opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        """呼び出してよいか（half-open では試行中の1件だけ通し、その呼び出しには TRIAL を返す）"""
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return TRIAL
+            self.rejected += 1
+            return False
+
+    def release(self, allowed):
+        """成功・失敗のどちらも記録せずに終わった呼び出し（取り消し・途中の切断など）の試行の枠を返す
+
+        allowed は allow() の戻り値で、試行（TRIAL）だった場合だけ次の呼び出しが試行できるようにします。
+        """
+        if allowed is TRIAL:
+            with self._lock:
+                self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_in_flight:
+                    self.opened += 1
+                self._opened_at = self._clock()
+                self._trial_in_flight = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self._state(),
+                'consecutiveFailures': self._failures,
+                'opened': self.opened,
+                'rejected': self.rejected,
+            }
+
+
+class ConnectionPool:
+    """http.client の keep-alive 接続プール（スレッドセーフ）"""
+
+    def __init__(self, base_url, max_idle=10, connect_timeout=5.0):
+        parsed = urlsplit(base_url)
+        self.https = parsed.scheme == 'https'
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if self.https else 80)
+        self.max_idle = max_idle
+        self.connect_timeout = connect_timeout
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self, fresh=False):
+        """(接続, 再利用した接続か) を返す（fresh=True なら必ず新しい接続）"""
+        with self._lock:
+            if self._idle and not fresh:
+                self.reused += 1
+                return self._idle.pop(), True
+            self.created += 1
+        connection_class = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return connection_class(self.host, self.port, timeout=self.connect_timeout), False
+
+    def release(self, connection, reusable):
+        """使い終わった接続を戻す（再利用できない場合・空きが上限を超える場合は閉じる）"""
+        if reusable:
+            with self._lock:
+                if len(self._idle) < self.max_idle:
+                    self._idle.append(connection)
+                    return
+        connection.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+        for connection in idle:
+            connection.close()
+
+    def stats(self):
+        with self._lock:
+            return {'created': self.created, 'reused': self.reused, 'idle': len(self._idle)}
+
+
+def iter_sse_data(lines):
+    """SSEの行から data の値（JSON文字列）を順に返す（[DONE] で終了）"""
+    for raw in lines:
+        line = raw.decode('utf-8').strip() if isinstance(raw, bytes) else raw.strip()
+        if not line.startswith('data:'):
+            continue
+        payload = line[5:].strip()
+        if payload == '[DONE]':
+            return
+        yield payload
+
+
+class _CallStats:
+    """呼び出し回数の集計（スレッドセーフ）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+
+    def add(self, **counts):
+        with self._lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
+
+    def snapshot(self):
+        with self._lock:
+            return {'calls': self.calls, 'retries': self.retries, 'failures': self.failures}
+
+
+class PooledHTTPLLMClient(LLMClient):
+    """接続プール・タイムアウト・再試行・サーキットブレーカー付きのLLMクライアント（同期版）"""
+
+    def __init__(self, provider, timeout=30.0, connect_timeout=5.0, pool_size=10,
+                 retry_policy=None, breaker=None):
+        self.provider = provider
+        self.name = provider.name
+        self.timeout = timeout
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.pool = ConnectionPool(provider.base_url, pool_size, connect_timeout)
+        self._stats = _CallStats()
+
+    def generate(self, prompt, context_chunks):
+        def attempt():
+            return self._request(prompt, stream=False)
+        return self._call(attempt)
+
+    def stream(self, prompt, context_chunks):
+        # 最初の断片を受け取るまでは再試行できる。以降の失敗はそのまま LLMError として呼び出し元に伝える
+        pieces = self._call(lambda: self._open_stream(prompt))
+        try:
+            yield from pieces
+        except LLMError:
+            self.breaker.record_failure()
+            raise
+
+    def _call(self, attempt):
+        """サーキットブレーカーと再試行を適用して attempt() を実行"""
+        allowed = self.breaker.allow()
+        if not allowed:
+            raise CircuitOpen(f'{self.name}: 連続して失敗しているため呼び出しを停止中です')
+        try:
+            return self._attempt(attempt)
+        except LLMError:
+            raise
+        except BaseException:
+            # 結果を記録せずに終わった場合も half-open の試行の枠を返す（返さないと二度と試行できない）
+            self.breaker.release(allowed)
+            raise
+
+    def _attempt(self, attempt):
+        self._stats.add(calls=1)
+        retries = self.retry_policy.max_retries
+        for number in range(retries + 1):
+            try:
+                result = attempt()
+            except RetryableError as e:
+                if number >= retries:
+                    self._stats.add(failures=1)
+                    self.breaker.record_failure()
+                    raise
+                delay = self.retry_policy.delay(number, e.retry_after)
+                logger.warning('%s: %s（%.2f秒後に再試行 %d/%d）', self.name, e, delay, number + 1, retries)
+                self._stats.add(retries=1)
+                time.sleep(delay)
+            except LLMError:
+                self._stats.add(failures=1)
+                self.breaker.record_failure()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+
+    def _send(self, prompt, stream):
+        """リクエストを送信し (接続, レスポンス, 期限) を返す（エラー応答は例外に変換）"""
+        url, headers, body = self.provider.request(prompt, stream)
+        parsed = urlsplit(url)
+        path = parsed.path + (f'?{parsed.query}' if parsed.query else '')
+        deadline = time.monotonic() + self.timeout
+
+        # 再利用した接続がサーバー側で閉じられていた場合は、新しい接続で1度だけ送り直す
+        fresh = False
+        while True:
+            connection, reused = self.pool.acquire(fresh)
+            try:
+                if connection.sock is None:
+                    # 接続は connect_timeout、以降の送受信は呼び出しのタイムアウトで待つ
+                    connection.connect()
+                connection.sock.settimeout(self.timeout)
+                connection.request('POST', path, body=body, headers=headers)
+                response = connection.getresponse()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                connection.close()
+                if reused:
+                    fresh = True
+                    continue
+                raise RetryableError(f'{self.name}: 接続が切断されました: {e}') from e
+            except socket.timeout as e:
+                connection.close()
+                raise RetryableError(f'{self.name}: 応答がタイムアウトしました（{self.timeout}秒）') from e
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                raise RetryableError(f'{self.name}: 接続に失敗しました: {e}') from e
+
+        if response.status != 200:
+            detail = response.read()[:200].decode('utf-8', 'replace')
+            self.pool.release(connection, not response.will_close)
+            message = f'{self.name}: HTTP {response.status}: {detail}'
+            if response.status in RETRYABLE_STATUS:
+                retry_after = response.getheader('Retry-After')
+                raise RetryableError(message, float(retry_after) if retry_after and retry_after.isdigit() else None)
+            raise LLMError(message)
+        return connection, response, deadline
+
+    def _read(self, connection, deadline, read):
+        """期限までの残り時間をソケットのタイムアウトにして read() を実行"""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise socket.timeout()
+        # Connection: close の応答では接続側のソケットが外されているため、送信時のタイムアウトのまま読む
+        if connection.sock is not None:
+            connection.sock.settimeout(remaining)
+        return read()
+
+    def _request(self, prompt, stream):
+        connection, response, deadline = self._send(prompt, stream)
+        try:
+            data = json.loads(self._read(connection, deadline, response.read))
+        except socket.timeout as e:
+            connection.close()
+            raise RetryableError(f'{self.name}: 応答がタイムアウトしました（{self.timeout}秒）') from e
+        except (OSError, http.client.HTTPException) as e:
+            connection.close()
+            raise RetryableError(f'{self.name}: 応答の受信に失敗しました: {e}') from e
+        except ValueError as e:
+            connection.close()
+            raise LLMError(f'{self.name}: 応答を解析できません: {e}') from e
+        self.pool.release(connection, not response.will_close)
+        try:
+            return self.provider.parse(data)
+        except (KeyError, IndexError, TypeError) as e:
+            raise LLMError(f'{self.name}: 応答の形式が不正です: {e}') from e
+
+    def _open_stream(self, prompt):
+        """ストリームを開き、最初の断片を受け取った状態のジェネレーターを返す（ここまでは再試行可能）"""
+        connection, response, deadline = self._send(prompt, stream=True)
+        pieces = self._iter_stream(connection, response, deadline)
+        try:
+            first = next(pieces)
+        except StopIteration:
+            return iter(())
+        except LLMError as e:
+            raise RetryableError(str(e)) from e
+
+        def chain():
+            yield first
+            yield from pieces
+        return chain()
+
+    def _iter_stream(self, connection, response, deadline):
+        reusable = False
+        try:
+            lines = iter(lambda: self._read(connection, deadline, response.readline), b'')
+            for payload in iter_sse_data(lines):
+                piece = self.provider.parse_event(json.loads(payload))
+                if piece:
+                    yield piece
+            # 残り（終端のチャンク）を読み切れば接続を再利用できる
+            self._read(connection, deadline, response.read)
+            reusable = not response.will_close
+        except socket.timeout as e:
+            raise LLMError(f'{self.name}: 応答がタイムアウトしました（{self.timeout}秒）') from e
+        except (OSError, http.client.HTTPException, ValueError, KeyError, IndexError) as e:
+            raise LLMError(f'{self.name}: ストリームの受信に失敗しました: {e}') from e
+        finally:
+            # 途中で打ち切られた場合（クライアントの切断など）は接続を閉じる
+            self.pool.release(connection, reusable)
+
+    def close(self):
+        self.pool.close()
+
+    def stats(self):
+        return {
+            'provider': self.name,
+            **self._stats.snapshot(),
+            'connections': self.pool.stats(),
+            'breaker': self.breaker.stats(),
+        }
+
+
+class AsyncHTTPLLMClient(AsyncLLMClient):
+    """PooledHTTPLLMClient の非同期版（aiohttp のコネクタで keep-alive 接続をプール）"""
+
+    def __init__(self, provider, timeout=30.0, connect_timeout=5.0, pool_size=10,
+                 retry_policy=None, breaker=None):
+        self.provider = provider
+        self.name = provider.name
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.pool_size = pool_size
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self._stats = _CallStats()
+        self._session = None
+        self._connections = 0
+
+    def _get_session(self):
+        # セッションはイベントループ上で作成する必要があるため、最初の呼び出し時に作成
+        if self._session is None or self._session.closed:
+            import aiohttp
+
+            trace = aiohttp.TraceConfig()
+
+            async def on_connection_create_end(session, context, params):
+                self._connections += 1
+
+            trace.on_connection_create_end.append(on_connection_create_end)
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=self.timeout, sock_connect=self.connect_timeout),
+                trace_configs=[trace])
+        return self._session
+
+    async def generate(self, prompt, context_chunks):
+        return await self._call(lambda: self._request(prompt))
+
+    async def stream(self, prompt, context_chunks):
+        pieces = await self._call(lambda: self._open_stream(prompt))
+        try:
+            async for piece in pieces:
+                yield piece
+        except LLMError:
+            self.breaker.record_failure()
+            raise
+        finally:
+            await pieces.aclose()
+
+    async def _call(self, attempt):
+        allowed = self.breaker.allow()
+        if not allowed:
+            raise CircuitOpen(f'{self.name}: 連続して失敗しているため呼び出しを停止中です')
+        try:
+            return await self._attempt(attempt)
+        except LLMError:
+            raise
+        except BaseException:
+            # CHAT_DEGRADE_AFTER やクライアントの切断で取り消された場合も試行の枠を返す
+            self.breaker.release(allowed)
+            raise
+
+    async def _attempt(self, attempt):
+        self._stats.add(calls=1)
+        retries = self.retry_policy.max_retries
+        for number in range(retries + 1):
+            try:
+                result = await attempt()
+            except RetryableError as e:
+                if number >= retries:
+                    self._stats.add(failures=1)
+                    self.breaker.record_failure()
+                    raise
+                delay = self.retry_policy.delay(number, e.retry_after)
+                logger.warning('%s: %s（%.2f秒後に再試行 %d/%d）', self.name, e, delay, number + 1, retries)
+                self._stats.add(retries=1)
+                await asyncio.sleep(delay)
+            except LLMError:
+                self._stats.add(failures=1)
+                self.breaker.record_failure()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+
+    async def _send(self, prompt, stream):
+        import aiohttp
+
+        url, headers, body = self.provider.request(prompt, stream)
+        try:
+            response = await self._get_session().post(url, data=body, headers=headers)
+        except asyncio.TimeoutError as e:
+            raise RetryableError(f'{self.name}: 応答がタイムアウトしました（{self.timeout}秒）') from e
+        except aiohttp.ClientError as e:
+            raise RetryableError(f'{self.name}: 接続に失敗しました: {e}') from e
+
+        if response.status != 200:
+            detail = (await response.read())[:200].decode('utf-8', 'replace')
+            response.release()
+            message = f'{self.name}: HTTP {response.status}: {detail}'
+            if response.status in RETRYABLE_STATUS:
+                retry_after = response.headers.get('Retry-After')
+                raise RetryableError(message, float(retry_after) if retry_after and retry_after.isdigit() else None)
+            raise LLMError(message)
+        return response
+
+    async def _request(self, prompt):
+        import aiohttp
+
+        response = await self._send(prompt, stream=False)
+        try:
+            data = await response.json(content_type=None)
+        except asyncio.TimeoutError as e:
+            raise RetryableError(f'{self.name}: 応答がタイムアウトしました（{self.timeout}秒）') from e
+        except aiohttp.ClientError as e:
+            raise RetryableError(f'{self.name}: 応答の受信に失敗しました: {e}') from e
+        except ValueError as e:
+            raise LLMError(f'{self.name}: 応答を解析できません: {e}') from e
+        finally:
+            response.release()
+        try:
+            return self.provider.parse(data)
+        except (KeyError, IndexError, TypeError) as e:
+            raise LLMError(f'{self.name}: 応答の形式が不正です: {e}') from e
+
+    async def _open_stream(self, prompt):
+        """ストリームを開き、最初の断片を受け取った状態の非同期ジェネレーターを返す（ここまでは再試行可能）"""
+        response = await self._send(prompt, stream=True)
+        pieces = self._iter_stream(response)
+        try:
+            first = await pieces.__anext__()
+        except StopAsyncIteration:
+            first = None
+        except LLMError as e:
+            raise RetryableError(str(e)) from e
+
+        async def chain():
+            try:
+                if first is not None:
+                    yield first
+                    async for piece in pieces:
+                        yield piece
+            finally:
+                await pieces.aclose()
+        return chain()
+
+    async def _iter_stream(self, response):
+        import aiohttp
+
+        try:
+            async for raw in response.content:
+                if raw.strip() == b'data: [DONE]':
+                    break
+                for payload in iter_sse_data([raw]):
+                    piece = self.provider.parse_event(json.loads(payload))
+                    if piece:
+                        yield piece
+        except asyncio.TimeoutError as e:
+            raise LLMError(f'{self.name}: 応答がタイムアウトしました（{self.timeout}秒）') from e
+        except (aiohttp.ClientError, ValueError, KeyError, IndexError) as e:
+            raise LLMError(f'{self.name}: ストリームの受信に失敗しました: {e}') from e
+        finally:
+            response.release()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    def stats(self):
+        return {
+            'provider': self.name,
+            **self._stats.snapshot(),
+            'connections': {'created': self._connections},
+            'breaker': self.breaker.stats(),
+        }
+
+
+def create_provider(config):
+    """設定に応じたHTTPプロバイダーを作成（該当しなければ None）"""
+    provider = config.LLM_PROVIDER
+    if provider == 'openai':
+        return OpenAICompatibleProvider(config.OPENAI_BASE_URL, config.OPENAI_API_KEY, config.OPENAI_MODEL)
+    if provider == 'fake':
+        return OpenAICompatibleProvider(config.FAKE_LLM_URL, '', 'fake')
+    if provider == 'gemini-rest':
+        return GeminiRestProvider(api_key=config.GEMINI_API_KEY, model=config.GEMINI_MODEL)
+    return None
+
+
+def client_options(config):
+    """HTTPクライアントのタイムアウト・プール・再試行・ブレーカーの設定"""
+    return {
+        'timeout': config.LLM_TIMEOUT,
+        'connect_timeout': config.LLM_CONNECT_TIMEOUT,
+        'pool_size': config.LLM_POOL_SIZE,
+        'retry_policy': RetryPolicy(config.LLM_MAX_RETRIES, config.LLM_RETRY_BASE_DELAY, config.LLM_RETRY_MAX_DELAY),
+        'breaker': CircuitBreaker(config.LLM_BREAKER_THRESHOLD, config.LLM_BREAKER_RESET),
+    }
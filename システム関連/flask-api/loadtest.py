@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+チャットAPIと静的サイトの負荷試験
+生成済みサイトのページ取得・search-index.json の取得・/api/chat への質問（knowledge_base.json から作成）を
+指定した割合で混ぜて送り、スループット・p50/p95/p99 レイテンシ・エラー率をJSONで出力します。
+
+- 既定は同時接続数を固定したクローズドループ（--concurrency）
+- --rate を指定すると到着間隔が指数分布のオープンループになり、レイテンシは予定した送信時刻から計測
+  （サーバーが遅れても送信を控えないため、混雑時の待ち時間を過小評価しない）
+- --spawn を指定すると stub LLM の async_app.py と site_output の静的サーバーを起動して試験し、終了後に停止
+
+使い方:
+    python loadtest.py --spawn --duration 20 --concurrency 32
+    python loadtest.py --site-url http://127.0.0.1:8000 --api-url http://127.0.0.1:5000 --rate 50 --mix page=5,search=1,chat=4
+    python loadtest.py --spawn --stream --output result.json      # /api/chat/stream（最初の断片までの時間も計測）
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import socket
+import asyncio
+import argparse
+import subprocess
+from pathlib import Path
+
+import aiohttp
+
+BASE_DIR = Path(__file__).resolve().parent
+DEFAULT_SITE_DIR = BASE_DIR.parent.parent / 'site_output'
+DEFAULT_KNOWLEDGE_BASE = BASE_DIR.parent / '99_テスト機能' / 'AI_assistant' / 'knowledge_base' / 'knowledge_base.json'
+
+DEFAULT_MIX = 'page=6,search=2,chat=2'
+KINDS = ('page', 'search', 'chat')
+
+# 意図のキーワードから作る質問の言い回し
+QUESTION_TEMPLATES = ['{}について教えてください', '{}で困っています', '{}はどうすればいいですか？']
+
+
+def percentile(sorted_values, ratio):
+    """ソート済みリストのパーセンタイル（最近傍法）"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(ratio * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def parse_mix(text):
+    """'page=6,search=2,chat=2' を {種類: 重み} に変換"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in KINDS:
+            raise ValueError(f'不明なリクエストの種類です: {name}（{", ".join(KINDS)}）')
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise ValueError('--mix の重みがすべて0です')
+    return mix
+
+
+def load_questions(path):
+    """knowledge_base.json のよくある質問と、意図のキーワードから作った質問"""
+    with open(path, 'r', encoding='utf-8') as f:
+        knowledge_base = json.load(f)['knowledge_base']
+    questions = [question['question']
+                 for category in knowledge_base.get('categories', [])
+                 for question in category.get('questions', [])]
+    for intent in knowledge_base.get('intents', []):
+        for keyword in intent.get('keywords', []):
+            questions.extend(template.format(keyword) for template in QUESTION_TEMPLATES)
+    return questions
+
+
+def list_pages(site_dir):
+    return sorted(path.name for path in Path(site_dir).glob('*.html'))
+
+
+class Recorder:
+    """種類ごとのレイテンシ・ステータス・エラーの集計"""
+
+    def __init__(self):
+        self.latencies = {kind: [] for kind in KINDS}
+        self.first_token = []
+        self.status = {kind: {} for kind in KINDS}
+        self.errors = {kind: 0 for kind in KINDS}
+        self.bytes = {kind: 0 for kind in KINDS}
+
+    def record(self, kind, latency, status, size=0, ok=True):
+        self.latencies[kind].append(latency)
+        key = str(status)
+        self.status[kind][key] = self.status[kind].get(key, 0) + 1
+        self.bytes[kind] += size
+        if not ok:
+            self.errors[kind] += 1
+
+    def summary(self, kind_latencies, errors, count, elapsed):
+        values = sorted(kind_latencies)
+        return {
+            'requests': count,
+            'throughput': round(count / elapsed, 2) if elapsed else 0.0,
+            'errors': errors,
+            'errorRate': round(errors / count, 4) if count else 0.0,
+            'p50Ms': round(percentile(values, 0.50) * 1000, 2),
+            'p95Ms': round(percentile(values, 0.95) * 1000, 2),
+            'p99Ms': round(percentile(values, 0.99) * 1000, 2),
+            'maxMs': round(values[-1] * 1000, 2) if values else 0.0,
+        }
+
+    def report(self, elapsed):
+        all_latencies = [value for kind in KINDS for value in self.latencies[kind]]
+        total_errors = sum(self.errors.values())
+        by_kind = {}
+        for kind in KINDS:
+            if not self.latencies[kind]:
+                continue
+            by_kind[kind] = self.summary(self.latencies[kind], self.errors[kind], len(self.latencies[kind]), elapsed)
+            by_kind[kind]['status'] = self.status[kind]
+            by_kind[kind]['bytes'] = self.bytes[kind]
+        if self.first_token:
+            first_token = sorted(self.first_token)
+            by_kind['chat']['firstTokenP50Ms'] = round(percentile(first_token, 0.50) * 1000, 2)
+            by_kind['chat']['firstTokenP95Ms'] = round(percentile(first_token, 0.95) * 1000, 2)
+            by_kind['chat']['firstTokenP99Ms'] = round(percentile(first_token, 0.99) * 1000, 2)
+        return {
+            'durationSec': round(elapsed, 3),
+            'total': self.summary(all_latencies, total_errors, len(all_latencies), elapsed),
+            'byKind': by_kind,
+        }
+
+
+class LoadGenerator:
+    """リクエストの種類を重みに従って選び、送信・計測する"""
+
+    def __init__(self, site_url, api_url, pages, questions, mix, stream=False, timeout=30.0, seed=None):
+        self.site_url = site_url.rstrip('/')
+        self.api_url = api_url.rstrip('/')
+        self.pages = pages
+        self.questions = questions
+        self.kinds = [kind for kind in KINDS if mix.get(kind)]
+        self.weights = [mix[kind] for kind in self.kinds]
+        self.stream = stream
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.rng = random.Random(seed)
+        self.recorder = Recorder()
+        if 'page' in self.kinds and not pages:
+            raise ValueError('ページ取得を含めるには --site-dir に生成済みのHTMLが必要です')
+        if 'chat' in self.kinds and not questions:
+            raise ValueError('チャットを含めるには --kb に質問が必要です')
+
+    def next_request(self):
+        """(種類, メソッド, URL, 本文) を1件選ぶ"""
+        kind = self.rng.choices(self.kinds, self.weights)[0]
+        if kind == 'page':
+            return kind, 'GET', f'{self.site_url}/{self.rng.choice(self.pages)}', None
+        if kind == 'search':
+            return kind, 'GET', f'{self.site_url}/search-index.json', None
+        path = '/api/chat/stream' if self.stream else '/api/chat'
+        return kind, 'POST', f'{self.api_url}{path}', {'message': self.rng.choice(self.questions)}
+
+    async def send(self, session, request, scheduled=None):
+        """1件送信して記録（scheduled はオープンループで予定していた送信時刻）"""
+        kind, method, url, body = request
+        started = scheduled if scheduled is not None else time.perf_counter()
+        status = 'error'
+        size = 0
+        ok = False
+        try:
+            async with session.request(method, url, json=body, timeout=self.timeout) as response:
+                status = response.status
+                if kind == 'chat' and self.stream and status == 200:
+                    size, ok = await self._read_stream(response, started)
+                else:
+                    payload = await response.read()
+                    size = len(payload)
+                    ok = status == 200 and (kind != 'chat' or json.loads(payload).get('success') is True)
+        except asyncio.TimeoutError:
+            status = 'timeout'
+        except (aiohttp.ClientError, ValueError):
+            status = 'error'
+        self.recorder.record(kind, time.perf_counter() - started, status, size, ok)
+
+    async def _read_stream(self, response, started):
+        """SSEを done まで読み、最初の token までの時間を記録"""
+        size = 0
+        event = None
+        first_token_seen = False
+        async for line in response.content:
+            size += len(line)
+            line = line.decode('utf-8').strip()
+            if line.startswith('event:'):
+                event = line[6:].strip()
+            elif line.startswith('data:') and event == 'token' and not first_token_seen:
+                self.recorder.first_token.append(time.perf_counter() - started)
+                first_token_seen = True
+            elif line.startswith('data:') and event == 'done':
+                return size, True
+        return size, False
+
+    async def run_closed(self, session, concurrency, deadline, max_requests):
+        """concurrency 本の利用者が応答を待ってから次を送る"""
+        sent = 0
+
+        async def user():
+            nonlocal sent
+            while time.perf_counter() < deadline and (max_requests is None or sent < max_requests):
+                sent += 1
+                await self.send(session, self.next_request())
+
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+
+    async def run_open(self, session, rate, deadline, max_requests):
+        """平均 rate 件/秒の到着（指数分布の間隔）で、応答を待たずに送る"""
+        tasks = []
+        scheduled = time.perf_counter()
+        while scheduled < deadline and (max_requests is None or len(tasks) < max_requests):
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(self.send(session, self.next_request(), scheduled)))
+            scheduled += self.rng.expovariate(rate)
+        await asyncio.gather(*tasks)
+
+    async def run(self, duration, concurrency, rate=None, max_requests=None):
+        connector = aiohttp.TCPConnector(limit=0 if rate else concurrency)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            started = time.perf_counter()
+            deadline = started + duration
+            if rate:
+                await self.run_open(session, rate, deadline, max_requests)
+            else:
+                await self.run_closed(session, concurrency, deadline, max_requests)
+            return self.recorder.report(time.perf_counter() - started)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+async def wait_until_ready(url, timeout=30.0):
+    """URL が 200 を返すまで待つ"""
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(url) as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f'サーバーが起動しませんでした: {url}')
+
+
+def spawn_servers(site_dir):
+    """stub LLM の async_app.py と静的サーバーを起動し、(プロセス, サイトURL, APIのURL) を返す"""
+    api_port = free_port()
+    site_port = free_port()
+    env = dict(os.environ, LLM_PROVIDER='stub')
+    env.setdefault('CHAT_INDEX_PATH', str(Path(site_dir) / 'chat-index.bin'))
+    env.setdefault('INTENT_MATCHER_PATH', str(Path(site_dir) / 'intent-matcher.json'))
+    processes = [
+        subprocess.Popen([sys.executable, str(BASE_DIR / 'async_app.py'), '--host', '127.0.0.1',
+                          '--port', str(api_port)], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL),
+        subprocess.Popen([sys.executable, '-m', 'http.server', str(site_port), '--bind', '127.0.0.1',
+                          '--directory', str(site_dir)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL),
+    ]
+    return processes, f'http://127.0.0.1:{site_port}', f'http://127.0.0.1:{api_port}'
+
+
+async def main_async(args):
+    mix = parse_mix(args.mix)
+    pages = list_pages(args.site_dir) if mix.get('page') else []
+    questions = load_questions(args.kb) if mix.get('chat') else []
+
+    processes = []
+    site_url, api_url = args.site_url, args.api_url
+    if args.spawn:
+        processes, site_url, api_url = spawn_servers(args.site_dir)
+    try:
+        if args.spawn:
+            await wait_until_ready(f'{api_url}/api/health')
+            await wait_until_ready(f'{site_url}/index.html')
+        generator = LoadGenerator(site_url, api_url, pages, questions, mix, args.stream, args.timeout, args.seed)
+        mode = f'{args.rate}件/秒' if args.rate else f'同時{args.concurrency}'
+        print(f'🚀 負荷試験を開始: {mode}、{args.duration}秒、割合 {args.mix}', file=sys.stderr)
+        report = await generator.run(args.duration, args.concurrency, args.rate, args.requests)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    report['config'] = {
+        'siteUrl': site_url, 'apiUrl': api_url, 'mix': mix, 'stream': args.stream,
+        'mode': 'open' if args.rate else 'closed', 'rate': args.rate, 'concurrency': args.concurrency,
+        'spawned': args.spawn,
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='チャットAPIと静的サイトの負荷試験')
+    parser.add_argument('--site-url', default='http://127.0.0.1:8000', help='静的サイトのURL')
+    parser.add_argument('--api-url', default='http://127.0.0.1:5000', help='チャットAPIのURL')
+    parser.add_argument('--spawn', action='store_true', help='stub LLM の async_app.py と静的サーバーを起動して試験')
+    parser.add_argument('--site-dir', default=str(DEFAULT_SITE_DIR), help='生成済みサイト（取得するページの一覧）')
+    parser.add_argument('--kb', default=str(DEFAULT_KNOWLEDGE_BASE), help='質問を作る knowledge_base.json')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='リクエストの割合（page / search / chat）')
+    parser.add_argument('--duration', type=float, default=10.0, help='試験時間（秒）')
+    parser.add_argument('--requests', type=int, default=None, help='送信するリクエスト数の上限')
+    parser.add_argument('--concurrency', type=int, default=16, help='クローズドループの同時接続数')
+    parser.add_argument('--rate', type=float, default=None, help='オープンループの平均到着数（件/秒）')
+    parser.add_argument('--stream', action='store_true', help='/api/chat/stream を使う')
+    parser.add_argument('--timeout', type=float, default=30.0, help='1リクエストのタイムアウト（秒）')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--output', help='結果のJSONを書き出すファイル（省略時は標準出力）')
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + '\n', encoding='utf-8')
+        print(f'✅ 結果を保存: {args.output}', file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
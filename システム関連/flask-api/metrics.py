@@ -0,0 +1,325 @@
+"""
+チャットAPIのメトリクス（Prometheus のテキスト形式で /metrics に出力）
+外部ライブラリを使わずに、カウンター・ゲージ・ヒストグラムと出力処理を実装しています。
+
+- 記録は固定長のリストへの加算だけで、ラベルの組み合わせごとの子は最初の1回だけ作成
+  （本番で常時有効にしてもリクエストあたりの負荷はロック1回と bisect 1回程度）
+- キャッシュのヒット数や待ち行列の長さなど、各部品がすでに数えている値は
+  出力時に stats() から読み出す（collector）ため、リクエスト処理には手を加えません
+- gunicorn で複数ワーカーを起動した場合、値はワーカーごとです
+
+ChatMetrics がチャットAPIで使うメトリクスをまとめて定義します。
+"""
+
+import math
+import threading
+from bisect import bisect_left
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 処理時間ヒストグラムの上限値（秒）。検索は数ms、LLMは数秒かかるため両方を含む範囲
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# ブレーカーの状態（llm_http.CircuitBreaker）をゲージの値に変換
+BREAKER_STATES = {'closed': 0, 'half-open': 1, 'open': 2}
+
+
+def format_value(value):
+    """サンプル値の表記（整数はそのまま、無限大は +Inf）"""
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if math.isnan(value):
+        return 'NaN'
+    return repr(float(value))
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{escape_label(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class _Metric:
+    """ラベルの値ごとの子を保持するメトリクスの共通部分"""
+
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        if not self.labelnames:
+            self._default = self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """ラベルの値に対応する子（よく使う組み合わせは呼び出し側で保持しておく）"""
+        if len(values) != len(self.labelnames):
+            raise ValueError(f'{self.name}: ラベルの数が違います（{self.labelnames}）')
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def render(self, lines):
+        lines.append(f'# HELP {self.name} {self.documentation}')
+        lines.append(f'# TYPE {self.name} {self.kind}')
+        for values, child in sorted(self._children.items()):
+            child.render(self.name, self.labelnames, values, lines)
+
+
+class _Value:
+    """カウンター・ゲージの子（スレッドセーフな数値）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+    def render(self, name, labelnames, values, lines):
+        lines.append(f'{name}{format_labels(labelnames, values)} {format_value(self.value)}')
+
+
+class Counter(_Metric):
+    """単調増加するカウンター"""
+
+    kind = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+
+class Gauge(_Metric):
+    """増減する値"""
+
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def dec(self, amount=1):
+        self._default.dec(amount)
+
+    def set(self, value):
+        self._default.set(value)
+
+
+class _HistogramValue:
+    """ヒストグラムの子
+
+    記録時は該当する区間の件数だけを加算し、累積件数（le 以下の件数）は出力時に計算します。
+    """
+
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最後は上限を超えた件数
+        self.sum = 0.0
+
+    def observe(self, value):
+        # le は「以下」なので、上限値と等しい値はその区間に入る
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[position] += 1
+            self.sum += value
+
+    def render(self, name, labelnames, values, lines):
+        with self._lock:
+            counts = list(self.counts)
+            total = self.sum
+        cumulative = 0
+        bucket_labels = labelnames + ('le',)
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{format_labels(bucket_labels, values + (format_value(bound),))} {cumulative}')
+        labels = format_labels(labelnames, values)
+        lines.append(f'{name}_sum{labels} {format_value(total)}')
+        lines.append(f'{name}_count{labels} {cumulative}')
+
+
+class Histogram(_Metric):
+    """処理時間などの分布（区間ごとの件数・合計・件数）"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+
+class MetricsRegistry:
+    """メトリクスと collector をまとめて出力する
+
+    collector は引数なしの関数で、(名前, 種類, 説明, [(ラベルの辞書, 値), ...]) のリストを返します。
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        """Prometheus のテキスト形式（末尾は改行）"""
+        lines = []
+        for metric in self._metrics:
+            metric.render(lines)
+        for collector in self._collectors:
+            for name, kind, documentation, samples in collector():
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{format_labels(tuple(labels), tuple(labels.values()))} '
+                                 f'{format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class ChatMetrics:
+    """チャットAPIの処理時間・件数のメトリクス
+
+    段階（stage）ごとの処理時間:
+      retrieval: インデックス検索 / packing: トークン予算内へのチャンクの選択
+      upstream: LLM呼び出し（ストリーミングは最後の断片まで） / first_token: LLMの最初の断片まで
+      total: リクエスト全体（ストリーミングは done まで）
+    """
+
+    def __init__(self, registry=None):
+        self.registry = registry or MetricsRegistry()
+        stage = self.registry.histogram(
+            'chat_stage_duration_seconds', 'チャット応答の段階ごとの処理時間（秒）', ('stage',))
+        self.retrieval = stage.labels('retrieval')
+        self.packing = stage.labels('packing')
+        self.upstream = stage.labels('upstream')
+        self.first_token = stage.labels('first_token')
+        self.total = stage.labels('total')
+
+        self.in_flight = self.registry.gauge('chat_requests_in_flight', '処理中のチャットリクエスト数')
+        answers = self.registry.counter(
+            'chat_answers_total', '回答の出どころ別の件数（faq / cache / llm / fallback / retrieval）', ('source',))
+        self.faq_answers = answers.labels('faq')
+        self.cached_answers = answers.labels('cache')
+        self.llm_answers = answers.labels('llm')
+        self.fallback_answers = answers.labels('fallback')
+        self.retrieval_answers = answers.labels('retrieval')
+        self.upstream_errors = self.registry.counter(
+            'chat_upstream_errors_total', 'LLM呼び出しの失敗数（例外の種類別）', ('error',))
+
+    def upstream_error(self, error):
+        self.upstream_errors.labels(type(error).__name__).inc()
+
+    def render(self):
+        return self.registry.render()
+
+
+def collect_service(chat_service, single_flight, llm_client, limiter=None, feedback_store=None, stream_flight=None):
+    """各部品の stats() から出力時に読み出す値"""
+    families = []
+    caches = {
+        'response': chat_service.response_cache.stats(),
+        'semantic': chat_service.semantic_cache.stats(),
+        'context': chat_service.context_packer.stats(),
+    }
+    families.append(('chat_cache_hits_total', 'counter', 'キャッシュのヒット数',
+                     [({'cache': name}, stats['hits']) for name, stats in caches.items()]))
+    families.append(('chat_cache_misses_total', 'counter', 'キャッシュのミス数',
+                     [({'cache': name}, stats['misses']) for name, stats in caches.items()]))
+    families.append(('chat_cache_hit_ratio', 'gauge', 'キャッシュのヒット率（起動時からの累計）',
+                     [({'cache': name}, _ratio(stats['hits'], stats['misses'])) for name, stats in caches.items()]))
+    families.append(('chat_cache_entries', 'gauge', 'キャッシュの件数',
+                     [({'cache': name}, stats['entries']) for name, stats in caches.items()]))
+
+    flights = [({'mode': 'answer'}, single_flight.stats()['coalesced'])]
+    if stream_flight is not None:
+        flights.append(({'mode': 'stream'}, stream_flight.stats()['coalesced']))
+    families.append(('chat_coalesced_total', 'counter', '実行中の同じ質問の回答を待ったリクエスト数', flights))
+
+    index = chat_service.index_store.current()
+    families.append(('chat_index_chunks', 'gauge', '読み込み中のインデックスのチャンク数',
+                     [({'version': index.version}, len(index.chunks))]))
+
+    upstream = llm_client.stats() if llm_client is not None else {}
+    if upstream:
+        provider = {'provider': upstream['provider']}
+        families.append(('chat_upstream_calls_total', 'counter', 'LLM呼び出し数', [(provider, upstream['calls'])]))
+        families.append(('chat_upstream_retries_total', 'counter', 'LLM呼び出しの再試行数',
+                         [(provider, upstream['retries'])]))
+        families.append(('chat_upstream_connections_total', 'counter', 'LLMへの接続数（作成・再利用）',
+                         [({**provider, 'kind': kind}, count)
+                          for kind, count in upstream['connections'].items() if kind != 'idle']))
+        families.append(('chat_upstream_breaker_state', 'gauge',
+                         'サーキットブレーカーの状態（0: closed / 1: half-open / 2: open）',
+                         [(provider, BREAKER_STATES.get(upstream['breaker']['state'], 0))]))
+
+    if limiter is not None:
+        concurrency = limiter.stats()
+        families.append(('chat_llm_in_flight', 'gauge', '実行中のLLM呼び出し数', [({}, concurrency['inFlight'])]))
+        families.append(('chat_queue_depth', 'gauge', 'LLM呼び出しの空きを待っているリクエスト数',
+                         [({}, concurrency['queued'])]))
+        families.append(('chat_queue_rejected_total', 'counter', '混雑のため 429 を返したリクエスト数',
+                         [({}, concurrency['rejected'])]))
+
+    if feedback_store is not None:
+        feedback = feedback_store.stats()
+        families.append(('chat_feedback_queue_depth', 'gauge', '書き込み待ちのフィードバック数',
+                         [({}, feedback['queued'])]))
+        families.append(('chat_feedback_written_total', 'counter', '保存したフィードバック数',
+                         [({}, feedback['written'])]))
+        families.append(('chat_feedback_rejected_total', 'counter', '待ち行列が一杯で受け付けなかったフィードバック数',
+                         [({}, feedback['rejected'])]))
+    return families
+
+
+def _ratio(hits, misses):
+    lookups = hits + misses
+    return hits / lookups if lookups else 0.0
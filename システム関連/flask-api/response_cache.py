@@ -0,0 +1,105 @@
+"""
+チャット応答のキャッシュ
+同じ質問への回答をLLMに問い合わせずに返すための、件数・バイト数上限付きのLRUキャッシュです。
+キーは正規化した質問とインデックスのバージョンで、インデックスが更新されると全件破棄します。
+"""
+
+import json
+import time
+import threading
+from collections import OrderedDict
+
+from retrieval import normalize
+
+
+def make_key(message, index_version):
+    """キャッシュキー（表記ゆれを吸収した質問 + インデックスのバージョン）"""
+    return f'{index_version}:{normalize(message)}'
+
+
+def entry_size(value):
+    """キャッシュ値のおおよそのサイズ（JSONにしたときのバイト数）"""
+    return len(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+
+
+class ResponseCache:
+    """LRU + TTL の応答キャッシュ（スレッドセーフ）
+
+    max_entries=0 で無効になります。ttl は秒で、0以下なら期限なしです。
+    """
+
+    def __init__(self, max_entries=1000, max_bytes=8 * 1024 * 1024, ttl=3600, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def get(self, key):
+        """キャッシュ済みの値（なければ None）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, expires_at = entry
+            if expires_at is not None and self._clock() >= expires_at:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """値を保存し、上限を超えた分を古い順に追い出す"""
+        if not self.enabled:
+            return
+        size = entry_size(value)
+        if size > self.max_bytes:
+            return
+        expires_at = self._clock() + self.ttl if self.ttl > 0 else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        """全件破棄（インデックス更新時）"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """ヒット・ミスなどの統計"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRatio': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
@@ -0,0 +1,219 @@
+"""
+チャット用インデックスの検索
+chat-index.json（site_generator が出力）をメモリに保持し、
+ビルド時に計算済みのTF-IDFベクトル（CSR形式）とのコサイン類似度で関連チャンクを取得します。
+
+起動時にチャンク×語の行列を 語×チャンク の連続した配列に転置しておき、
+クエリに含まれる語の列だけを足し合わせてスコアを計算します。
+NumPy があれば bincount + argpartition でまとめて計算し、なければ純Pythonで同じ計算をします。
+
+chat-index.bin（バイナリスナップショット）を指定した場合は、転置済みの配列を mmap してコピーせずに使います。
+"""
+
+import sys
+import json
+import math
+import base64
+import unicodedata
+from array import array
+
+from snapshot import Snapshot, SnapshotVocab, SnapshotChunks
+
+try:
+    import numpy as np
+except ImportError:  # NumPy がない環境では純Pythonで検索
+    np = None
+
+# 対応する chat-index.json のフォーマットバージョン
+SUPPORTED_FORMAT = 2
+
+NGRAM = 2
+
+
+def normalize(text):
+    """全角半角・大文字小文字の違いを吸収し空白を除去（site_generator と共通の正規化）"""
+    return ''.join(unicodedata.normalize('NFKC', text).lower().split())
+
+
+def ngrams(text, n=NGRAM):
+    """正規化済みテキストの文字n-gram（重複あり）"""
+    if len(text) <= n:
+        return [text] if text else []
+    return [text[i:i + n] for i in range(len(text) - n + 1)]
+
+
+def decode_array(typecode, encoded):
+    """リトルエンディアンのbase64文字列を数値配列に変換"""
+    data = array(typecode)
+    data.frombytes(base64.b64decode(encoded))
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data
+
+
+class ChatIndex:
+    """メモリ上に保持するチャット用インデックス
+
+    use_numpy=None なら NumPy の有無で自動選択、False で純Pythonに固定します（ベンチマーク用）。
+    """
+
+    def __init__(self, data, use_numpy=None):
+        if data.get('format') != SUPPORTED_FORMAT:
+            raise ValueError(f"chat-index.json のフォーマットが未対応です: {data.get('format')}")
+        self.version = data['version']
+        self.pages = data['pages']
+        self.chunks = data['chunks']
+        self.ngram = data.get('tokenizer', {}).get('n', NGRAM)
+        self.term_ids = {term: i for i, term in enumerate(data['vocab'])}
+        self.idf = decode_array('f', data['idf'])
+        self.use_numpy = np is not None if use_numpy is None else use_numpy and np is not None
+        self._build_term_matrix(data['matrix'])
+
+    @classmethod
+    def load(cls, path, use_numpy=None):
+        """chat-index.json、または拡張子が .bin ならスナップショットを読み込む"""
+        if str(path).endswith('.bin'):
+            return cls.from_snapshot(Snapshot(path), use_numpy)
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f), use_numpy)
+
+    @classmethod
+    def from_snapshot(cls, snapshot, use_numpy=None):
+        """mmap したスナップショットから作成（配列・文字列はコピーせず、参照時にデコード）"""
+        index = cls.__new__(cls)
+        meta = snapshot.meta
+        index.version = meta['version']
+        index.pages = meta['pages']
+        index.ngram = meta.get('tokenizer', {}).get('n', NGRAM)
+        index.rows = meta['rows']
+        index.cols = meta['cols']
+        index.use_numpy = np is not None if use_numpy is None else use_numpy and np is not None
+        index.term_ids = SnapshotVocab(snapshot.array('vocabofs', 'I'), snapshot.sections['vocab'])
+        index.idf = snapshot.array('idf', 'f')
+        index.chunks = SnapshotChunks(
+            snapshot.array('chunkpg', 'I'), snapshot.array('strofs', 'I'), snapshot.sections['strings'])
+        if index.use_numpy:
+            index.term_indptr = np.frombuffer(snapshot.sections['tindptr'], dtype='<u4')
+            index.chunk_ids = np.frombuffer(snapshot.sections['chunkid'], dtype='<u4')
+            index.weights = np.frombuffer(snapshot.sections['weight'], dtype='<f4')
+        else:
+            index.term_indptr = snapshot.array('tindptr', 'I')
+            index.chunk_ids = snapshot.array('chunkid', 'I')
+            index.weights = snapshot.array('weight', 'f')
+        # 参照中の配列が mmap を指しているため、インデックスと同じ期間保持する
+        index._snapshot = snapshot
+        return index
+
+    @property
+    def backend(self):
+        return 'numpy' if self.use_numpy else 'python'
+
+    def _build_term_matrix(self, matrix):
+        """チャンク×語のCSR行列を 語×チャンク の行列（CSC相当）に転置
+
+        term_indptr[t]:term_indptr[t+1] が語 t を含むチャンクの範囲で、
+        chunk_ids / weights はその範囲ごとに連続して並びます。
+        """
+        self.rows = matrix['rows']
+        self.cols = matrix['cols']
+        indptr = decode_array('I', matrix['indptr'])
+        indices = decode_array('I', matrix['indices'])
+        data = decode_array('f', matrix['data'])
+
+        if self.use_numpy:
+            indptr = np.frombuffer(indptr, dtype=np.uint32).astype(np.int64)
+            indices = np.frombuffer(indices, dtype=np.uint32)
+            data = np.frombuffer(data, dtype=np.float32)
+            rows = np.repeat(np.arange(self.rows, dtype=np.int32), np.diff(indptr))
+            order = np.argsort(indices, kind='stable')
+            self.chunk_ids = np.ascontiguousarray(rows[order])
+            self.weights = np.ascontiguousarray(data[order])
+            self.term_indptr = np.zeros(self.cols + 1, dtype=np.int64)
+            np.cumsum(np.bincount(indices, minlength=self.cols), out=self.term_indptr[1:])
+            return
+
+        # 純Python: 語ごとの件数から開始位置を求め、チャンク順に詰める（列内はチャンク番号順）
+        term_indptr = [0] * (self.cols + 1)
+        for term_id in indices:
+            term_indptr[term_id + 1] += 1
+        for term_id in range(self.cols):
+            term_indptr[term_id + 1] += term_indptr[term_id]
+        cursor = term_indptr[:-1]
+        chunk_ids = array('i', bytes(4 * len(indices)))
+        weights = array('f', bytes(4 * len(indices)))
+        for chunk_id in range(self.rows):
+            for position in range(indptr[chunk_id], indptr[chunk_id + 1]):
+                term_id = indices[position]
+                chunk_ids[cursor[term_id]] = chunk_id
+                weights[cursor[term_id]] = data[position]
+                cursor[term_id] += 1
+        self.term_indptr = term_indptr
+        self.chunk_ids = chunk_ids
+        self.weights = weights
+
+    def query_vector(self, query):
+        """クエリのTF-IDFベクトル {語番号: 重み}（L2正規化済み、未知語は無視）"""
+        counts = {}
+        for gram in ngrams(normalize(query), self.ngram):
+            term_id = self.term_ids.get(gram)
+            if term_id is not None:
+                counts[term_id] = counts.get(term_id, 0) + 1
+        vector = {term_id: (1 + math.log(count)) * self.idf[term_id] for term_id, count in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        return {term_id: weight / norm for term_id, weight in vector.items()}
+
+    def _gather(self, vector, offset=0):
+        """クエリベクトルの語に対応する (チャンク番号 + offset, 重み × クエリ重み) の配列"""
+        starts = self.term_indptr
+        ids = [self.chunk_ids[starts[t]:starts[t + 1]] + offset for t in vector]
+        weights = [self.weights[starts[t]:starts[t + 1]] * np.float32(w) for t, w in vector.items()]
+        return ids, weights
+
+    @staticmethod
+    def _top_k(scores, top_k):
+        """スコア配列から上位 top_k 件（スコア0は除外）を argpartition で選択"""
+        k = min(top_k, scores.shape[0])
+        if k <= 0:
+            return []
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [(float(scores[i]), int(i)) for i in candidates if scores[i] > 0]
+
+    def search(self, query, top_k=5):
+        """クエリに関連するチャンクを [(スコア, チャンク番号)] で返す"""
+        return self.search_vectors([self.query_vector(query)], top_k)[0]
+
+    def search_many(self, queries, top_k=5):
+        """複数のクエリをまとめて検索（NumPy では1回の bincount で全クエリのスコアを計算）"""
+        return self.search_vectors([self.query_vector(query) for query in queries], top_k)
+
+    def search_vectors(self, vectors, top_k=5):
+        if not self.use_numpy:
+            return [self._search_python(vector, top_k) for vector in vectors]
+
+        # クエリ q のチャンク c を q * rows + c に配置し、全クエリ分を1本のスコア配列で集計
+        ids = []
+        weights = []
+        for q, vector in enumerate(vectors):
+            if vector:
+                query_ids, query_weights = self._gather(vector, q * self.rows)
+                ids.extend(query_ids)
+                weights.extend(query_weights)
+        if not ids:
+            return [[] for _ in vectors]
+        scores = np.bincount(np.concatenate(ids), weights=np.concatenate(weights),
+                             minlength=len(vectors) * self.rows).reshape(len(vectors), self.rows)
+        return [self._top_k(row, top_k) if vector else [] for row, vector in zip(scores, vectors)]
+
+    def _search_python(self, vector, top_k):
+        scores = {}
+        starts = self.term_indptr
+        for term_id, query_weight in vector.items():
+            for position in range(starts[term_id], starts[term_id + 1]):
+                chunk_id = self.chunk_ids[position]
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + query_weight * self.weights[position]
+        ranked = sorted(scores.items(), key=lambda item: -item[1])[:top_k]
+        return [(score, chunk_id) for chunk_id, score in ranked]
+
+    def page_of(self, chunk_id):
+        return self.pages[self.chunks[chunk_id]['page']]
@@ -0,0 +1,92 @@
+"""
+検索結果だけで作る回答（LLMを使わない縮退モード）
+チャット用インデックス（site_generator が h2/h3 の見出し単位で出力したセクションのチャンク）を検索し、
+スコアの高いセクションを、質問に最も近い文の抜粋と見出しへのリンク付きで返します。
+
+- LLMに障害がある・応答が遅い場合の回答と、/api/chat/retrieval の回答に使う
+- 検索と抜粋の選択だけなので数ミリ秒で応答できる（LLMやネットワークを待たない）
+- 長いセクションが複数のチャンクに分割されている場合は、最もスコアの高いチャンクだけを使う
+- 回答はサイトのページから作るため、ナレッジベースの固定の回答のように内容とずれることがない
+"""
+
+import re
+
+from retrieval import normalize, ngrams
+
+# 文の区切り（句点・感嘆符・疑問符・改行）
+SENTENCE = re.compile(r'[^。！？!?\n]+[。！？!?]?')
+SENTENCE_END = ('。', '！', '？', '!', '?')
+
+INTRO = 'ガイドラインの該当箇所をご案内します：'
+NOT_FOUND = ('ガイドラインに関連する情報が見つかりませんでした。'
+             '上部の検索機能やサイドバーから該当するページを探すか、より具体的な質問をお聞かせください。')
+
+
+def snippet(text, query_grams, max_chars, n=2):
+    """質問の n-gram を最も多く含む文から、max_chars 字までの抜粋"""
+    sentences = [s.strip() for s in SENTENCE.findall(text) if s.strip()]
+    if not sentences:
+        return ''
+    # 同点なら先頭に近い文（セクションの導入）を優先
+    best = max(range(len(sentences)),
+               key=lambda i: (len(query_grams.intersection(ngrams(normalize(sentences[i]), n))), -i))
+    excerpt = sentences[best]
+    for sentence in sentences[best + 1:]:
+        separator = '' if excerpt.endswith(SENTENCE_END) else ' '
+        if len(excerpt) + len(separator) + len(sentence) > max_chars:
+            break
+        excerpt += separator + sentence
+    if len(excerpt) > max_chars:
+        excerpt = excerpt[:max_chars].rstrip() + '…'
+    return excerpt
+
+
+def format_sections(sections):
+    """セクションの一覧を回答のテキスト（Markdown）に整形"""
+    if not sections:
+        return NOT_FOUND
+    lines = [INTRO, '']
+    for section in sections:
+        heading = section['section'] or section['title']
+        lines.append(f"**[{heading}]({section['url']})**（{section['title']}）")
+        if section['snippet']:
+            lines.append(section['snippet'])
+        lines.append('')
+    lines.append(f"詳しくは『{sections[0]['title']}』ページをご覧ください。")
+    return '\n'.join(lines)
+
+
+class SectionAnswerer:
+    """インデックスの検索結果から、セクション単位の回答を作る
+
+    candidates 件のチャンクを検索し、セクションごとにまとめて上位 max_sections 件を返します。
+    """
+
+    def __init__(self, max_sections=3, candidates=20, snippet_chars=120):
+        self.max_sections = max_sections
+        self.candidates = candidates
+        self.snippet_chars = snippet_chars
+
+    def search(self, index, message):
+        """スコアの高い順のセクション [(ページ番号, セクションの辞書)]"""
+        query_grams = set(ngrams(normalize(message), index.ngram))
+        found = []
+        seen = set()
+        for score, chunk_id in index.search(message, top_k=self.candidates):
+            chunk = index.chunks[chunk_id]
+            key = (chunk['page'], chunk['anchor'] or chunk['section'])
+            if key in seen:
+                continue
+            seen.add(key)
+            page = index.pages[chunk['page']]
+            found.append((chunk['page'], {
+                'title': page['title'],
+                'section': chunk['section'],
+                'url': f"{page['url']}#{chunk['anchor']}" if chunk['anchor'] else page['url'],
+                'category': page['category'],
+                'snippet': snippet(chunk['text'], query_grams, self.snippet_chars, index.ngram),
+                'score': round(float(score), 4),
+            }))
+            if len(found) >= self.max_sections:
+                break
+        return found
@@ -0,0 +1,218 @@
+"""
+言い換えた質問のための類似質問キャッシュ
+完全一致の応答キャッシュ（response_cache）で外れた質問について、過去の質問との
+文字2-gram集合のJaccard類似度をMinHashで推定し、しきい値以上なら同じ回答を返します。
+
+- 2-gramはひらがな（助詞・送り仮名・「〜ですか」などの文末）を除いてから作る
+  （言い換えで変わるのは主にひらがなの部分で、漢字・カタカナの語は残るため）
+- 質問ごとに NUM_PERM 個のMinHash署名を作成
+- 署名を BANDS 個の帯に分けたLSHで候補を絞り込み（2行/帯なので類似度0.3程度から候補に入る）
+- 候補の署名一致率（Jaccard類似度の推定値）がしきい値以上ならヒット
+- 応答キャッシュと同じ TTL で期限切れにし、件数・バイト数の上限を超えたら古い順に追い出す
+  （期限切れの回答が類似質問として返り、応答キャッシュに戻されることを防ぐ）
+
+既定のしきい値 0.5 は、助詞・語順・文末を変えた言い換え（「納期遅れの対処」と「納期が遅れそうなとき」で約0.55）
+に当たり、同じ話題の別の質問（「納期遅れの対処」と「納期の決め方」で約0.2）には当たらない値です
+（bench_semantic_cache.py の質問の組で確認できます）。語そのものを言い換えた質問や、ひらがなの多い語が中心の質問
+（「やり直し」）には当たらず、1文字だけ違う別の質問（「失注」と「受注」）は文字の一致では区別できません。
+
+しきい値の調整用に、候補の類似度の分布とヒット・見送りをログに出力します。
+"""
+
+import re
+import time
+import zlib
+import random
+import logging
+import threading
+from collections import OrderedDict
+
+from retrieval import normalize
+from response_cache import entry_size
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 64
+BANDS = 32
+ROWS_PER_BAND = NUM_PERM // BANDS
+
+SHINGLE_SIZE = 2
+
+# 署名計算に使うメルセンヌ素数と、プロセス間で同じ結果になる固定シードのハッシュ係数
+MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(20240901)
+HASH_COEFFICIENTS = [(_rng.randrange(1, MERSENNE_PRIME), _rng.randrange(0, MERSENNE_PRIME))
+                     for _ in range(NUM_PERM)]
+
+# 類似度の比較では意味を持たない記号
+IGNORED_CHARS = str.maketrans('', '', '?？!！。、.,…「」')
+
+# 言い換えで変わりやすいひらがな（助詞・送り仮名・文末）
+HIRAGANA = re.compile('[\u3041-\u309f]+')
+
+
+def shingles(message):
+    """質問の文字2-gram集合（表記ゆれ・句読点・ひらがなを除去、ひらがなだけの質問はそのまま使う）"""
+    text = normalize(message).translate(IGNORED_CHARS)
+    text = HIRAGANA.sub('', text) or text
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def minhash(shingle_set):
+    """MinHash署名（NUM_PERM 個の最小ハッシュ値のタプル）"""
+    hashes = [zlib.crc32(s.encode('utf-8')) for s in shingle_set]
+    return tuple(min((a * h + b) % MERSENNE_PRIME for h in hashes) for a, b in HASH_COEFFICIENTS)
+
+
+def estimate_similarity(sig_a, sig_b):
+    """署名の一致率（Jaccard類似度の推定値）"""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+def band_keys(signature):
+    return [(band, signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]) for band in range(BANDS)]
+
+
+class SemanticCache:
+    """MinHash + LSH による類似質問キャッシュ（スレッドセーフ）
+
+    max_entries=0 で無効になります。インデックスのバージョンが異なる質問とは照合しません。
+    ttl は秒で、0以下なら期限なしです。正規化すると同じになる質問は1件だけ保持します。
+    """
+
+    def __init__(self, threshold=0.5, max_entries=1000, max_bytes=8 * 1024 * 1024, ttl=3600,
+                 clock=time.monotonic):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        # entry_id -> (version, message, signature, value, size, expires_at)
+        self._entries = OrderedDict()
+        self._buckets = {}  # (band, 帯の値) -> {entry_id}
+        self._by_message = {}  # (version, 正規化した質問) -> entry_id
+        self._bytes = 0
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self.evictions = 0
+        self.expirations = 0
+        # 候補の類似度の分布（0.1刻み）。しきい値の調整に使う
+        self.similarity_histogram = [0] * 10
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def get(self, message, version):
+        """類似する過去の質問の回答（なければ None）"""
+        if not self.enabled:
+            return None
+        shingle_set = shingles(message)
+        if not shingle_set:
+            return None
+        signature = minhash(shingle_set)
+
+        with self._lock:
+            candidates = set()
+            for key in band_keys(signature):
+                candidates.update(self._buckets.get(key, ()))
+
+            now = self._clock()
+            best = None
+            best_similarity = 0.0
+            for entry_id in candidates:
+                entry_version, _, entry_signature, _, _, expires_at = self._entries[entry_id]
+                if expires_at is not None and now >= expires_at:
+                    self._remove(entry_id)
+                    self.expirations += 1
+                    continue
+                if entry_version != version:
+                    continue
+                similarity = estimate_similarity(signature, entry_signature)
+                if similarity > best_similarity:
+                    best, best_similarity = entry_id, similarity
+
+            if best is None:
+                self.misses += 1
+                return None
+            self.similarity_histogram[min(9, int(best_similarity * 10))] += 1
+            _, cached_message, _, value, _, _ = self._entries[best]
+            if best_similarity < self.threshold:
+                self.misses += 1
+                self.rejected += 1
+                logger.info('類似質問キャッシュ: 見送り 類似度=%.2f %r / %r', best_similarity, message, cached_message)
+                return None
+            self._entries.move_to_end(best)
+            self.hits += 1
+        logger.info('類似質問キャッシュ: ヒット 類似度=%.2f %r -> %r', best_similarity, message, cached_message)
+        return value
+
+    def put(self, message, version, value):
+        """質問と回答を登録し、上限を超えた分を古い順に追い出す"""
+        if not self.enabled:
+            return
+        shingle_set = shingles(message)
+        if not shingle_set:
+            return
+        size = entry_size(value)
+        if size > self.max_bytes:
+            return
+        signature = minhash(shingle_set)
+        expires_at = self._clock() + self.ttl if self.ttl > 0 else None
+        message_key = (version, normalize(message))
+        with self._lock:
+            # 同じ質問は追加せずに置き換える
+            previous = self._by_message.get(message_key)
+            if previous is not None:
+                self._remove(previous)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (version, message, signature, value, size, expires_at)
+            self._by_message[message_key] = entry_id
+            self._bytes += size
+            for key in band_keys(signature):
+                self._buckets.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, entry_id):
+        version, message, signature, _, size, _ = self._entries.pop(entry_id)
+        self._bytes -= size
+        message_key = (version, normalize(message))
+        if self._by_message.get(message_key) == entry_id:
+            del self._by_message[message_key]
+        for key in band_keys(signature):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def clear(self):
+        """全件破棄（インデックス更新時）"""
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self._by_message.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """ヒット・ミスと候補の類似度分布"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'threshold': self.threshold,
+                'hits': self.hits,
+                'misses': self.misses,
+                'rejected': self.rejected,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'similarityHistogram': list(self.similarity_histogram),
+            }
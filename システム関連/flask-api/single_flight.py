@@ -0,0 +1,343 @@
+"""
+同じ質問の同時リクエストをまとめる（single-flight）
+新しいページの告知直後などに同じ質問が同時に届いた場合、LLMへの問い合わせは1回だけ行い、
+待っていたリクエストは同じ結果を受け取ります。
+- 問い合わせを行ったリクエスト（リーダー）で例外が発生した場合は、待機中のリクエストにも同じ例外を送出
+- 待機には上限時間があり、超えた場合は CoalescedTimeout を送出
+
+ストリーミング（/api/chat/stream）は StreamFlight でまとめます。最初のリクエストの問い合わせで届いたイベントを
+記録し、待機中のリクエストには記録済みのイベントを先頭から再生したあと、届いた順に渡します。
+
+非同期サーバー（async_app）では AsyncSingleFlight / AsyncStreamFlight を使います。
+"""
+
+import time
+import asyncio
+import threading
+
+
+class CoalescedTimeout(Exception):
+    """同じ質問の問い合わせ完了を待つ間にタイムアウトした"""
+
+
+class CoalescedAborted(Exception):
+    """同じ質問の問い合わせ（ストリーミング）が途中で打ち切られた"""
+
+    def __init__(self):
+        super().__init__('同じ質問の回答を受け取っていたリクエストが切断されました')
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """キーごとに実行中の呼び出しを1つに保つ（スレッドセーフ）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    def do(self, key, fn, timeout=None):
+        """key が実行中ならその結果を待ち、なければ fn() を実行して結果を共有"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                self.leaders += 1
+                leader = True
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            if not call.done.wait(timeout):
+                with self._lock:
+                    self.timeouts += 1
+                raise CoalescedTimeout(f'同じ質問の回答待ちが{timeout}秒を超えました')
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            # 完了後に届いたリクエストはキャッシュから返るので、ここで登録を外す
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def in_flight(self, key):
+        """key の呼び出しが実行中か"""
+        with self._lock:
+            return key in self._calls
+
+    def stats(self):
+        with self._lock:
+            return {
+                'inFlight': len(self._calls),
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+                'timeouts': self.timeouts,
+            }
+
+
+class AsyncSingleFlight:
+    """SingleFlight の asyncio 版
+
+    問い合わせは独立したタスクで実行するため、最初のリクエストのクライアントが切断しても
+    待機中のリクエストには結果が届きます。
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    async def do(self, key, fn, timeout=None):
+        """key が実行中ならその結果を待ち、なければ fn() のコルーチンを実行して結果を共有"""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            self.leaders += 1
+            return await asyncio.shield(task)
+
+        self.coalesced += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise CoalescedTimeout(f'同じ質問の回答待ちが{timeout}秒を超えました') from None
+
+    def _finish(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # 待機者がいない場合でも「例外が取得されなかった」警告を出さない
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self, key):
+        """key の呼び出しが実行中か"""
+        return key in self._calls
+
+    def stats(self):
+        return {
+            'inFlight': len(self._calls),
+            'leaders': self.leaders,
+            'coalesced': self.coalesced,
+            'timeouts': self.timeouts,
+        }
+
+
+class _StreamCall:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.events = []
+        self.done = False
+        self.error = None
+
+
+class StreamFlight:
+    """キーごとに実行中のストリーミングを1つに保つ（スレッドセーフ）
+
+    最初のリクエスト（リーダー）が fn() のイベントを自分のスレッドで受け取りながら記録します。
+    リーダーが途中で切断した場合、待機中のリクエストには CoalescedAborted を送出します。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    def stream(self, key, fn, timeout=None):
+        """key が実行中ならそのイベントを再生し、なければ fn() のイベントを返しながら共有するジェネレーター"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _StreamCall()
+                self._calls[key] = call
+                self.leaders += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+        if leader:
+            yield from self._lead(key, call, fn())
+        else:
+            yield from self._follow(call, timeout)
+
+    def _lead(self, key, call, events):
+        try:
+            for event in events:
+                with call.condition:
+                    call.events.append(event)
+                    call.condition.notify_all()
+                yield event
+        except GeneratorExit:
+            call.error = CoalescedAborted()
+            raise
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            events.close()
+            with self._lock:
+                del self._calls[key]
+            with call.condition:
+                call.done = True
+                call.condition.notify_all()
+
+    def _follow(self, call, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        position = 0
+        while True:
+            with call.condition:
+                while position >= len(call.events) and not call.done:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        with self._lock:
+                            self.timeouts += 1
+                        raise CoalescedTimeout(f'同じ質問の回答待ちが{timeout}秒を超えました')
+                    call.condition.wait(remaining)
+                pending = call.events[position:]
+                position = len(call.events)
+                finished = call.done
+            yield from pending
+            if finished:
+                if call.error is not None:
+                    raise call.error
+                return
+
+    def in_flight(self, key):
+        """key のストリーミングが実行中か"""
+        with self._lock:
+            return key in self._calls
+
+    def stats(self):
+        with self._lock:
+            return {
+                'inFlight': len(self._calls),
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+                'timeouts': self.timeouts,
+            }
+
+
+class _AsyncStreamCall:
+    def __init__(self):
+        self.events = []
+        self.changed = asyncio.Event()
+        self.done = False
+        self.error = None
+        self.task = None
+        self.readers = 0
+
+    def notify(self):
+        # 待機中の全員を起こし、次の変更用に新しいイベントに差し替える
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class AsyncStreamFlight:
+    """StreamFlight の asyncio 版
+
+    問い合わせは独立したタスクで fn() のイベントを記録し、リーダーも含めた全員が記録を読みます。
+    最初のリクエストのクライアントが切断しても、待機中のリクエストには最後までイベントが届きます。
+    読んでいるリクエストが全員切断した場合は問い合わせを取り消します（LLM呼び出しの枠を返す）。
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    async def stream(self, key, fn, timeout=None):
+        """key が実行中ならそのイベントを再生し、なければ fn() の非同期ジェネレーターを実行して共有"""
+        call = self._calls.get(key)
+        if call is None:
+            call = _AsyncStreamCall()
+            self._calls[key] = call
+            call.task = asyncio.ensure_future(self._produce(key, call, fn()))
+            self.leaders += 1
+            timeout = None
+        else:
+            self.coalesced += 1
+
+        call.readers += 1
+        try:
+            async for event in self._follow(call, timeout):
+                yield event
+        finally:
+            call.readers -= 1
+            if call.readers == 0 and not call.done:
+                call.task.cancel()
+
+    async def _follow(self, call, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        position = 0
+        while True:
+            while position >= len(call.events) and not call.done:
+                changed = call.changed
+                remaining = None if deadline is None else deadline - time.monotonic()
+                try:
+                    await asyncio.wait_for(changed.wait(), remaining)
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    raise CoalescedTimeout(f'同じ質問の回答待ちが{timeout}秒を超えました') from None
+            pending = call.events[position:]
+            position = len(call.events)
+            finished = call.done
+            for event in pending:
+                yield event
+            if finished:
+                if call.error is not None:
+                    raise call.error
+                return
+
+    async def _produce(self, key, call, events):
+        try:
+            async for event in events:
+                call.events.append(event)
+                call.notify()
+        except asyncio.CancelledError:
+            call.error = CoalescedAborted()
+            raise
+        except Exception as e:
+            call.error = e
+        finally:
+            await events.aclose()
+            if self._calls.get(key) is call:
+                del self._calls[key]
+            call.done = True
+            call.notify()
+
+    def in_flight(self, key):
+        """key のストリーミングが実行中か"""
+        return key in self._calls
+
+    def stats(self):
+        return {
+            'inFlight': len(self._calls),
+            'leaders': self.leaders,
+            'coalesced': self.coalesced,
+            'timeouts': self.timeouts,
+        }
@@ -0,0 +1,122 @@
+"""
+チャット用インデックスのバイナリスナップショット（chat-index.bin）の読み込み
+site_generator が出力したファイルを mmap し、各セクションをコピーせずに memoryview として参照します。
+JSONの解析や行列の転置がないため起動が速く、同じファイルを開いた複数のワーカーはOSのページキャッシュを共有します。
+
+ファイル構成は site_generator/chat_snapshot.py を参照してください。
+"""
+
+import sys
+import json
+import mmap
+import struct
+from array import array
+from bisect import bisect_left
+
+SNAPSHOT_MAGIC = b'HKCHATIX'
+SUPPORTED_SNAPSHOT_FORMAT = 1
+
+HEADER = struct.Struct('<8sII16s')
+SECTION = struct.Struct('<8sQQ')
+
+REQUIRED_SECTIONS = ['meta', 'vocabofs', 'vocab', 'idf', 'tindptr', 'chunkid', 'weight',
+                     'chunkpg', 'strofs', 'strings']
+
+
+def cast(view, typecode):
+    """リトルエンディアンの数値配列として参照（ビッグエンディアン環境ではコピーして変換）"""
+    if sys.byteorder == 'little':
+        return view.cast(typecode)
+    data = array(typecode, view.tobytes())
+    data.byteswap()
+    return data
+
+
+class Snapshot:
+    """mmap したスナップショットのセクション（memoryview）"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            # ファイルを閉じても mmap は有効（再生成で置き換えられても旧ファイルを参照し続ける）
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        if len(buffer) < HEADER.size:
+            raise ValueError('chat-index.bin が壊れています（ヘッダーがありません）')
+        magic, file_format, count, version = HEADER.unpack_from(buffer)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError('chat-index.bin ではありません')
+        if file_format != SUPPORTED_SNAPSHOT_FORMAT:
+            raise ValueError(f'chat-index.bin のフォーマットが未対応です: {file_format}')
+        self.version = version.decode('ascii')
+
+        self.sections = {}
+        for number in range(count):
+            name, offset, length = SECTION.unpack_from(buffer, HEADER.size + SECTION.size * number)
+            if offset + length > len(buffer):
+                raise ValueError('chat-index.bin が壊れています（セクションがファイルの範囲外です）')
+            self.sections[name.rstrip(b'\0').decode('ascii')] = buffer[offset:offset + length]
+        missing = [name for name in REQUIRED_SECTIONS if name not in self.sections]
+        if missing:
+            raise ValueError(f"chat-index.bin にセクションがありません: {', '.join(missing)}")
+
+        self.meta = json.loads(bytes(self.sections['meta']).decode('utf-8'))
+
+    def array(self, name, typecode):
+        return cast(self.sections[name], typecode)
+
+
+class SnapshotVocab:
+    """辞書順に並んだ語彙の二分探索（dict.get 互換）"""
+
+    def __init__(self, offsets, blob):
+        self._terms = _TermList(offsets, blob)
+
+    def __len__(self):
+        return len(self._terms)
+
+    def get(self, term, default=None):
+        # UTF-8 のバイト順はコードポイント順と一致するため、バイト列のまま比較できる
+        key = term.encode('utf-8')
+        position = bisect_left(self._terms, key)
+        if position < len(self) and self._terms[position] == key:
+            return position
+        return default
+
+
+class _TermList:
+    """bisect 用に i 番目の語をバイト列で返すシーケンス"""
+
+    def __init__(self, offsets, blob):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        return self._blob[self._offsets[index]:self._offsets[index + 1]].tobytes()
+
+
+class SnapshotChunks:
+    """チャンク情報のシーケンス（参照されたときに文字列をデコード）"""
+
+    def __init__(self, pages, offsets, blob):
+        self._pages = pages
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self):
+        return len(self._pages)
+
+    def _string(self, index):
+        return str(self._blob[self._offsets[index]:self._offsets[index + 1]], 'utf-8')
+
+    def __getitem__(self, chunk_id):
+        if not 0 <= chunk_id < len(self._pages):
+            raise IndexError(chunk_id)
+        return {
+            'page': self._pages[chunk_id],
+            'section': self._string(3 * chunk_id),
+            'anchor': self._string(3 * chunk_id + 1),
+            'text': self._string(3 * chunk_id + 2),
+        }